@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiler for every Cloud Function, checked against a budget.
+
+For each function directory, in fresh interpreters (--runs times, medians
+reported):
+  - `python -X importtime -c "import main"`: total import time and the
+    heaviest top-level imports
+  - import + first invocation of the handler with a representative event,
+    then a second (warm) invocation for contrast
+  - peak RSS after import and after the first invocation
+
+Provider calls go to local stand-ins (fake_providers.py, zero latency), so
+first-invocation time is the function's own work: lazy imports, client
+setup, parsing. Without PUBSUB_EMULATOR_HOST publishing fails fast on the
+missing project (the handlers treat that as a soft failure).
+
+The budget (benchmarks/cold_start_budget.json) holds per-function limits
+for import_ms, first_invocation_ms and rss_mb; anything over budget exits
+with code 1. --update-budget rewrites it from this run plus --headroom.
+
+Usage:
+    python benchmarks/cold_start_profile.py
+    python benchmarks/cold_start_profile.py --only diagnoser-agent --runs 5
+    python benchmarks/cold_start_profile.py --update-budget --headroom 0.25
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+BUDGET = os.path.join(HERE, "cold_start_budget.json")
+METRICS = ("import_ms", "first_invocation_ms", "rss_mb")
+
+_EVENT = {"buildStatus": "FAILURE", "step": "npm install", "provider": "github", "repository": "org/app",
+          "buildId": "cold-start", "error": "npm ERR! ERESOLVE unable to resolve dependency tree"}
+_DRIFT = {"drift_issues": [{"resource": "google_storage_bucket.logs", "type": "modified",
+                            "attribute": "versioning", "expected": True, "actual": False}]}
+_LOG = {"timestamp": "2026-01-01T00:00:00Z", "resource": {"labels": {"function_name": "diagnose-event"}},
+        "textPayload": "[Diagnoser] Published diagnosis to validation took 1.2s"}
+
+FUNCTIONS = {
+    # name: (directory, handler, event payload)
+    "diagnoser-agent": ("part2/functions/diagnoser-agent", "diagnose_event", _EVENT),
+    "validator-agent": ("part2/functions/validator-agent", "validate_fix_event", {
+        "id": "diag-cold", "diagnosis": "react dependency conflict", "fix_type": "npm_fix",
+        "command": "npm install --legacy-peer-deps", "risk": "low", "confidence": 0.9,
+        "metadata": {"buildId": "cold-start"}}),
+    "remediator-agent": ("part2/functions/remediator-agent", "remediate_event", {
+        "id": "val-cold", "approved": True, "command": "npm ci", "risk": "low", "fix_type": "npm_fix",
+        "metadata": {"repository": "org/app", "buildId": "cold-start"}}),
+    "terraform-fixer": ("part2/functions/terraform-fixer", "terraform_fix_event", _DRIFT),
+    "analytics": ("part3/analytics", "process_log_analytics", _LOG),
+}
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+# ---------- child: import + invoke (runs in a fresh interpreter) ----------
+
+def _rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB on Linux
+
+
+def child(directory, handler_name, payload_json, result_path):
+    import time
+    started = time.perf_counter()
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    import main as function_main
+    imported = time.perf_counter()
+    rss_import = _rss_mb()
+
+    from cloudevents.http import CloudEvent
+    data = {"message": {"data": base64.b64encode(payload_json.encode("utf-8")).decode("ascii")}}
+
+    def invoke():
+        event = CloudEvent({"type": "google.cloud.pubsub.topic.v1.messagePublished", "source": "//cold-start"}, data)
+        t0 = time.perf_counter()
+        getattr(function_main, handler_name)(event)
+        return time.perf_counter() - t0
+
+    first = invoke()
+    rss_first = _rss_mb()
+    second = invoke()
+    with open(result_path, "w", encoding="utf-8") as fh:
+        json.dump({"import_ms": (imported - started) * 1000, "first_invocation_ms": first * 1000,
+                   "warm_invocation_ms": second * 1000, "rss_import_mb": rss_import, "rss_mb": rss_first}, fh)
+    return 0
+
+
+# ---------- parent ----------
+
+def import_profile(directory, env, top):
+    """Total `import main` time and the heaviest top-level imports, from -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import sys; sys.path.insert(0, '.'); import main"],
+        cwd=directory, env=env, capture_output=True, text=True, timeout=300,
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    # A module's own imports are printed just before it, indented one level deeper
+    total_us, children, pending = 0, {}, {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        if len(indent) == 1:
+            if module == "main":
+                total_us, children = int(cumulative), pending
+            pending = {}
+        elif len(indent) == 3:
+            root = module.split(".")[0]
+            pending[root] = pending.get(root, 0) + int(cumulative)
+    heaviest = sorted(children.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return total_us / 1000, [(name, us / 1000) for name, us in heaviest]
+
+
+def profile(name, env, runs, top, workdir):
+    directory, handler, payload = FUNCTIONS[name]
+    directory = os.path.join(ROOT, directory)
+    importtime_ms, heaviest = import_profile(directory, env, top)
+
+    samples = []
+    for i in range(runs):
+        result_path = os.path.join(workdir, f"{name}-{i}.json")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", directory, handler, json.dumps(payload), result_path],
+            env=env, capture_output=True, text=True, timeout=600,
+        )
+        if proc.returncode or not os.path.exists(result_path):
+            raise RuntimeError((proc.stderr.strip().splitlines() or ["invocation failed"])[-1])
+        with open(result_path, encoding="utf-8") as fh:
+            samples.append(json.load(fh))
+
+    result = {key: round(statistics.median(s[key] for s in samples), 1) for key in samples[0]}
+    result["importtime_ms"] = round(importtime_ms, 1)
+    result["heaviest_imports"] = [[mod, round(ms, 1)] for mod, ms in heaviest]
+    return result
+
+
+def _environment(workdir):
+    import fake_providers
+
+    servers = fake_providers.start_all(fake_providers.Profile(0.0, 0.0, 0.0))
+    env = dict(os.environ, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+               ANALYTICS_SINK="file", METRICS_FILE_PATH=os.path.join(workdir, "metrics.jsonl"),
+               ANOMALY_CHECKPOINT_PATH=os.path.join(workdir, "anomaly.json"),
+               REMEDIATOR_WORKDIR_ROOT=os.path.join(workdir, "remediation"),
+               REMEDIATOR_CACHE_ROOT=os.path.join(workdir, "remediation-cache"))
+    for server in servers.values():
+        env.update(server.env())
+    # remediation commands resolve `npm` to a no-op stub
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir)
+    with open(os.path.join(bin_dir, "npm"), "w", encoding="utf-8") as fh:
+        fh.write("#!/bin/sh\nexit 0\n")
+    os.chmod(os.path.join(bin_dir, "npm"), 0o755)
+    env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+    return env, servers
+
+
+def check_budget(results, budget):
+    over = []
+    for name, result in results.items():
+        for metric, limit in budget.get(name, {}).items():
+            if metric in result and result[metric] > limit:
+                over.append((name, metric, result[metric], limit))
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=sorted(FUNCTIONS), help="profile just these functions")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports to list")
+    parser.add_argument("--budget", default=BUDGET)
+    parser.add_argument("--update-budget", action="store_true")
+    parser.add_argument("--headroom", type=float, default=0.2, help="slack added when updating the budget")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(*args.child)
+
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    env, servers = _environment(workdir)
+    results, failures = {}, {}
+    try:
+        for name in args.only or FUNCTIONS:
+            try:
+                results[name] = profile(name, env, args.runs, args.top, workdir)
+            except (RuntimeError, subprocess.TimeoutExpired) as e:
+                failures[name] = str(e)
+    finally:
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'function':<18} {'import':>9} {'1st call':>9} {'warm':>8} {'RSS':>8}   heaviest imports")
+    for name, r in results.items():
+        heavy = ", ".join(f"{mod} {ms:.0f}ms" for mod, ms in r["heaviest_imports"])
+        print(f"{name:<18} {r['import_ms']:>7.0f}ms {r['first_invocation_ms']:>7.0f}ms "
+              f"{r['warm_invocation_ms']:>6.0f}ms {r['rss_mb']:>6.0f}MB   {heavy}")
+    for name, error in failures.items():
+        print(f"❌ {name}: {error}")
+
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget, encoding="utf-8") as fh:
+            budget = json.load(fh)
+    over = check_budget(results, budget)
+    for name, metric, value, limit in over:
+        print(f"❌ {name} {metric} {value} over budget {limit}")
+
+    if args.update_budget:
+        for name, r in results.items():
+            budget[name] = {metric: round(r[metric] * (1 + args.headroom), 1) for metric in METRICS}
+        with open(args.budget, "w", encoding="utf-8") as fh:
+            json.dump(budget, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"📝 Budget written to {args.budget}")
+    elif not budget:
+        print(f"ℹ️  No budget at {args.budget}; run with --update-budget to create one")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    return 1 if failures or (over and not args.update_budget) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark + corpus check for the remediator's command analyzer.
+
+- Verifies every case in data/adversarial_commands.json gets its expected
+  verdict (exit code 1 on any mismatch)
+- Times the legacy substring scan against the analyzer, cold and cached
+
+Usage:
+    python benchmarks/command_analyzer_bench.py [--iterations 20000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "part2", "functions", "remediator-agent"))
+
+from command_analyzer import CommandAnalyzer  # noqa: E402
+
+CORPUS = os.path.join(HERE, "data", "adversarial_commands.json")
+
+
+def legacy_is_safe_command(command):
+    """The substring scan _is_safe_command used before the analyzer (kept for comparison)."""
+    command_lower = command.lower()
+    dangerous_patterns = [
+        'rm -rf', 'sudo rm', 'rm -f /', 'format', 'fdisk', 'mkfs', 'dd if=', 'kill -9',
+        'shutdown', 'reboot', 'chmod 777', 'chown -R', 'curl | sh', 'wget | sh',
+        '$(', '`', '|sh', '|bash', 'eval', 'exec', '/etc/', '/var/', '/usr/',
+        'passwd', 'su -', 'sudo su'
+    ]
+    for pattern in dangerous_patterns:
+        if pattern in command_lower:
+            return False, f"Dangerous pattern detected: {pattern}"
+    safe_patterns = [
+        'npm install', 'npm update', 'npm ci', 'git pull', 'git checkout', 'git reset',
+        'echo ', 'cat ', 'ls ', 'pwd', 'mkdir -p', 'touch ', 'pip install', 'pip upgrade'
+    ]
+    for pattern in safe_patterns:
+        if command_lower.startswith(pattern):
+            return True, f"Safe command pattern: {pattern}"
+    return False, "Command requires manual review"
+
+
+def check_corpus(cases):
+    analyzer = CommandAnalyzer()
+    mismatches = 0
+    legacy_wrong = 0
+    for case in cases:
+        verdict = analyzer.analyze(case["command"])
+        if verdict["verdict"] != case["expected"]:
+            mismatches += 1
+            print(f"❌ {case['command']!r}: expected {case['expected']}, got {verdict['verdict']} ({verdict['reason']})")
+        legacy_safe, _ = legacy_is_safe_command(case["command"])
+        if legacy_safe != (case["expected"] == "allow"):
+            legacy_wrong += 1
+    print(f"Corpus: {len(cases) - mismatches}/{len(cases)} verdicts match "
+          f"(legacy scan disagrees on {legacy_wrong})")
+    return mismatches
+
+
+def bench(cases, iterations):
+    commands = [c["command"] for c in cases]
+
+    def run_legacy():
+        for command in commands:
+            legacy_is_safe_command(command)
+
+    def run_cold():
+        analyzer = CommandAnalyzer(cache_size=0)
+        for command in commands:
+            analyzer._analyze(command)
+
+    warm = CommandAnalyzer()
+    for command in commands:
+        warm.analyze(command)
+
+    def run_warm():
+        for command in commands:
+            warm.analyze(command)
+
+    rounds = max(1, iterations // len(commands))
+    print(f"\n{rounds * len(commands)} evaluations per variant")
+    for name, fn in (("legacy substring scan", run_legacy), ("analyzer (uncached)", run_cold),
+                     ("analyzer (cached)", run_warm)):
+        seconds = min(timeit.repeat(fn, number=rounds, repeat=3))
+        per_call = seconds / (rounds * len(commands)) * 1e6
+        print(f"  {name:<24} {per_call:8.2f} µs/command")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(CORPUS, "r", encoding="utf-8") as fh:
+        cases = json.load(fh)
+
+    mismatches = check_corpus(cases)
+    bench(cases, args.iterations)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the OpenAI, Anthropic and Cloudflare Workers AI HTTP APIs.
+
+Each provider gets its own threaded HTTP server answering the endpoint the
+ModelRouter calls, after a lognormal delay, failing a configurable fraction
+of requests with 429/500. Token usage is counted per provider (GET /stats)
+so load tests can price a run.
+
+Point the router at them with:
+    OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+    ANTHROPIC_BASE_URL=http://127.0.0.1:<port>
+    CLOUDFLARE_API_BASE=http://127.0.0.1:<port>/client/v4
+
+Usage (standalone):
+    python benchmarks/fake_providers.py --latency-ms 400 --sigma 0.5 --error-rate 0.02
+    python benchmarks/fake_providers.py --profile anthropic=900,0.8,0.05
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROVIDERS = ("openai", "anthropic", "cloudflare")
+
+# Diagnoses the stand-ins answer with; each maps to a different branch of the
+# diagnoser's normalization (and so a different validator/remediator path)
+RESPONSES = [
+    (0.6, "Diagnosis: react peer dependency conflict.\nCommand: npm install --legacy-peer-deps"),
+    (0.2, "Diagnosis: stale lockfile or corrupted cache.\nCommand: npm ci"),
+    (0.1, "Diagnosis: react version mismatch.\nCommand: npm install react@18 --save"),
+    (0.1, "Diagnosis: unclear; the failure needs a human to look at the runner image."),
+]
+
+
+class Profile:
+    """Latency / error distribution for one provider."""
+
+    def __init__(self, median_ms=400.0, sigma=0.5, error_rate=0.0):
+        self.median_ms = float(median_ms)
+        self.sigma = float(sigma)
+        self.error_rate = float(error_rate)
+
+    @classmethod
+    def parse(cls, spec, default):
+        """'median_ms,sigma,error_rate' with any trailing fields optional."""
+        values = [float(v) for v in spec.split(",") if v.strip()]
+        base = [default.median_ms, default.sigma, default.error_rate]
+        return cls(*(values + base[len(values):]))
+
+    def delay(self, rng):
+        return self.median_ms / 1000.0 * math.exp(rng.gauss(0.0, self.sigma))
+
+    def to_dict(self):
+        return {"median_ms": self.median_ms, "sigma": self.sigma, "error_rate": self.error_rate}
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+# ---------- wire formats (also used by router_bench.py's mocked transports) ----------
+
+def openai_body(text, input_tokens, output_tokens, model="gpt-3.5-turbo"):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion",
+        "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                  "total_tokens": input_tokens + output_tokens},
+    }
+
+
+def anthropic_body(text, input_tokens, output_tokens, model="claude-3-haiku-20240307"):
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:12]}", "type": "message", "role": "assistant", "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+    }
+
+
+def cloudflare_body(text):
+    return {"success": True, "errors": [], "result": {"response": text}}
+
+
+def _pick_response(rng):
+    roll, acc = rng.random(), 0.0
+    for weight, text in RESPONSES:
+        acc += weight
+        if roll < acc:
+            return text
+    return RESPONSES[-1][1]
+
+
+class FakeProvider:
+    """One provider's server plus its counters."""
+
+    def __init__(self, name, profile, host="127.0.0.1", port=0, seed=None):
+        self.name = name
+        self.profile = profile
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "latency_seconds": 0.0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"fake-{name}", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the ModelRouter at this server."""
+        return {
+            "openai": {"OPENAI_BASE_URL": f"{self.url}/v1", "OPENAI_API_KEY": "fake"},
+            "anthropic": {"ANTHROPIC_BASE_URL": self.url, "ANTHROPIC_API_KEY": "fake"},
+            "cloudflare": {"CLOUDFLARE_API_BASE": f"{self.url}/client/v4", "CLOUDFLARE_ACCOUNT_ID": "fake",
+                           "CLOUDFLARE_API_TOKEN": "fake"},
+        }[self.name]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, profile=self.profile.to_dict())
+
+    # ---------- request handling ----------
+
+    def _draw(self):
+        with self._lock:
+            return self.profile.delay(self._rng), self._rng.random() < self.profile.error_rate, _pick_response(self._rng)
+
+    def _complete(self, prompt, max_tokens):
+        delay, failed, text = self._draw()
+        time.sleep(delay)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["latency_seconds"] += delay
+            if failed:
+                self.stats["errors"] += 1
+                return None
+            input_tokens, output_tokens = _tokens(prompt), min(_tokens(text), max_tokens)
+            self.stats["input_tokens"] += input_tokens
+            self.stats["output_tokens"] += output_tokens
+        return text, input_tokens, output_tokens
+
+    def _handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # keep load-test output readable
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self._send(200, provider.snapshot())
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send(400, {"error": "invalid JSON"})
+                messages = body.get("messages") or []
+                prompt = " ".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+                max_tokens = int(body.get("max_tokens") or 300)
+
+                if provider.name == "openai" and self.path.startswith("/v1/chat/completions"):
+                    result = provider._complete(prompt, max_tokens)
+                    if result is None:
+                        return self._fail()
+                    return self._send(200, openai_body(*result, model=body.get("model", "gpt-3.5-turbo")))
+                if provider.name == "anthropic" and self.path.startswith("/v1/messages"):
+                    result = provider._complete(prompt, max_tokens)
+                    if result is None:
+                        return self._fail()
+                    return self._send(200, anthropic_body(*result, model=body.get("model", "claude-3-haiku-20240307")))
+                if provider.name == "cloudflare" and "/ai/run/" in self.path:
+                    result = provider._complete(prompt, max_tokens)
+                    if result is None:
+                        return self._fail()
+                    return self._send(200, cloudflare_body(result[0]))
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+
+            def _fail(self):
+                if random.random() < 0.5:
+                    self._send(429, {"error": {"type": "rate_limit_error", "message": "Rate limited (fake)"}})
+                else:
+                    self._send(500, {"error": {"type": "api_error", "message": "Internal error (fake)"}})
+
+        return Handler
+
+
+def start_all(default, overrides=None, host="127.0.0.1", seed=None):
+    """Start one server per provider; returns {name: FakeProvider}."""
+    overrides = overrides or {}
+    return {
+        name: FakeProvider(name, overrides.get(name, default), host=host,
+                           seed=None if seed is None else seed + i).start()
+        for i, name in enumerate(PROVIDERS)
+    }
+
+
+def add_profile_args(parser):
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="median provider latency")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal sigma of provider latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of provider calls failing (429/500)")
+    parser.add_argument("--profile", action="append", default=[], metavar="PROVIDER=MS,SIGMA,ERR",
+                        help="per-provider override, e.g. anthropic=900,0.8,0.05")
+
+
+def profiles_from_args(parser, args):
+    default = Profile(args.latency_ms, args.sigma, args.error_rate)
+    overrides = {}
+    for spec in args.profile:
+        name, _, values = spec.partition("=")
+        if name not in PROVIDERS:
+            parser.error(f"unknown provider in --profile: {name}")
+        overrides[name] = Profile.parse(values, default)
+    return default, overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_profile_args(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    default, overrides = profiles_from_args(parser, args)
+    servers = start_all(default, overrides, host=args.host, seed=args.seed)
+    for name, server in servers.items():
+        print(f"🧪 {name:<10} {server.url}  {server.profile.to_dict()}")
+        for key, value in server.env().items():
+            print(f"   export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers.values():
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
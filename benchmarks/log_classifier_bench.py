@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the analytics log classifier.
+
+- Generates a synthetic agent-log corpus (seeded, default 1,000,000 lines)
+- Verifies the classifier returns exactly what the legacy heuristics in
+  extract_agent_metrics / extract_error_type returned (exit code 1 on mismatch)
+- Times both over the whole corpus
+
+Usage:
+    python benchmarks/log_classifier_bench.py [--lines 1000000] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "part3", "analytics"))
+
+from log_classifier import CLASSIFIER  # noqa: E402
+
+
+def legacy_error_type(log_text):
+    """extract_error_type before the classifier (kept for comparison)."""
+    error_patterns = {
+        'timeout': ['timeout', 'timed out', 'deadline exceeded'],
+        'api_limit': ['rate limit', 'quota exceeded', '429'],
+        'dependency': ['dependency', 'package', 'module not found'],
+        'network': ['connection', 'network', 'dns'],
+        'auth': ['authentication', 'unauthorized', '401', '403'],
+        'resource': ['memory', 'cpu', 'disk space', 'resource'],
+        'validation': ['rejected', 'validation', 'unknown command']
+    }
+    log_lower = log_text.lower()
+    for error_type, patterns in error_patterns.items():
+        if any(pattern in log_lower for pattern in patterns):
+            return error_type
+    return 'unknown'
+
+
+def legacy_classify(log_text):
+    """The text heuristics of extract_agent_metrics before the classifier."""
+    metrics = {}
+    time_match = re.search(r'took (\d+\.?\d*)s', log_text)
+    if time_match:
+        metrics['processing_time'] = float(time_match.group(1))
+    if 'SUCCESS' in log_text.upper() or 'completed' in log_text.lower() or 'Published' in log_text:
+        metrics['status'] = 'success'
+    elif 'ERROR' in log_text.upper() or 'failed' in log_text.lower() or 'Rejected' in log_text:
+        metrics['status'] = 'error'
+        metrics['error_type'] = legacy_error_type(log_text)
+    else:
+        metrics['status'] = 'processing'
+    if 'openai' in log_text.lower():
+        metrics['ai_provider'] = 'openai'
+    elif 'anthropic' in log_text.lower():
+        metrics['ai_provider'] = 'anthropic'
+    elif 'cloudflare' in log_text.lower():
+        metrics['ai_provider'] = 'cloudflare'
+    cost_match = re.search(r'cost.*?(\d+\.?\d*)', log_text.lower())
+    if cost_match:
+        metrics['estimated_cost'] = float(cost_match.group(1))
+    return metrics
+
+
+AGENTS = ["[Diagnoser]", "[Validator]", "[Remediator]", "🔧 [Terraform Fixer]"]
+TEMPLATES = [
+    "{agent} Processing pipeline event: {{'repository': 'org/app', 'buildId': '{n}'}}",
+    "{agent} Published diagnosis to validation (provider {provider}) took {t}s",
+    "{agent} ✅ Published approved fix to remediation: npm ci",
+    "{agent} ❌ Rejected fix: Command not in approved list",
+    "{agent} AI analysis failed, using fallback: {provider} rate limit (429)",
+    "{agent} Command failed (code: 1) took {t}s: npm ERR! code ERESOLVE dependency conflict",
+    "{agent} ERROR: deadline exceeded after {t}s contacting {provider}",
+    "{agent} Fix execution failed: connection reset by peer, estimated cost ${c}",
+    "{agent} Remediator Fix executed successfully took {t}s cost={c}",
+    "{agent} Command execution failed: Unauthorized (401) from {provider}",
+    "{agent} Resource usage: max_rss_kb={n} user_cpu_seconds={t}",
+    "{agent} Scheduler stats: queue_depth=0 running=1 completed={n}",
+    "{agent} Safety check failed: unknown command 'curl'; rejected",
+    "{agent} validation completed in {t}s, memory at {n}KB",
+]
+
+
+def generate(lines, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(lines):
+        template = rng.choice(TEMPLATES)
+        corpus.append(template.format(
+            agent=rng.choice(AGENTS),
+            provider=rng.choice(["openai", "Anthropic", "cloudflare", "local"]),
+            t=f"{rng.uniform(0.01, 90):.{rng.choice([0, 2, 3])}f}",
+            c=f"{rng.uniform(0, 0.2):.4f}",
+            n=rng.randint(1, 99999),
+        ))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    corpus = generate(args.lines, args.seed)
+    print(f"Generated {len(corpus):,} lines in {time.perf_counter() - started:.1f}s")
+
+    timings = {}
+    results = {}
+    for name, fn in (("legacy heuristics", legacy_classify), ("compiled classifier", CLASSIFIER.classify)):
+        started = time.perf_counter()
+        results[name] = [fn(line) for line in corpus]
+        timings[name] = time.perf_counter() - started
+
+    mismatches = 0
+    for line, old, new in zip(corpus, results["legacy heuristics"], results["compiled classifier"]):
+        if old != new:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ {line!r}\n   legacy: {old}\n   new:    {new}")
+        if old.get("status") != "error" and legacy_error_type(line) != CLASSIFIER.error_type(line):
+            mismatches += 1
+    print(f"Equivalence: {len(corpus) - mismatches:,}/{len(corpus):,} lines match")
+
+    base = timings["legacy heuristics"]
+    for name, seconds in timings.items():
+        print(f"  {name:<20} {seconds:7.2f}s  {seconds / len(corpus) * 1e6:6.2f} µs/line  "
+              f"{base / seconds:5.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: diagnoser -> validator -> remediator over the Pub/Sub
+emulator, against local provider stand-ins (fake_providers.py).
+
+- Starts fake OpenAI/Anthropic/Cloudflare servers with the given latency /
+  error distributions
+- Uses the Pub/Sub emulator (PUBSUB_EMULATOR_HOST, or --start-emulator to
+  launch `gcloud beta emulators pubsub start`) and creates the pipeline
+  topics plus one pull subscription per agent
+- Runs each agent in its own process (its main.py handler, fed by a
+  streaming pull with N concurrent callbacks, like an instance with
+  concurrency N); remediation commands resolve `npm` to a stub that sleeps
+- Publishes a storm of synthetic pipeline events and reports throughput,
+  p50/p95/p99 end-to-end and per-stage latency, outcomes, and provider
+  cost per event
+
+Needs each function's requirements installed (functions-framework,
+google-cloud-pubsub, openai, anthropic, requests) plus the emulator.
+
+Usage:
+    python benchmarks/pipeline_load_test.py --start-emulator --events 500 --rate 50
+    python benchmarks/pipeline_load_test.py --events 2000 --concurrency 16 \\
+        --latency-ms 600 --error-rate 0.05 --output load.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS = os.path.join(HERE, "..", "part2", "functions")
+sys.path.insert(0, HERE)
+
+import fake_providers  # noqa: E402
+
+PROJECT = "loadtest-project"
+INPUT_TOPIC = "pipeline-events"
+STAGES = [
+    # agent dir, handler, subscribed topic, topic it publishes to (env var, topic)
+    ("diagnoser-agent", "diagnose_event", INPUT_TOPIC, ("VALIDATION_TOPIC", "validation-requests")),
+    ("validator-agent", "validate_fix_event", "validation-requests", ("REMEDIATION_TOPIC", "remediation-tasks")),
+    ("remediator-agent", "remediate_event", "remediation-tasks", None),
+]
+
+# Per 1M tokens (input, output); override with --prices '{"openai": [0.5, 1.5]}'
+PRICES = {"openai": (0.50, 1.50), "anthropic": (0.25, 1.25), "cloudflare": (0.0, 0.0)}
+
+ERRORS = [
+    ("npm install", "npm ERR! ERESOLVE unable to resolve dependency tree: peer react@17"),
+    ("npm ci", "npm ERR! code EINTEGRITY sha512 checksum mismatch"),
+    ("build", "Module not found: Error: Can't resolve 'react-dom/client'"),
+    ("test", "Jest worker ran out of memory"),
+]
+
+
+# ---------- agent worker (runs in a child process) ----------
+
+def run_agent(agent, handler_name, subscription, concurrency, results_path):
+    """Feed one agent's handler from a streaming pull; append one JSON line per message."""
+    os.chdir(os.path.join(FUNCTIONS, agent))
+    sys.path.insert(0, os.getcwd())
+    import base64
+    from cloudevents.http import CloudEvent
+    from google.cloud import pubsub_v1
+    import main as agent_main
+
+    handler = getattr(agent_main, handler_name)
+    out = open(results_path, "a", encoding="utf-8", buffering=1)
+    out_lock = threading.Lock()
+
+    def callback(message):
+        started = time.time()
+        try:
+            payload = json.loads(message.data)
+        except ValueError:
+            payload = {}
+        metadata = payload.get("metadata") or {}
+        event = CloudEvent(
+            {"type": "google.cloud.pubsub.topic.v1.messagePublished", "source": f"//pubsub/{subscription}"},
+            {"message": {"data": base64.b64encode(message.data).decode("ascii"), "messageId": message.message_id}},
+        )
+        try:
+            response = handler(event) or {}
+        except Exception as e:  # a crash is a result too
+            response = {"status": "crashed", "error": str(e)}
+        finished = time.time()
+        message.ack()
+        line = json.dumps({
+            "stage": agent, "build_id": payload.get("buildId") or metadata.get("buildId"),
+            "started": started, "finished": finished, "status": response.get("status", "unknown"),
+            "published": response.get("published"),
+        })
+        with out_lock:
+            out.write(line + "\n")
+
+    subscriber = pubsub_v1.SubscriberClient()
+    path = subscriber.subscription_path(PROJECT, subscription)
+    from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+    future = subscriber.subscribe(
+        path, callback,
+        flow_control=pubsub_v1.types.FlowControl(max_messages=concurrency),
+        scheduler=ThreadScheduler(ThreadPoolExecutor(max_workers=concurrency)),
+    )
+    signal.signal(signal.SIGTERM, lambda *_: future.cancel())
+    try:
+        future.result()
+    except Exception:
+        pass
+    return 0
+
+
+# ---------- orchestration ----------
+
+def _percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 4),
+            "mean": round(sum(ordered) / len(ordered), 4)}
+
+
+def _start_emulator(args):
+    """Returns the emulator process if we launched one."""
+    if os.getenv("PUBSUB_EMULATOR_HOST"):
+        return None
+    if not args.start_emulator:
+        sys.exit("❌ Set PUBSUB_EMULATOR_HOST (gcloud beta emulators pubsub start) or pass --start-emulator")
+    host = f"localhost:{args.emulator_port}"
+    emulator = subprocess.Popen(
+        ["gcloud", "beta", "emulators", "pubsub", "start", f"--host-port={host}", f"--project={PROJECT}"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    os.environ["PUBSUB_EMULATOR_HOST"] = host
+    time.sleep(args.emulator_wait)
+    return emulator
+
+
+def _create_topics():
+    from google.api_core.exceptions import AlreadyExists
+    from google.cloud import pubsub_v1
+
+    publisher, subscriber = pubsub_v1.PublisherClient(), pubsub_v1.SubscriberClient()
+    for _, _, topic, _ in STAGES:
+        topic_path = publisher.topic_path(PROJECT, topic)
+        try:
+            publisher.create_topic(name=topic_path)
+        except AlreadyExists:
+            pass
+    subscriptions = {}
+    for agent, _, topic, _ in STAGES:
+        name = f"loadtest-{agent}"
+        try:
+            subscriber.create_subscription(name=subscriber.subscription_path(PROJECT, name),
+                                           topic=publisher.topic_path(PROJECT, topic), ack_deadline_seconds=600)
+        except AlreadyExists:
+            pass
+        subscriptions[agent] = name
+    return publisher, subscriptions
+
+
+def _fake_npm(workdir, seconds):
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    npm = os.path.join(bin_dir, "npm")
+    with open(npm, "w", encoding="utf-8") as fh:
+        fh.write(f"#!/bin/sh\nsleep {seconds}\necho \"fake npm $*\"\n")
+    os.chmod(npm, 0o755)
+    return bin_dir
+
+
+def _storm(publisher, events, rate, seed):
+    """Publish `events` synthetic pipeline events at `rate`/s (0 = as fast as possible)."""
+    rng = random.Random(seed)
+    topic = publisher.topic_path(PROJECT, INPUT_TOPIC)
+    published, futures = {}, []
+    started = time.perf_counter()
+    for i in range(events):
+        if rate:
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        step, error = rng.choice(ERRORS)
+        build_id = f"load-{i:06d}"
+        event = {"buildStatus": "FAILURE", "step": step, "error": error, "provider": "github",
+                 "repository": f"org/app-{rng.randint(0, 49)}", "buildId": build_id}
+        published[build_id] = time.time()
+        futures.append(publisher.publish(topic, json.dumps(event).encode("utf-8")))
+    for future in futures:
+        future.result()
+    return published
+
+
+def _read_results(workdir):
+    results = []
+    for path in glob.glob(os.path.join(workdir, "*.jsonl")):
+        with open(path, encoding="utf-8") as fh:
+            results.extend(json.loads(line) for line in fh if line.strip())
+    return results
+
+
+def _terminal(results):
+    """Build ids whose pipeline has finished (remediated, rejected, skipped or failed to publish)."""
+    done = set()
+    for r in results:
+        if r["stage"] == "remediator-agent":
+            done.add(r["build_id"])
+        elif r["stage"] == "validator-agent" and (r["status"] != "approved" or r.get("published") is False):
+            done.add(r["build_id"])
+        elif r["stage"] == "diagnoser-agent" and r["status"] != "ok":
+            done.add(r["build_id"])
+    return done
+
+
+def report(published, results, providers, prices, wall):
+    by_build = {}
+    for r in results:
+        by_build.setdefault(r["build_id"], {})[r["stage"]] = r
+    done = _terminal(results) & set(published)
+
+    end_to_end, stages, outcomes = [], {agent: [] for agent, *_ in STAGES}, {}
+    for build_id in done:
+        hops = by_build[build_id]
+        last = max(hops.values(), key=lambda r: r["finished"])
+        end_to_end.append(last["finished"] - published[build_id])
+        outcome = f"{last['stage'].split('-')[0]}:{last['status']}"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        for stage, r in hops.items():
+            stages[stage].append(r["finished"] - r["started"])
+
+    cost = 0.0
+    for name, stats in providers.items():
+        price_in, price_out = prices.get(name, (0.0, 0.0))
+        stats["cost_usd"] = round((stats["input_tokens"] * price_in + stats["output_tokens"] * price_out) / 1e6, 6)
+        cost += stats["cost_usd"]
+
+    first, last = min(published.values()), max((r["finished"] for r in results), default=time.time())
+    return {
+        "events": len(published),
+        "completed": len(done),
+        "wall_seconds": round(wall, 2),
+        "throughput_eps": round(len(done) / max(last - first, 1e-9), 2),
+        "end_to_end_seconds": _percentiles(end_to_end),
+        "stage_seconds": {stage: _percentiles(values) for stage, values in stages.items()},
+        "outcomes": dict(sorted(outcomes.items())),
+        "providers": providers,
+        "cost_usd_total": round(cost, 6),
+        "cost_usd_per_event": round(cost / max(len(published), 1), 8),
+    }
+
+
+def _print_report(result):
+    print(f"\n📊 {result['completed']}/{result['events']} events completed in {result['wall_seconds']}s "
+          f"→ {result['throughput_eps']} events/s")
+    e2e = result["end_to_end_seconds"]
+    if e2e:
+        print(f"   end-to-end  p50 {e2e['p50']}s  p95 {e2e['p95']}s  p99 {e2e['p99']}s  max {e2e['max']}s")
+    for stage, p in result["stage_seconds"].items():
+        if p:
+            print(f"   {stage:<17} p50 {p['p50']}s  p95 {p['p95']}s  p99 {p['p99']}s")
+    print(f"   outcomes    {result['outcomes']}")
+    for name, stats in result["providers"].items():
+        if stats["requests"]:
+            print(f"   {name:<11} {stats['requests']} calls, {stats['errors']} errors, "
+                  f"{stats['input_tokens']}+{stats['output_tokens']} tokens, ${stats['cost_usd']}")
+    print(f"💰 ${result['cost_usd_total']} total, ${result['cost_usd_per_event']} per event")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=0.0, help="events/s to publish (0 = one burst)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent invocations per agent")
+    parser.add_argument("--npm-seconds", type=float, default=0.2, help="duration of the stubbed npm command")
+    parser.add_argument("--timeout", type=float, default=300.0, help="give up waiting for completions after this")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--prices", type=json.loads, default={}, help="JSON {provider: [in, out]} per 1M tokens")
+    parser.add_argument("--start-emulator", action="store_true")
+    parser.add_argument("--emulator-port", type=int, default=8085)
+    parser.add_argument("--emulator-wait", type=float, default=5.0)
+    parser.add_argument("--output", help="write the report JSON here")
+    fake_providers.add_profile_args(parser)
+    parser.add_argument("--agent", help=argparse.SUPPRESS)  # internal: run one agent worker
+    parser.add_argument("--handler", help=argparse.SUPPRESS)
+    parser.add_argument("--subscription", help=argparse.SUPPRESS)
+    parser.add_argument("--results", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.agent:
+        return run_agent(args.agent, args.handler, args.subscription, args.concurrency, args.results)
+
+    agents, emulator = [], None
+    workdir = tempfile.mkdtemp(prefix="pipeline-load-")
+    default, overrides = fake_providers.profiles_from_args(parser, args)
+    servers = fake_providers.start_all(default, overrides, seed=args.seed)
+    try:
+        emulator = _start_emulator(args)
+        os.environ["GOOGLE_CLOUD_PROJECT"] = PROJECT
+        publisher, subscriptions = _create_topics()
+
+        env = dict(os.environ, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+                   REMEDIATOR_WORKDIR_ROOT=os.path.join(workdir, "remediation"),
+                   REMEDIATOR_CACHE_ROOT=os.path.join(workdir, "remediation-cache"))
+        env["PATH"] = _fake_npm(workdir, args.npm_seconds) + os.pathsep + env["PATH"]
+        for server in servers.values():
+            env.update(server.env())
+        for agent, handler, _, publishes in STAGES:
+            agent_env = dict(env, K_SERVICE=agent)
+            if publishes:
+                agent_env[publishes[0]] = publishes[1]
+            agents.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--agent", agent, "--handler", handler,
+                 "--subscription", subscriptions[agent], "--concurrency", str(args.concurrency),
+                 "--results", os.path.join(workdir, f"{agent}.jsonl")],
+                env=agent_env, stdout=subprocess.DEVNULL,
+            ))
+        time.sleep(2.0)  # let the streaming pulls connect
+
+        print(f"🚀 Publishing {args.events} events"
+              f"{f' at {args.rate}/s' if args.rate else ' in one burst'} (concurrency {args.concurrency}/agent)")
+        started = time.perf_counter()
+        published = _storm(publisher, args.events, args.rate, args.seed)
+
+        deadline = time.monotonic() + args.timeout
+        results = []
+        while time.monotonic() < deadline:
+            results = _read_results(workdir)
+            completed = len(_terminal(results) & set(published))
+            print(f"\r⏳ {completed}/{len(published)} completed", end="", file=sys.stderr, flush=True)
+            if completed >= len(published) or any(p.poll() is not None for p in agents):
+                break
+            time.sleep(0.5)
+        print(file=sys.stderr)
+        wall = time.perf_counter() - started
+
+        result = report(published, results, {name: s.snapshot() for name, s in servers.items()},
+                        {**PRICES, **{k: tuple(v) for k, v in args.prices.items()}}, wall)
+        _print_report(result)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as fh:
+                json.dump(result, fh, indent=2)
+            print(f"📝 Report written to {args.output}")
+        return 0 if result["completed"] == result["events"] else 1
+    finally:
+        for proc in agents:
+            proc.terminate()
+        for proc in agents:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if emulator is not None:
+            os.killpg(emulator.pid, signal.SIGTERM)  # gcloud forks the Java emulator into its group
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the ModelRouter's own overhead, with regression tracking.
+
+Every provider call goes through a mocked transport that answers instantly
+(httpx.MockTransport for the OpenAI / Anthropic SDK clients, a canned
+requests.Response for Cloudflare), so only the router's work is timed:
+client setup, payload construction, response normalization, error paths.
+
+Cases:
+  init                     ModelRouter() (SDK clients are created lazily)
+  route/<provider>/small   one short prompt, warm router
+  route/<provider>/large   ~100KB prompt (payload serialization)
+  error/<provider>         provider answers 400 / success=false / 500
+  error/unknown-provider   unsupported provider name
+  cascade/first-tier       cascade accepted at the first (Cloudflare) tier
+  cascade/all-tiers        cascade escalating through every tier (cost accounting included)
+  clients/cold, /warm      new router per call vs reused router (client cache miss / hit)
+
+Results are appended to a JSON history (--save). Each case's median is
+compared against the median of the last --baseline-runs saved runs from the
+same machine; exit code 1 if any case is slower by more than --threshold.
+Timings only compare on the machine that recorded them, so the history is
+not committed (benchmarks/results/ is git-ignored): each developer or CI
+runner records its own, CI by persisting the file between runs.
+
+Usage:
+    python benchmarks/router_bench.py                       # run and compare
+    python benchmarks/router_bench.py --save                # ... and record
+    python benchmarks/router_bench.py --filter route/openai --threshold 0.1
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "part2", "functions", "diagnoser-agent"))
+
+import httpx  # noqa: E402
+import requests  # noqa: E402
+from anthropic import Anthropic  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+import fake_providers  # noqa: E402
+from agents import model_router  # noqa: E402
+
+HISTORY = os.path.join(HERE, "results", "router_history.json")
+SMALL_PROMPT = "Analyze this CI/CD failure: npm ERR! ERESOLVE unable to resolve dependency tree."
+LARGE_PROMPT = SMALL_PROMPT + "\n" + ("npm ERR! peer react@17 from react-dom@17.0.2 node_modules/react-dom\n" * 1500)
+ANSWER = fake_providers.RESPONSES[0][1]
+
+
+# ---------- mocked transports ----------
+
+def _sdk_transport(status=200):
+    def handler(request):
+        if status != 200:
+            return httpx.Response(status, json={"error": {"type": "invalid_request_error", "message": "bench"}})
+        if request.url.path.endswith("/chat/completions"):
+            return httpx.Response(200, json=fake_providers.openai_body(ANSWER, 20, 20))
+        return httpx.Response(200, json=fake_providers.anthropic_body(ANSWER, 20, 20))
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def _cloudflare_response(status=200, success=True):
+    body = fake_providers.cloudflare_body(ANSWER) if success else {"success": False, "errors": ["bench"]}
+    content = json.dumps(body).encode("utf-8")
+
+    def post(url, headers=None, json=None, timeout=None):  # noqa: A002 - mirrors requests.post
+        response = requests.Response()
+        response.status_code = status
+        response._content = content
+        return response
+    return post
+
+
+def make_router(status=200):
+    """A ModelRouter whose SDK clients talk to an in-memory transport."""
+    router = model_router.ModelRouter()
+    router.openai = OpenAI(api_key="bench", base_url="https://bench.invalid/v1",
+                           http_client=_sdk_transport(status), max_retries=0)
+    router.anthropic = Anthropic(api_key="bench", base_url="https://bench.invalid",
+                                 http_client=_sdk_transport(status), max_retries=0)
+    return router
+
+
+@contextlib.contextmanager
+def cloudflare(status=200, success=True):
+    original = requests.post  # the router imports requests inside _call_cloudflare
+    requests.post = _cloudflare_response(status, success)
+    try:
+        yield
+    finally:
+        requests.post = original
+
+
+# ---------- cases ----------
+
+def build_cases():
+    """name -> (setup context, zero-arg callable)."""
+    warm, failing = make_router(), make_router(status=400)
+    cases = {"init": (contextlib.nullcontext, model_router.ModelRouter)}
+    for provider in ("openai", "anthropic", "cloudflare"):
+        meta = {"provider": provider}
+        ctx = cloudflare if provider == "cloudflare" else contextlib.nullcontext
+        cases[f"route/{provider}/small"] = (ctx, lambda m=meta: warm.route(SMALL_PROMPT, m))
+        cases[f"route/{provider}/large"] = (ctx, lambda m=meta: warm.route(LARGE_PROMPT, m))
+    for provider in ("openai", "anthropic"):
+        cases[f"error/{provider}"] = (contextlib.nullcontext,
+                                      lambda m={"provider": provider}: failing.route(SMALL_PROMPT, m))
+    cases["error/cloudflare-http"] = (lambda: cloudflare(status=500),
+                                      lambda: warm.route(SMALL_PROMPT, {"provider": "cloudflare"}))
+    cases["error/cloudflare-unsuccessful"] = (lambda: cloudflare(success=False),
+                                              lambda: warm.route(SMALL_PROMPT, {"provider": "cloudflare"}))
+    cases["error/unknown-provider"] = (contextlib.nullcontext,
+                                       lambda: warm.route(SMALL_PROMPT, {"provider": "unsupported"}))
+    cases["cascade/first-tier"] = (cloudflare, lambda: warm.route(SMALL_PROMPT, {"provider": "cascade"}))
+    cases["cascade/all-tiers"] = (cloudflare, lambda: warm.route(SMALL_PROMPT, {"provider": "cascade",
+                                                                               "accept": lambda text: 0.0}))
+    cases["clients/cold"] = (contextlib.nullcontext,
+                             lambda: make_router().route(SMALL_PROMPT, {"provider": "openai"}))
+    cases["clients/warm"] = (contextlib.nullcontext, lambda: warm.route(SMALL_PROMPT, {"provider": "openai"}))
+    return cases
+
+
+def _check(name, fn):
+    """Fail fast if a case no longer exercises the path it is named after."""
+    result = fn()
+    if name == "init":
+        return
+    expect_error = name.startswith("error/")
+    if bool(isinstance(result, dict) and result.get("error")) != expect_error:
+        raise SystemExit(f"❌ {name}: unexpected result {result!r}")
+
+
+def measure(fn, repeat, min_seconds):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_seconds / 0.2))
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"median_us": round(statistics.median(runs), 3), "min_us": round(min(runs), 3),
+            "stdev_us": round(statistics.stdev(runs), 3) if len(runs) > 1 else 0.0, "number": number}
+
+
+# ---------- history ----------
+
+def _machine():
+    return f"{platform.node()}|{platform.machine()}|py{platform.python_version()}"
+
+
+def _git_sha():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def baseline(history, machine, runs):
+    """case -> median of its medians over the last `runs` saved runs on this machine."""
+    recent = [entry for entry in history if entry.get("machine") == machine][-runs:]
+    samples = {}
+    for entry in recent:
+        for case, stats in entry["results"].items():
+            samples.setdefault(case, []).append(stats["median_us"])
+    return {case: statistics.median(values) for case, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="minimum time per repeat")
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--save", action="store_true", help="append this run to the history")
+    parser.add_argument("--baseline-runs", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown (0.15 = 15%%)")
+    parser.add_argument("--noise-floor-us", type=float, default=2.0,
+                        help="ignore slowdowns smaller than this in absolute terms")
+    args = parser.parse_args()
+
+    cases = {name: case for name, case in build_cases().items() if args.filter in name}
+    history = load_history(args.history)
+    machine = _machine()
+    base = baseline(history, machine, args.baseline_runs)
+
+    results, regressions = {}, []
+    print(f"{'case':<30} {'median':>11} {'min':>11} {'baseline':>11} {'change':>8}")
+    for name, (setup, fn) in cases.items():
+        with setup():
+            _check(name, fn)
+            stats = measure(fn, args.repeat, args.min_seconds)
+        results[name] = stats
+        previous = base.get(name)
+        change = ""
+        if previous:
+            delta = stats["median_us"] / previous - 1
+            change = f"{delta:+.1%}"
+            if delta > args.threshold and stats["median_us"] - previous > args.noise_floor_us:
+                regressions.append((name, previous, stats["median_us"], delta))
+                change += " ❌"
+        print(f"{name:<30} {stats['median_us']:>9.1f}µs {stats['min_us']:>9.1f}µs "
+              f"{f'{previous:.1f}µs' if previous else '-':>11} {change:>8}")
+
+    if args.save:
+        history.append({"timestamp": time.time(), "git_sha": _git_sha(), "machine": machine, "results": results})
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, "w", encoding="utf-8") as fh:
+            json.dump(history, fh, indent=1)
+        print(f"📝 Saved run #{len(history)} to {args.history}")
+
+    if not base:
+        print("ℹ️  No saved runs for this machine yet; nothing to compare against")
+    for name, previous, current, delta in regressions:
+        print(f"❌ {name}: {previous:.1f}µs → {current:.1f}µs ({delta:+.1%}, threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
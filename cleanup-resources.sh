@@ -18,6 +18,7 @@ gcloud functions delete log-analytics-processor --region=YOUR_REGION --quiet
 gcloud functions delete diagnoser-agent --region=YOUR_REGION --quiet
 gcloud functions delete validator-agent --region=YOUR_REGION --quiet
 gcloud functions delete remediator-agent --region=YOUR_REGION --quiet
+gcloud functions delete outcome-aggregator --region=YOUR_REGION --quiet
 echo "✅ Cloud Functions deleted"
 
 echo "📋 Cleaning up Pub/Sub resources..."
@@ -25,6 +26,7 @@ gcloud pubsub subscriptions delete test-analytics-sub --quiet
 gcloud pubsub topics delete pipeline-events --quiet
 gcloud pubsub topics delete validation-requests --quiet
 gcloud pubsub topics delete remediation-tasks --quiet
+gcloud pubsub topics delete remediation-results --quiet
 gcloud pubsub topics delete log-analytics --quiet
 echo "✅ Pub/Sub resources deleted"
 
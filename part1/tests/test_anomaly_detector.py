@@ -0,0 +1,91 @@
+"""
+Analytics anomaly detector tests.
+Per-service baselines flag latency spikes and error bursts, and checkpoints
+stay consistent while other threads keep observing.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+# Add the analytics directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part3', 'analytics'))
+
+from anomaly_detector import AnomalyDetector  # noqa: E402
+
+
+class TestAnomalyDetector(unittest.TestCase):
+    """Scoring and checkpointing against a temp checkpoint file."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "state.json")
+        self.detector = AnomalyDetector(checkpoint_path=self.path, checkpoint_seconds=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def warm_up(self, service="diagnoser", n=200, start=1_700_000_000):
+        for i in range(n):
+            self.detector.observe({"service": service, "status": "success", "timestamp": start + i,
+                                   "processing_time": 1.0 + (i % 5) * 0.01})
+
+    def test_latency_spike_is_flagged(self):
+        self.warm_up()
+        result = self.detector.observe({"service": "diagnoser", "status": "success",
+                                        "timestamp": 1_700_000_300, "processing_time": 30.0})
+        self.assertGreater(result["score"], 0.2)
+        self.assertTrue(any("latency" in r for r in result["reasons"]))
+
+    def test_normal_event_scores_zero(self):
+        self.warm_up()
+        result = self.detector.observe({"service": "diagnoser", "status": "success",
+                                        "timestamp": 1_700_000_300, "processing_time": 1.02})
+        self.assertEqual(result["score"], 0.0)
+
+    def test_baselines_are_per_service(self):
+        self.warm_up("diagnoser")
+        result = self.detector.observe({"service": "validator", "status": "success",
+                                        "timestamp": 1_700_000_300, "processing_time": 30.0})
+        self.assertEqual(result["reasons"], [])
+
+    def test_checkpoint_round_trip(self):
+        self.warm_up()
+        self.detector.save()
+        restored = AnomalyDetector(checkpoint_path=self.path)
+        self.assertEqual(set(restored.services), {"diagnoser"})
+        self.assertEqual(restored.services["diagnoser"].observed, 200)
+
+    def test_save_while_observing(self):
+        self.warm_up()
+        errors = []
+
+        def observe():
+            try:
+                for i in range(3000):
+                    self.detector.observe({"service": f"svc-{i % 50}", "status": "error" if i % 7 else "success",
+                                           "timestamp": 1_700_000_000 + i, "processing_time": 0.1 * (i % 97 + 1)})
+            except Exception as e:  # pragma: no cover - the failure being tested for
+                errors.append(e)
+
+        threads = [threading.Thread(target=observe) for _ in range(3)]
+        for t in threads:
+            t.start()
+        try:
+            for _ in range(50):
+                self.detector.save()
+        finally:
+            for t in threads:
+                t.join()
+        self.assertEqual(errors, [])
+        with open(self.path, encoding="utf-8") as fh:
+            self.assertIn("diagnoser", json.load(fh)["services"])
+
+
+if __name__ == '__main__':
+    unittest.main()
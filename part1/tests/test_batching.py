@@ -0,0 +1,75 @@
+"""
+Model router micro-batching tests.
+MicroBatcher groups concurrent prompts and fans results (and per-item
+failures) back out; only backends with a real multi-prompt call batch.
+"""
+
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+# Add the diagnoser-agent directory to the path (agents/ is a package there)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'diagnoser-agent'))
+
+from agents import model_router  # noqa: E402
+from agents.batching import MicroBatcher  # noqa: E402
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """Batch formation and result fan-out."""
+
+    def test_concurrent_items_share_batches_and_keep_their_results(self):
+        release = threading.Event()
+        sizes = []
+
+        def run_batch(items):
+            release.wait(5)  # hold the first batch so the rest pile up
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(run_batch, max_items=4, max_wait_ms=50)
+        futures = [batcher.submit(i) for i in range(9)]
+        release.set()
+        self.assertEqual([f.result(timeout=5) for f in futures], [i * 2 for i in range(9)])
+        self.assertLessEqual(max(sizes), 4)
+        self.assertLess(len(sizes), 9)
+        self.assertEqual(batcher.stats()["items"], 9)
+
+    def test_failed_item_fails_only_its_caller(self):
+        batcher = MicroBatcher(lambda items: [ValueError(i) if i == "bad" else i for i in items],
+                               max_items=3, max_wait_ms=50)
+        good, bad = batcher.submit("good"), batcher.submit("bad")
+        self.assertEqual(good.result(timeout=5), "good")
+        with self.assertRaises(ValueError):
+            bad.result(timeout=5)
+
+    def test_wrong_result_count_fails_the_batch(self):
+        batcher = MicroBatcher(lambda items: [], max_items=2, max_wait_ms=10)
+        with self.assertRaises(RuntimeError):
+            batcher.submit("x").result(timeout=5)
+
+
+class TestBatchableProviders(unittest.TestCase):
+    """Which providers the router sends through a batcher."""
+
+    def router(self, batch_url):
+        router = model_router.ModelRouter.__new__(model_router.ModelRouter)
+        router.cloudflare_batch_url = batch_url
+        return router
+
+    def test_local_is_never_batched(self):
+        with mock.patch.multiple(model_router, BATCH_MAX_ITEMS=8, BATCH_PROVIDERS={"local", "cloudflare"}):
+            self.assertFalse(self.router("https://batch")._batchable("local"))
+            self.assertTrue(self.router("https://batch")._batchable("cloudflare"))
+            self.assertFalse(self.router(None)._batchable("cloudflare"))
+
+    def test_batching_is_off_by_default(self):
+        with mock.patch.object(model_router, "BATCH_MAX_ITEMS", 1):
+            self.assertFalse(self.router("https://batch")._batchable("cloudflare"))
+
+
+if __name__ == '__main__':
+    unittest.main()
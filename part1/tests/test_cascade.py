@@ -0,0 +1,106 @@
+"""
+Model router cascade and pricing tests.
+A malformed MODEL_PRICES never breaks the import, dated model ids are priced
+like their base model, and calls that returned no tokens cost nothing.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+# Add the diagnoser-agent directory to the path (agents/ is a package there)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+AGENT_DIR = os.path.join(project_root, 'part2', 'functions', 'diagnoser-agent')
+sys.path.insert(0, AGENT_DIR)
+
+from agents import model_router  # noqa: E402
+from agents.model_router import _price, _price_overrides, returned_tokens  # noqa: E402
+
+
+class ScriptedRouter(model_router.ModelRouter):
+    """route() replays one scripted result per tier, without any SDK client."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def route(self, prompt, metadata=None):
+        self.calls.append((metadata["provider"], metadata["model"]))
+        return self.results.pop(0)
+
+
+class TestPricing(unittest.TestCase):
+    """MODEL_PRICES parsing and price lookup."""
+
+    def test_bad_overrides_are_skipped(self):
+        with self.assertLogs(model_router.__name__, level="WARNING"):
+            self.assertEqual(_price_overrides("not json"), {})
+        with self.assertLogs(model_router.__name__, level="WARNING"):
+            self.assertEqual(_price_overrides("[1, 2]"), {})
+        with self.assertLogs(model_router.__name__, level="WARNING"):
+            prices = _price_overrides('{"good": [1, "2"], "short": [1], "text": "cheap", "null": null}')
+        self.assertEqual(prices, {"good": (1.0, 2.0)})
+
+    def test_bad_model_prices_do_not_break_the_import(self):
+        for raw in ("{not json", '{"gpt-4o": "free"}'):
+            with self.subTest(raw=raw):
+                proc = subprocess.run(
+                    [sys.executable, "-c", "from agents import model_router; print(model_router.PRICES['gpt-4o'])"],
+                    cwd=AGENT_DIR, env=dict(os.environ, MODEL_PRICES=raw), capture_output=True, text=True,
+                    timeout=60,
+                )
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertEqual(proc.stdout.strip(), "(5.0, 15.0)")
+
+    def test_dated_ids_use_the_longest_priced_base(self):
+        self.assertEqual(_price("openai", "gpt-4o-2024-08-06"), model_router.PRICES["gpt-4o"])
+        self.assertEqual(_price("openai", "gpt-4o-mini-2024-07-18"), model_router.PRICES["gpt-4o-mini"])
+        self.assertEqual(_price("openai", "gpt-3.5-turbo-0125"), model_router.PRICES["gpt-3.5-turbo"])
+        self.assertEqual(_price("anthropic", "claude-unknown"), model_router.PRICES["claude-3-haiku-20240307"])
+        self.assertEqual(_price("cloudflare", None), (0.0, 0.0))
+
+    def test_returned_tokens(self):
+        self.assertFalse(returned_tokens({"response": None, "error": "timeout"}))
+        self.assertTrue(returned_tokens({"response": "npm ci"}))
+        self.assertTrue(returned_tokens({"response": "", "raw": {"usage": {"input_tokens": 5, "output_tokens": 0}}}))
+
+
+class TestCascade(unittest.TestCase):
+    """Escalation, budget and charging."""
+
+    TIERS = "openai:gpt-4o-mini,anthropic:claude-3-5-sonnet-20240620"
+
+    def test_failed_call_is_not_charged(self):
+        router = ScriptedRouter([{"provider": "openai", "response": None, "error": "rate limited"},
+                                 {"provider": "anthropic", "response": "Command: npm ci --legacy-peer-deps"}])
+        result = router.cascade("npm ERR! ERESOLVE", {"tiers": self.TIERS})
+        first, second = result["cascade"]["steps"]
+        self.assertEqual(first["cost_usd"], 0.0)
+        self.assertEqual(first["error"], "rate limited")
+        self.assertGreater(second["cost_usd"], 0.0)
+        self.assertEqual(result["cascade"]["cost_usd"], second["cost_usd"])
+
+    def test_confident_cheap_answer_stops_the_cascade(self):
+        router = ScriptedRouter([{"provider": "openai", "response": "Command: npm ci --legacy-peer-deps"}])
+        result = router.cascade("npm ERR! ERESOLVE", {"tiers": self.TIERS, "min_confidence": 0.7})
+        self.assertEqual(router.calls, [("openai", "gpt-4o-mini")])
+        self.assertEqual(result["cascade"]["escalations"], 0)
+
+    def test_cost_ceiling_skips_expensive_tiers(self):
+        router = ScriptedRouter([{"provider": "openai", "response": "not sure"}])
+        result = router.cascade("x" * 4000, {"tiers": self.TIERS, "max_cost_usd": 0.001})
+        self.assertEqual(result["cascade"]["steps"][-1]["skipped"], "cost ceiling")
+        self.assertEqual(result["response"], "not sure")
+
+    def test_all_tiers_failing(self):
+        router = ScriptedRouter([{"provider": "openai", "response": None, "error": "down"}] * 2)
+        with mock.patch.object(model_router, "CASCADE_MAX_COST_USD", 1.0):
+            result = router.cascade("prompt", {"tiers": self.TIERS})
+        self.assertEqual(result["error"], "All cascade tiers failed")
+        self.assertEqual(result["cascade"]["cost_usd"], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
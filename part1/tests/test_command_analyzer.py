@@ -0,0 +1,75 @@
+"""
+Command analyzer corpus tests.
+Every case in benchmarks/data/adversarial_commands.json must get its expected
+verdict, and the analyzer may only be stricter than the legacy substring scan
+it replaced, apart from the legacy false positives listed below.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+# Add the remediator-agent and benchmarks directories to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'remediator-agent'))
+sys.path.insert(0, os.path.join(project_root, 'benchmarks'))
+
+from command_analyzer import CommandAnalyzer  # noqa: E402
+from command_analyzer_bench import CORPUS, legacy_is_safe_command  # noqa: E402
+
+# Harmless commands the legacy scan refused on a substring ("format", "rm -rf" inside quotes)
+LEGACY_FALSE_POSITIVES = {"npm install --format json", "echo 'rm -rf /'"}
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+class TestCommandAnalyzerCorpus(unittest.TestCase):
+    """Adversarial corpus against the analyzer and the legacy scan."""
+
+    def setUp(self):
+        self.analyzer = CommandAnalyzer()
+        self.cases = load_corpus()
+
+    def test_every_case_gets_its_expected_verdict(self):
+        for case in self.cases:
+            with self.subTest(command=case["command"], note=case.get("note")):
+                self.assertEqual(self.analyzer.analyze(case["command"])["verdict"], case["expected"])
+
+    def test_never_allows_what_legacy_refused(self):
+        for case in self.cases:
+            command = case["command"]
+            if command in LEGACY_FALSE_POSITIVES:
+                continue
+            with self.subTest(command=command):
+                if self.analyzer.analyze(command)["verdict"] == "allow":
+                    self.assertTrue(legacy_is_safe_command(command)[0])
+
+    def test_legacy_false_positives_are_still_in_the_corpus(self):
+        commands = {case["command"] for case in self.cases}
+        for command in LEGACY_FALSE_POSITIVES:
+            with self.subTest(command=command):
+                self.assertIn(command, commands)
+                self.assertFalse(legacy_is_safe_command(command)[0])
+                self.assertEqual(self.analyzer.analyze(command)["verdict"], "allow")
+
+    def test_legacy_denies_stay_denied(self):
+        for case in self.cases:
+            command = case["command"]
+            safe, reason = legacy_is_safe_command(command)
+            if safe or not reason.startswith("Dangerous pattern") or command in LEGACY_FALSE_POSITIVES:
+                continue
+            with self.subTest(command=command):
+                self.assertEqual(self.analyzer.analyze(command)["verdict"], "deny")
+
+    def test_cached_verdict_matches_fresh_one(self):
+        for case in self.cases:
+            first = self.analyzer.analyze(case["command"])
+            self.assertEqual(self.analyzer.analyze(case["command"])["verdict"], first["verdict"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Drift detector tests.
+Only out-of-band changes are drift: resource_drift from plans, and changed or
+vanished resources from state diffs. Planned changes and new resources are not.
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add the scripts directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'scripts'))
+
+import drift_detector  # noqa: E402
+
+
+def state(*resources):
+    return {"values": {"root_module": {"resources": [
+        {"address": f"{t}.{n}", "mode": "managed", "type": t, "name": n, "values": values}
+        for t, n, values in resources
+    ]}}}
+
+
+class TestDriftDetector(unittest.TestCase):
+    """State index diffs and plan parsing."""
+
+    def test_state_diff_reports_modified_and_deleted_only(self):
+        baseline = drift_detector.index_state(state(("google_bucket", "a", {"location": "US", "labels": {}}),
+                                                    ("google_bucket", "b", {"location": "US"})))
+        current = drift_detector.index_state(state(("google_bucket", "a", {"location": "EU", "labels": {}}),
+                                                   ("google_bucket", "c", {"location": "US"})))
+        issues = drift_detector.diff_indexes(baseline, current)
+        self.assertEqual(
+            sorted((i["address"], i["drift_type"], i["attribute"]) for i in issues),
+            [("google_bucket.a", "modified", "location"), ("google_bucket.b", "deleted", "")],
+        )
+
+    def test_plan_reads_resource_drift_not_planned_changes(self):
+        doc = {
+            "resource_changes": [
+                {"address": "google_bucket.new", "mode": "managed", "type": "google_bucket", "name": "new",
+                 "change": {"actions": ["create"], "before": None, "after": {"location": "US"}}},
+            ],
+            "resource_drift": [
+                {"address": "google_bucket.a", "mode": "managed", "type": "google_bucket", "name": "a",
+                 "change": {"actions": ["update"], "before": {"location": "US"}, "after": {"location": "EU"}}},
+                {"address": "google_bucket.b", "mode": "managed", "type": "google_bucket", "name": "b",
+                 "change": {"actions": ["delete"], "before": {"location": "US"}, "after": None}},
+            ],
+        }
+        issues = drift_detector.plan_issues(doc)
+        self.assertEqual(
+            [(i["address"], i["drift_type"], i["attribute"]) for i in issues],
+            [("google_bucket.a", "modified", "location"), ("google_bucket.b", "deleted", "")],
+        )
+        self.assertEqual(drift_detector.plan_issues({"resource_changes": doc["resource_changes"]}), [])
+
+    def test_terraform_failure_exits_with_a_message(self):
+        error = drift_detector.subprocess.CalledProcessError(1, ["terraform"], stderr=b"Error: no state")
+        with mock.patch.object(drift_detector.subprocess, "run", side_effect=error):
+            with self.assertRaises(SystemExit) as ctx:
+                drift_detector.load_show_json(terraform_dir=".")
+        self.assertIn("no state", str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Terraform drift planner tests.
+Issues are grouped and de-duplicated as they stream in; template fixes are
+targeted and chunked, and model-proposed commands must pass the allowlist.
+"""
+
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add the terraform-fixer directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'terraform-fixer'))
+
+import drift_engine  # noqa: E402
+from drift_engine import DriftPlanner, normalize_issue  # noqa: E402
+
+
+class FakeRouter:
+    """Returns a canned model response and records the prompt."""
+
+    def __init__(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.prompts = []
+
+    def route(self, prompt, options):
+        self.prompts.append(prompt)
+        return {"error": self.error} if self.error else {"response": self.response}
+
+
+def buckets(n, drift_type="modified"):
+    return [{"resource_type": "aws_s3_bucket", "resource_name": f"b{i}", "drift_type": drift_type}
+            for i in range(n)]
+
+
+class TestDriftPlanner(unittest.TestCase):
+    """Grouping and template fixes."""
+
+    def test_normalize_issue(self):
+        norm = normalize_issue({"type": "aws_vpc", "name": "main", "module": "module.net", "change": "Deleted"})
+        self.assertEqual(norm["address"], "module.net.aws_vpc.main")
+        self.assertEqual(norm["action"], "create")
+
+    def test_duplicates_and_invalid_issues_are_counted_not_grouped(self):
+        planner = DriftPlanner().extend(buckets(3) + buckets(2) + ["not an issue"])
+        plan = planner.plan()
+        self.assertEqual((plan["total_issues"], plan["unique_issues"]), (6, 3))
+        self.assertEqual((plan["duplicates"], plan["invalid"]), (2, 1))
+        self.assertEqual(plan["groups"][0]["count"], 3)
+        self.assertFalse(plan["ai"]["used"])
+
+    def test_large_groups_are_chunked_by_max_targets(self):
+        with mock.patch.object(drift_engine, "MAX_TARGETS", 4):
+            fix = DriftPlanner().extend(buckets(10)).plan()["fixes"][0]
+        self.assertEqual(fix["action"], "reconcile")
+        plans = [c for c in fix["commands"] if c.startswith("terraform plan")]
+        self.assertEqual(len(plans), 3)
+        self.assertEqual([c.count("-target=") for c in plans], [4, 4, 2])
+        self.assertIn("terraform apply drift-3.tfplan", fix["commands"])
+
+    def test_malformed_addresses_are_never_targeted(self):
+        issues = [{"address": "aws_s3_bucket.ok", "resource_type": "aws_s3_bucket"},
+                  {"address": "aws_s3_bucket.x; rm -rf /", "resource_type": "aws_s3_bucket"}]
+        fix = DriftPlanner().extend(issues).plan()["fixes"][0]
+        self.assertEqual(fix["commands"][0], "terraform plan -out=drift.tfplan -target=aws_s3_bucket.ok")
+        self.assertIn("1 malformed", fix["rationale"])
+
+    def test_unmanaged_and_orphaned_need_review(self):
+        for drift_type in ("unmanaged", "orphaned"):
+            with self.subTest(drift_type=drift_type):
+                fix = DriftPlanner().extend(buckets(2, drift_type)).plan()["fixes"][0]
+                self.assertEqual(fix["action"], "manual_review")
+                self.assertFalse(any("apply" in c for c in fix["commands"]))
+
+
+class TestAiFixes(unittest.TestCase):
+    """Model-proposed fixes go through the command allowlist."""
+
+    def plan(self, fixes):
+        router = FakeRouter(response="Here you go:\n" + json.dumps(fixes))
+        return DriftPlanner(router=router).extend(buckets(2)).plan()
+
+    def test_allowed_fix_is_used(self):
+        plan = self.plan([{"group_id": "root/aws_s3_bucket", "action": "reconcile",
+                           "command": "terraform plan -refresh-only -out=fix.tfplan -target=aws_s3_bucket.b0"}])
+        self.assertEqual(plan["fixes"][0]["source"], "ai")
+        self.assertTrue(plan["ai"]["used"])
+
+    def test_disallowed_commands_fall_back_to_the_template(self):
+        for command in ("terraform apply -auto-approve", "terraform destroy",
+                        "terraform plan -out=fix.tfplan", "terraform plan -target=aws_vpc.other",
+                        "terraform state rm aws_s3_bucket.b0", "rm -rf .terraform",
+                        "terraform plan -target=aws_s3_bucket.b0 -var-file=/etc/passwd", "terraform plan 'unterminated"):
+            with self.subTest(command=command):
+                plan = self.plan([{"group_id": "root/aws_s3_bucket", "command": command}])
+                self.assertEqual(plan["fixes"][0]["source"], "template")
+                self.assertEqual(plan["ai"]["rejected"], 1)
+
+    def test_unknown_group_and_action_are_rejected(self):
+        plan = self.plan([{"group_id": "root/other", "command": "terraform state list"},
+                          {"group_id": "root/aws_s3_bucket", "action": "destroy", "command": "terraform state list"}])
+        self.assertEqual(plan["fixes"][0]["source"], "template")
+        self.assertEqual([r["reason"] for r in plan["ai"]["rejections"]],
+                         ["unknown group", "action not allowed: destroy"])
+
+    def test_router_error_falls_back_to_the_template(self):
+        plan = DriftPlanner(router=FakeRouter(error="quota")).extend(buckets(2)).plan()
+        self.assertEqual(plan["fixes"][0]["source"], "template")
+        self.assertEqual(plan["ai"]["error"], "quota")
+
+
+if __name__ == '__main__':
+    unittest.main()
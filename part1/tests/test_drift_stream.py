@@ -0,0 +1,117 @@
+"""
+Streaming drift report parser tests.
+Tiny chunk sizes force every token (strings, escapes, multi-byte UTF-8,
+numbers) to straddle a read boundary; the result must equal json.loads.
+"""
+
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the terraform-fixer directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'terraform-fixer'))
+
+from drift_stream import (  # noqa: E402
+    Base64Reader,
+    DriftReportParser,
+    DriftStreamError,
+    iter_report_issues,
+    open_report,
+)
+
+REPORT = {
+    "report_id": "r-1",
+    "generated_at": 1700000000.5,
+    "meta": {"skipped": [1, {"nested": "]}"}], "note": "brackets \"[{\" in strings"},
+    "drift_issues": [
+        {"address": "aws_s3_bucket.logs", "drift_type": "modified", "attribute": "tags"},
+        {"address": "module.net.aws_subnet.a[\"eu-west-1a\"]", "drift_type": "deleted"},
+        {"address": "google_storage_bucket.données", "note": "émoji 🚀 and \\ backslash  "},
+        {"address": "x", "values": [1, -2.5e3, True, False, None], "empty": {}, "list": []},
+    ],
+    "drift_report_uri": "",
+    "count": 4,
+}
+
+
+def parse(document, chunk_size):
+    raw = json.dumps(document, ensure_ascii=False).encode("utf-8")
+    parser = DriftReportParser(io.BytesIO(raw), chunk_size=chunk_size)
+    return list(parser.issues()), parser
+
+
+class TestDriftReportParser(unittest.TestCase):
+    """Chunk-size independence and error handling."""
+
+    def test_small_chunks_match_json_loads(self):
+        for chunk_size in (1, 2, 3, 7, 64, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                issues, parser = parse(REPORT, chunk_size)
+                self.assertEqual(issues, REPORT["drift_issues"])
+                self.assertEqual(parser.fields, {"report_id": "r-1", "generated_at": 1700000000.5,
+                                                 "drift_report_uri": "", "count": 4})
+
+    def test_bare_array(self):
+        for chunk_size in (1, 5):
+            with self.subTest(chunk_size=chunk_size):
+                issues, _ = parse(REPORT["drift_issues"], chunk_size)
+                self.assertEqual(issues, REPORT["drift_issues"])
+
+    def test_issues_are_yielded_lazily(self):
+        raw = json.dumps({"drift_issues": [{"i": i} for i in range(2000)]}).encode()
+        parser = DriftReportParser(io.BytesIO(raw), chunk_size=256)
+        self.assertEqual(next(parser.issues()), {"i": 0})
+        self.assertLess(parser.bytes_read, 1024)
+
+    def test_malformed_reports_raise(self):
+        for raw in (b'{"drift_issues": [{"a": 1}', b'{"drift_issues": [{"a": "open', b'"just a string"',
+                    b'{"drift_issues": [{"a": tru}]}', b''):
+            with self.subTest(raw=raw):
+                with self.assertRaises(DriftStreamError):
+                    list(DriftReportParser(io.BytesIO(raw), chunk_size=3).issues())
+
+    def test_base64_reader(self):
+        raw = json.dumps(REPORT, ensure_ascii=False).encode("utf-8")
+        reader = Base64Reader(base64.b64encode(raw).decode())
+        self.assertEqual(list(DriftReportParser(reader, chunk_size=5).issues()), REPORT["drift_issues"])
+
+
+class TestOpenReport(unittest.TestCase):
+    """References come from Pub/Sub, so only confined gs:// URIs are opened."""
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.root.name, "bucket"))
+        with open(os.path.join(self.root.name, "bucket", "report.json"), "w", encoding="utf-8") as fh:
+            json.dump({"drift_issues": [{"address": "a.b"}]}, fh)
+        with open(os.path.join(self.root.name, "secret.json"), "w", encoding="utf-8") as fh:
+            fh.write("{}")
+        self.env = mock.patch.dict(os.environ, {"DRIFT_REPORT_LOCAL_ROOT": self.root.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.root.cleanup()
+
+    def test_gs_uri_reads_from_the_local_root(self):
+        inline = io.BytesIO(json.dumps({"drift_issues": [{"address": "x.y"}],
+                                        "drift_report_uri": "gs://bucket/report.json"}).encode())
+        self.assertEqual([i["address"] for i in iter_report_issues(inline)], ["x.y", "a.b"])
+
+    def test_other_references_are_refused(self):
+        for uri in ("/etc/passwd", "file:///etc/passwd", "bucket/report.json", "gs://bucket",
+                    "gs://bucket/../secret.json", "gs://bucket/../../etc/passwd", "gs://../secret.json",
+                    "gs://./secret.json"):
+            with self.subTest(uri=uri):
+                with self.assertRaises(DriftStreamError):
+                    open_report(uri).close()
+
+
+if __name__ == '__main__':
+    unittest.main()
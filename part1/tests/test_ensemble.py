@@ -0,0 +1,125 @@
+"""
+Ensemble diagnoser tests.
+Votes are weighted by the executed outcomes of each provider's past fixes
+(read from the fix history), errors count for nothing, and the winning
+command's supporters are reported so its outcome can be credited to them.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Add the diagnoser-agent directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'diagnoser-agent'))
+
+import ensemble  # noqa: E402
+from ensemble import EnsembleDiagnoser  # noqa: E402
+from fix_history import SQLiteFixHistory  # noqa: E402
+
+PROVIDERS = ["anthropic", "openai", "cloudflare"]
+
+
+class FakeRouter:
+    """Each provider answers with a fixed command, an error, or blocks until released."""
+
+    def __init__(self, answers, block=()):
+        self.answers = answers
+        self.block = set(block)
+        self.release = threading.Event()
+        self.calls = []
+
+    def route(self, prompt, options):
+        provider = options["provider"]
+        self.calls.append(provider)
+        if provider in self.block:
+            self.release.wait(10)
+        answer = self.answers[provider]
+        if isinstance(answer, Exception):
+            raise answer
+        if answer.startswith("error:"):
+            return {"provider": provider, "response": None, "error": answer[len("error:"):]}
+        return {"provider": provider, "response": answer}
+
+
+def history_with(outcomes):
+    """A fix history where each provider's proposals succeeded/failed the given number of times."""
+    history = SQLiteFixHistory(":memory:")
+    n = 0
+    for provider, (successes, failures) in outcomes.items():
+        for success in [True] * successes + [False] * failures:
+            n += 1
+            history.record("org/app", "install", "sig", "npm ci", success, outcome_id=f"r-{n}", providers=(provider,))
+    return history
+
+
+class TestEnsembleDiagnoser(unittest.TestCase):
+    """Weighted voting from recorded outcomes."""
+
+    def make(self, router, history=None, **kwargs):
+        diagnoser = EnsembleDiagnoser(router, lambda text: {"command": text}, history=history,
+                                      providers=PROVIDERS, **kwargs)
+        self.addCleanup(diagnoser._pool.shutdown, wait=False)
+        self.addCleanup(router.release.set)
+        return diagnoser
+
+    def test_proven_provider_outvotes_unproven_majority(self):
+        history = history_with({"anthropic": (8, 0), "openai": (0, 8), "cloudflare": (0, 8)})
+        router = FakeRouter({"anthropic": "npm ci", "openai": "rm -rf node_modules", "cloudflare": "rm -rf node_modules"})
+        result = self.make(router, history).diagnose("prompt")
+        self.assertEqual(result["fix"]["command"], "npm ci")
+        self.assertEqual(result["supporters"], ["anthropic"])
+        self.assertGreater(result["votes"]["npm ci"], result["votes"]["rm -rf node_modules"])
+
+    def test_without_history_the_majority_wins_and_all_supporters_are_reported(self):
+        router = FakeRouter({"anthropic": "npm ci", "openai": "npm ci", "cloudflare": "npm install"})
+        result = self.make(router, quorum=1.0).diagnose("prompt")
+        self.assertEqual(result["fix"]["command"], "npm ci")
+        self.assertEqual(result["supporters"], ["anthropic", "openai"])
+
+    def test_errors_and_empty_answers_count_for_nothing(self):
+        router = FakeRouter({"anthropic": "error:quota", "openai": "", "cloudflare": RuntimeError("down")})
+        diagnoser = self.make(router)
+        self.assertIsNone(diagnoser.diagnose("prompt"))
+        router.answers["cloudflare"] = "npm ci"
+        result = diagnoser.diagnose("prompt")
+        self.assertEqual(result["supporters"], ["cloudflare"])
+        self.assertEqual(result["answers"]["anthropic"]["error"], "quota")
+        self.assertEqual(result["answers"]["openai"]["error"], "Empty response")
+        self.assertIsNone(diagnoser.records["anthropic"].latency)
+
+    def test_quorum_returns_without_waiting_for_slow_providers(self):
+        history = history_with({"anthropic": (8, 0), "openai": (8, 0), "cloudflare": (0, 0)})
+        router = FakeRouter({"anthropic": "npm ci", "openai": "npm ci", "cloudflare": "npm ci"}, block=["cloudflare"])
+        started = time.monotonic()
+        result = self.make(router, history).diagnose("prompt")
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(result["quorum"])
+        self.assertNotIn("cloudflare", result["answers"])
+
+    def test_outcome_counts_are_reread_after_the_ttl(self):
+        history = history_with({"openai": (0, 4)})
+        router = FakeRouter({p: "npm ci" for p in PROVIDERS})
+        diagnoser = self.make(router, history)
+        diagnoser.diagnose("prompt")
+        self.assertEqual(diagnoser.stats()["openai"]["failures"], 4)
+        history.record("org/app", "install", "sig", "npm ci", True, outcome_id="later", providers=("openai",))
+        diagnoser.diagnose("prompt")
+        self.assertEqual(diagnoser.stats()["openai"]["successes"], 0)  # still cached
+        with mock.patch.object(ensemble, "STATS_TTL_SECONDS", 0):
+            diagnoser.diagnose("prompt")
+        self.assertEqual(diagnoser.stats()["openai"]["successes"], 1)
+
+    def test_history_read_failure_keeps_default_weights(self):
+        history = mock.Mock()
+        history.provider_stats.side_effect = RuntimeError("firestore unavailable")
+        router = FakeRouter({p: "npm ci" for p in PROVIDERS})
+        result = self.make(router, history, quorum=1.0).diagnose("prompt")
+        self.assertEqual(result["supporters"], sorted(PROVIDERS))
+
+
+if __name__ == '__main__':
+    unittest.main()
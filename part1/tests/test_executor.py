@@ -0,0 +1,95 @@
+"""
+Remediator executor tests.
+Commands run without a shell, with bounded output capture, rlimits applied
+to the child and a wall-clock timeout that kills the whole process group.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+# Add the remediator-agent directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'remediator-agent'))
+
+from executor import RingBuffer, run_command, split_command  # noqa: E402
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Tail-only capture."""
+
+    def test_keeps_the_tail_and_counts_everything(self):
+        buf = RingBuffer(8)
+        for chunk in (b"abc", b"defgh", b"ijk"):
+            buf.write(chunk)
+        self.assertEqual(buf.text(), "defghijk")
+        self.assertEqual(buf.total_bytes, 11)
+        self.assertTrue(buf.truncated)
+
+    def test_oversized_chunk(self):
+        buf = RingBuffer(4)
+        buf.write(b"0123456789")
+        self.assertEqual(buf.text(), "6789")
+
+
+class TestSplitCommand(unittest.TestCase):
+    """No shell: operators are refused, quotes are honored."""
+
+    def test_quotes(self):
+        self.assertEqual(split_command("npm install 'left pad'"), ["npm", "install", "left pad"])
+
+    def test_shell_operators_are_refused(self):
+        for command in ("npm install && rm -rf /", "npm ci | tee log", "npm ci > out", "npm ci; ls", ""):
+            with self.subTest(command=command):
+                with self.assertRaises(ValueError):
+                    split_command(command)
+
+
+class TestRunCommand(unittest.TestCase):
+    """Real child processes."""
+
+    def test_success_and_output(self):
+        result = run_command("echo hello", timeout=10)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["stdout"], "hello\n")
+        self.assertEqual(result["returncode"], 0)
+        self.assertIsNotNone(result["usage"]["wall_seconds"])
+
+    def test_operators_are_not_interpreted(self):
+        result = run_command("echo a && echo b", timeout=10)
+        self.assertFalse(result["success"])
+        self.assertIn("Shell operators", result["error"])
+
+    def test_output_is_bounded(self):
+        result = run_command("head -c 100000 /dev/zero", timeout=10, max_output_bytes=1024)
+        self.assertTrue(result["success"])
+        self.assertEqual(len(result["stdout"]), 1024)
+        self.assertEqual(result["stdout_bytes"], 100000)
+        self.assertTrue(result["output_truncated"])
+
+    def test_timeout_kills_the_process_group(self):
+        started = time.monotonic()
+        result = run_command("sh -c 'sleep 30 & sleep 30'", timeout=1)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertTrue(result["timed_out"])
+        self.assertFalse(result["success"])
+        self.assertIn("timed out", result["error"])
+
+    def test_missing_program(self):
+        result = run_command("definitely-not-a-real-program --version", timeout=10)
+        self.assertFalse(result["success"])
+        self.assertIn("Failed to start", result["error"])
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "prlimit and /proc are Linux-only")
+    def test_rlimits_reach_the_child(self):
+        # the sleep lets prlimit land before the limits are read
+        result = run_command("sh -c 'sleep 0.3; cat /proc/self/limits'", timeout=10, cpu_seconds=7, memory_mb=512)
+        self.assertTrue(result["success"], result["stderr"])
+        limits = {line[:26].strip(): line[26:].split() for line in result["stdout"].splitlines()[1:]}
+        self.assertEqual(limits["Max cpu time"][:2], ["7", "12"])
+        self.assertEqual(limits["Max data size"][0], str(512 * 1024 * 1024))
+
+
+if __name__ == '__main__':
+    unittest.main()
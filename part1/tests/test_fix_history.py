@@ -0,0 +1,95 @@
+"""
+Fix history tests (fix_history is identical in every agent that uses it).
+Outcomes are counted per repository and globally, a redelivered result id
+is counted once, and ensemble providers are scored from the same store.
+"""
+
+import os
+import sys
+import unittest
+
+# Add the remediator-agent directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'remediator-agent'))
+
+from fix_history import (  # noqa: E402
+    FixHistory,
+    SQLiteFixHistory,
+    error_signature,
+    learned_confidence,
+)
+
+COPIES = ('diagnoser-agent', 'validator-agent', 'remediator-agent')
+
+
+class TestFixHistory(unittest.TestCase):
+    """SQLite backend (the Firestore backend shares the same FixHistory logic)."""
+
+    def setUp(self):
+        self.history = SQLiteFixHistory(":memory:")
+        self.signature = error_signature("npm ERR! ERESOLVE unable to resolve /app/node_modules/react@18.2.0")
+
+    def record(self, success=True, outcome_id=None, repository="org/app", command="npm ci", providers=()):
+        return self.history.record(repository, "install", self.signature, command, success,
+                                   outcome_id=outcome_id, providers=providers)
+
+    def counts(self, repository="org/app", command="npm ci"):
+        stats = self.history.stats(repository, "install", self.signature, command)
+        return stats["successes"], stats["failures"]
+
+    def test_signature_ignores_volatile_details(self):
+        self.assertEqual(self.signature,
+                         error_signature("npm ERR! ERESOLVE unable to resolve /srv/x/node_modules/react@18.3.1"))
+        self.assertNotEqual(self.signature, error_signature("npm ERR! ENOSPC no space left on device"))
+
+    def test_redelivered_outcome_is_counted_once(self):
+        self.assertTrue(self.record(outcome_id="result-1"))
+        self.assertFalse(self.record(outcome_id="result-1"))
+        self.assertFalse(self.record(success=False, outcome_id="result-1"))
+        self.assertTrue(self.record(outcome_id="result-2"))
+        self.assertEqual(self.counts(), (2, 0))
+        self.assertEqual(self.counts(repository="*"), (2, 0))
+
+    def test_duplicate_does_not_touch_provider_counts(self):
+        self.record(outcome_id="result-1", providers=("anthropic", "openai"))
+        self.record(outcome_id="result-1", providers=("anthropic", "openai"))
+        self.record(success=False, outcome_id="result-2", providers=("openai",))
+        stats = self.history.provider_stats()
+        self.assertEqual((stats["anthropic"]["successes"], stats["anthropic"]["failures"]), (1, 0))
+        self.assertEqual((stats["openai"]["successes"], stats["openai"]["failures"]), (1, 1))
+        self.assertEqual(stats["openai"]["confidence"], learned_confidence(1, 1))
+
+    def test_outcomes_without_an_id_always_count(self):
+        self.record()
+        self.record()
+        self.assertEqual(self.counts(), (2, 0))
+
+    def test_lookup_prefers_the_repository_then_falls_back_to_global(self):
+        for i in range(3):
+            self.record(outcome_id=f"a-{i}", command="npm ci --legacy-peer-deps")
+        fix = self.history.lookup("org/app", "install", self.signature)
+        self.assertEqual((fix["command"], fix["scope"]), ("npm ci --legacy-peer-deps", "repository"))
+        self.assertTrue(fix["proven"])
+        other = self.history.lookup("org/other", "install", self.signature)
+        self.assertEqual(other["scope"], "global")
+
+    def test_unproven_fixes_are_not_reused(self):
+        self.record(outcome_id="a")
+        self.record(success=False, outcome_id="b")
+        self.record(outcome_id="c")
+        self.assertIsNone(self.history.lookup("org/app", "install", self.signature))
+
+    def test_backend_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            FixHistory()
+
+    def test_agent_copies_are_identical(self):
+        contents = set()
+        for agent in COPIES:
+            with open(os.path.join(project_root, 'part2', 'functions', agent, 'fix_history.py'), 'rb') as fh:
+                contents.add(fh.read())
+        self.assertEqual(len(contents), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
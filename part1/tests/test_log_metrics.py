@@ -0,0 +1,54 @@
+"""
+Analytics log -> metrics tests.
+Only request-level span durations become processing_time; stage spans
+(nested inside a request) must not enter the latency series.
+"""
+
+import os
+import sys
+import unittest
+
+# Add the analytics directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part3', 'analytics'))
+
+from log_metrics import extract_agent_metrics  # noqa: E402
+
+
+def entry(payload, severity="INFO"):
+    return {
+        "timestamp": "2026-01-01T00:00:00Z",
+        "severity": severity,
+        "resource": {"labels": {"function_name": "diagnose-event"}},
+        "jsonPayload": dict({"agent": "[Diagnoser]"}, **payload),
+    }
+
+
+class TestLogMetrics(unittest.TestCase):
+    """Structured span records."""
+
+    def test_root_span_duration_is_processing_time(self):
+        metrics = extract_agent_metrics(entry({"message": "diagnose took 2.500s", "span": "diagnose",
+                                               "duration_seconds": 2.5, "stages": {"model_call": 2.1}}))
+        self.assertEqual(metrics["processing_time"], 2.5)
+
+    def test_stage_spans_are_not_processing_time(self):
+        for payload in (
+            {"message": "stage model_call: 2.100s", "span": "model_call", "span_kind": "stage",
+             "stage_seconds": 2.1},
+            # agents deployed before stage records had their own shape
+            {"message": "model_call took 2.100s", "span": "model_call", "duration_seconds": 2.1},
+        ):
+            with self.subTest(message=payload["message"]):
+                metrics = extract_agent_metrics(entry(payload, severity="DEBUG"))
+                self.assertNotIn("processing_time", metrics)
+
+    def test_non_span_duration_fields_still_count(self):
+        metrics = extract_agent_metrics(entry({"message": "Fix executed", "processing_time": 4.0,
+                                               "status": "success"}))
+        self.assertEqual(metrics["processing_time"], 4.0)
+        self.assertEqual(metrics["status"], "success")
+
+
+if __name__ == '__main__':
+    unittest.main()
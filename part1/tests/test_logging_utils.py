@@ -0,0 +1,85 @@
+"""
+Structured logging tests (logging_utils is identical in every agent).
+Records go through one background listener, however many threads log first,
+and carry their fields as they were when the event was logged.
+"""
+
+import atexit
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import threading
+import unittest
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODULE_PATH = os.path.join(project_root, 'part2', 'functions', 'remediator-agent', 'logging_utils.py')
+
+
+def fresh_module():
+    """A private copy of logging_utils, so each test starts before the logger exists."""
+    spec = importlib.util.spec_from_file_location("logging_utils_under_test", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestLoggingUtils(unittest.TestCase):
+    """Lazy initialization and field rendering."""
+
+    def setUp(self):
+        self.out = io.StringIO()
+        self.module = fresh_module()
+        self.module.LOG_FORMAT = "json"
+        logging.getLogger("agents").handlers.clear()
+
+    def tearDown(self):
+        if self.module._listener is not None:
+            atexit.unregister(self.module._listener.stop)
+            self.module._listener.stop()
+        logging.getLogger("agents").handlers.clear()
+
+    def records(self):
+        self.module.flush()
+        return [json.loads(line) for line in self.out.getvalue().splitlines()]
+
+    def test_concurrent_first_calls_start_one_listener(self):
+        barrier = threading.Barrier(8)
+
+        def log(i):
+            barrier.wait()
+            self.module.log_event("[Test]", "event %s", i)
+
+        with contextlib.redirect_stdout(self.out):
+            threads = [threading.Thread(target=log, args=(i,)) for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            records = self.records()
+        self.assertEqual(len(logging.getLogger("agents").handlers), 1)
+        self.assertEqual(sorted(r["message"] for r in records), sorted(f"event {i}" for i in range(8)))
+
+    def test_fields_are_captured_when_logged(self):
+        task = {"id": "t-1", "status": "queued"}
+        with contextlib.redirect_stdout(self.out):
+            self.module.log_event("[Test]", "received", task=task, count=1)
+            task["status"] = "done"
+            task["extra"] = list(range(3))
+            records = self.records()
+        self.assertEqual(records[0]["task"], {"id": "t-1", "status": "queued"})
+        self.assertEqual(records[0]["count"], 1)
+        self.assertEqual(records[0]["agent"], "[Test]")
+
+    def test_unserializable_fields_fall_back_to_str(self):
+        with contextlib.redirect_stdout(self.out):
+            self.module.log_event("[Test]", "odd", value=object, nothing=None)
+            records = self.records()
+        self.assertIn("object", records[0]["value"])
+        self.assertIsNone(records[0]["nothing"])
+
+
+if __name__ == '__main__':
+    unittest.main()
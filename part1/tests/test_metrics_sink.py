@@ -0,0 +1,131 @@
+"""
+Buffered metrics sink tests.
+Rows are written in batches by size or age, rejected rows are retried with
+the same insert id and dropped after max_retries, and entry points drain
+the buffer before they return.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Add the analytics directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part3', 'analytics'))
+
+import metrics_sink  # noqa: E402
+from metrics_sink import MetricsSink, SQLiteSink  # noqa: E402
+
+
+class RecordingSink(MetricsSink):
+    """Keeps every batch; rows whose value is in `reject` fail that many times."""
+
+    def __init__(self, reject=None, **kwargs):
+        self.batches = []
+        self.reject = dict(reject or {})
+        self.write_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _write(self, batch):
+        with self.write_lock:
+            self.batches.append([(item["row"]["value"], item["insert_id"]) for item in batch])
+            failed = []
+            for index, item in enumerate(batch):
+                value = item["row"]["value"]
+                if self.reject.get(value, 0) > 0:
+                    self.reject[value] -= 1
+                    failed.append(index)
+            return failed
+
+    def written(self):
+        return [value for batch in self.batches for value, _ in batch]
+
+
+class TestMetricsSink(unittest.TestCase):
+    """Batching, retries and draining."""
+
+    def make(self, **kwargs):
+        kwargs.setdefault("max_age", 60)
+        sink = RecordingSink(**kwargs)
+        self.addCleanup(sink.close)
+        return sink
+
+    def test_full_batches_are_written_on_add(self):
+        sink = self.make(batch_size=3)
+        for i in range(7):
+            sink.add({"value": i})
+        self.assertEqual([len(b) for b in sink.batches], [3, 3])
+        sink.drain()
+        self.assertEqual(sink.written(), list(range(7)))
+        self.assertEqual(sink.stats["written"], 7)
+
+    def test_old_rows_are_flushed_by_the_timer(self):
+        sink = self.make(batch_size=100, max_age=0.1)
+        sink.add({"value": "late"})
+        deadline = time.monotonic() + 5
+        while not sink.batches and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(sink.written(), ["late"])
+
+    def test_rejected_rows_are_retried_with_the_same_insert_id(self):
+        sink = self.make(batch_size=10, max_retries=3, reject={"b": 2})
+        for value in "abc":
+            sink.add({"value": value})
+        sink.drain()
+        attempts = [insert_id for batch in sink.batches for value, insert_id in batch if value == "b"]
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(len(set(attempts)), 1)
+        self.assertEqual(sink.stats["written"], 3)
+        self.assertEqual(sink.stats["dropped"], 0)
+
+    def test_rows_are_dropped_after_max_retries(self):
+        sink = self.make(batch_size=10, max_retries=1, reject={"bad": 99})
+        sink.add({"value": "bad"})
+        sink.add({"value": "good"})
+        with mock.patch.object(metrics_sink.time, "sleep"):
+            sink.drain()
+        self.assertEqual(sink.written().count("bad"), 2)
+        self.assertEqual(sink.stats["dropped"], 1)
+        self.assertEqual(sink.stats["written"], 1)
+
+    def test_flush_after_drains_the_shared_sink(self):
+        sink = self.make(batch_size=100)
+
+        @metrics_sink.flush_after
+        def handler():
+            sink.add({"value": "row"})
+            return "ok"
+
+        with mock.patch.object(metrics_sink, "_sink", sink):
+            self.assertEqual(handler(), "ok")
+        self.assertEqual(sink.written(), ["row"])
+
+
+class TestSQLiteSink(unittest.TestCase):
+    """The local stand-in ignores a replayed insert id."""
+
+    def test_replayed_rows_are_written_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics.db")
+            sink = SQLiteSink(path=path, batch_size=10, max_age=60)
+            sink.add({"timestamp": "t", "service": "diagnoser", "status": "ok"})
+            batch = list(sink._rows)
+            sink.drain()
+            sink._write(batch)  # a retry after an ambiguous failure
+            sink.close()
+            sink._conn.close()
+            conn = sqlite3.connect(path)
+            rows = conn.execute("SELECT service, row FROM metrics").fetchall()
+            conn.close()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(json.loads(rows[0][1])["status"], "ok")
+
+
+if __name__ == '__main__':
+    unittest.main()
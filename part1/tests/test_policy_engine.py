@@ -0,0 +1,107 @@
+"""
+Validator policy engine tests.
+Deny rules must fire wherever the dangerous program appears in a command line
+and must win over any allow rule (APPROVED_KEYWORDS included).
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# Add the validator-agent directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'validator-agent'))
+
+from policy_engine import PolicyError, load_policy  # noqa: E402
+
+# Same value as part2/functions/validator-agent/env.yaml
+ENV_KEYWORDS = "npm,terraform,install,unlock,--legacy-peer-deps,npm install,npm install --legacy-peer-deps"
+
+
+class TestPolicyEngine(unittest.TestCase):
+    """Verdicts of the built-in policy plus the deployed APPROVED_KEYWORDS."""
+
+    def setUp(self):
+        self.engine = load_policy(policy_file="", approved_keywords=ENV_KEYWORDS)
+
+    def assertDenied(self, command, risk="high"):
+        verdict = self.engine.evaluate(command, risk)
+        self.assertFalse(verdict["approved"], f"{command!r} approved by {verdict['rule']}")
+        return verdict
+
+    def test_wrapped_dangerous_commands_are_denied(self):
+        """Commands the pre-engine substring check rejected must stay rejected."""
+        for command in (
+            "echo npm | xargs sudo reboot",
+            "npm install && find / | xargs rm -rf",
+            "env sudo npm install",
+            "npm install; nohup rm -rf /",
+        ):
+            with self.subTest(command=command):
+                verdict = self.assertDenied(command)
+                self.assertEqual(verdict["reason"], "Dangerous command detected")
+
+    def test_deny_wins_over_low_risk_and_keywords(self):
+        self.assertDenied("npm install --legacy-peer-deps && sudo rm -rf /", risk="low")
+        self.assertDenied("command sudo npm install")
+        self.assertDenied("exec /usr/bin/sudo npm install")
+        self.assertDenied("npm install || rm -r node_modules")
+
+    def test_quoted_command_strings_are_scanned(self):
+        self.assertDenied("sh -c 'npm install && sudo reboot'")
+        self.assertDenied('bash -c "rm -rf /"')
+
+    def test_safe_commands_are_approved(self):
+        for command in ("npm install --legacy-peer-deps", "npm ci", "terraform force-unlock 123"):
+            with self.subTest(command=command):
+                self.assertTrue(self.engine.evaluate(command, "high")["approved"])
+        self.assertTrue(self.engine.evaluate("rm package-lock.json", "low")["approved"])
+
+    def test_unparseable_command_is_denied(self):
+        verdict = self.assertDenied("npm install 'unterminated")
+        self.assertIsNone(verdict["rule"])
+
+    def test_override_allow_lifts_lower_priority_deny_in_its_own_command(self):
+        rules = [
+            {"name": "deny-force", "effect": "deny", "priority": 100, "tokens": ["npm"], "args_any": ["--force"]},
+            {"name": "allow-force-install", "effect": "allow", "priority": 200, "override": True,
+             "tokens": ["npm", "install"], "args_any": ["--force"]},
+            {"name": "allow-low-override", "effect": "allow", "priority": 50, "override": True,
+             "tokens": ["npm", "ci"]},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fh:
+            json.dump(rules + [{"name": "deny-sudo", "effect": "deny", "priority": 100, "tokens": ["sudo"]}], fh)
+        try:
+            engine = load_policy(policy_file=fh.name, approved_keywords="")
+        finally:
+            os.unlink(fh.name)
+
+        verdict = engine.evaluate("npm install --force", "high")
+        self.assertTrue(verdict["approved"])
+        self.assertEqual(verdict["rule"], "allow-force-install")
+        # Denies elsewhere in the line, and denies the exception does not outrank, still win
+        self.assertFalse(engine.evaluate("npm install --force && sudo reboot", "high")["approved"])
+        self.assertFalse(engine.evaluate("npm ci --force", "high")["approved"])
+        self.assertFalse(engine.evaluate("npm update --force", "high")["approved"])
+
+    def test_bad_policy_file_raises_policy_error(self):
+        for rules in ([{"effect": "deny", "priority": "high", "tokens": ["rm"]}],
+                      [{"effect": "maybe", "tokens": ["rm"]}],
+                      [{"effect": "deny", "override": True, "tokens": ["rm"]}],
+                      [{"effect": "allow", "override": True, "risk": ["low"]}],
+                      ["rm"],
+                      {"rules": "rm"}):
+            with self.subTest(rules=rules):
+                with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fh:
+                    json.dump(rules, fh)
+                try:
+                    with self.assertRaises(PolicyError):
+                        load_policy(policy_file=fh.name, approved_keywords=ENV_KEYWORDS)
+                finally:
+                    os.unlink(fh.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Remediation scheduler tests.
+Tasks for one repository run one at a time; tasks without a real repository
+(the diagnoser sends metadata.repository = "unknown") run in parallel.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add the remediator-agent directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'remediator-agent'))
+
+from scheduler import RemediationScheduler, lane_key, repository_key  # noqa: E402
+
+
+def diagnoser_task(repository="unknown", task_id="diag-1"):
+    """Shaped like a validated diagnoser payload (see diagnoser-agent/main.py)."""
+    return {
+        "id": task_id, "approved": True, "command": "npm ci", "fix_type": "npm_fix", "risk": "low",
+        "metadata": {"repository": repository, "buildId": "unknown", "provider": "github",
+                     "step": "npm install", "error_signature": "0123456789abcdef"},
+    }
+
+
+class TestScheduler(unittest.TestCase):
+    """Lanes, concurrency and per-task working directories."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.workdirs = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def handler(self, task, workdir):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.workdirs.append(workdir)
+        time.sleep(0.1)
+        with self.lock:
+            self.running -= 1
+        return {"status": "executed", "id": task["id"], "workdir_existed": os.path.isdir(workdir)}
+
+    def run_all(self, tasks, workers=4):
+        scheduler = RemediationScheduler(self.handler, max_workers=workers, workdir_root=self.root)
+        try:
+            futures = [scheduler.submit(task) for task in tasks]
+            return [f.result(timeout=10) for f in futures], scheduler.stats()
+        finally:
+            scheduler.shutdown()
+
+    def test_unknown_repository_tasks_run_in_parallel(self):
+        tasks = [diagnoser_task("unknown", f"diag-{i}") for i in range(4)]
+        results, stats = self.run_all(tasks)
+        self.assertEqual(self.peak, 4)
+        self.assertTrue(all(r["status"] == "executed" for r in results))
+        self.assertEqual(stats["completed"], 4)
+
+    def test_same_repository_is_serialized_in_order(self):
+        tasks = [diagnoser_task("org/app", f"diag-{i}") for i in range(3)]
+        results, _ = self.run_all(tasks)
+        self.assertEqual(self.peak, 1)
+        self.assertEqual([r["id"] for r in results], ["diag-0", "diag-1", "diag-2"])
+
+    def test_workdirs_are_private_and_removed(self):
+        results, _ = self.run_all([diagnoser_task("org/app", "a"), diagnoser_task("org/other", "b")])
+        self.assertTrue(all(r["workdir_existed"] for r in results))
+        self.assertEqual(len(set(self.workdirs)), 2)
+        self.assertFalse(any(os.path.exists(w) for w in self.workdirs))
+
+    def test_lane_and_repository_keys(self):
+        self.assertEqual(lane_key(diagnoser_task("org/app")), "repo:org/app")
+        for repository in ("unknown", "", None):
+            with self.subTest(repository=repository):
+                task = diagnoser_task(repository)
+                self.assertTrue(lane_key(task).startswith("task:"))
+                self.assertNotEqual(lane_key(task), lane_key(task))
+                self.assertEqual(repository_key(task), "unknown")
+
+    def test_handler_errors_reach_the_caller(self):
+        def failing(task, workdir):
+            raise RuntimeError("boom")
+        scheduler = RemediationScheduler(failing, max_workers=1, workdir_root=self.root)
+        try:
+            with self.assertRaises(RuntimeError):
+                scheduler.run(diagnoser_task("org/app"), timeout=10)
+            self.assertEqual(scheduler.stats()["running"], 0)
+        finally:
+            scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
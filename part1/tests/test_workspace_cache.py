@@ -0,0 +1,109 @@
+"""
+Remediator workspace cache tests.
+Snapshots are keyed by repository and lockfile, never shared across
+repositories (or under 'unknown'), and evicted by size without racing restores.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the remediator-agent directory to the path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, 'part2', 'functions', 'remediator-agent'))
+
+from workspace_cache import WorkspaceCache, lockfile_hash, seed_workspace  # noqa: E402
+
+
+def manifests(name, lock="1"):
+    return {"package.json": json.dumps({"name": name}), "package-lock.json": json.dumps({"name": name, "v": lock})}
+
+
+class TestWorkspaceCache(unittest.TestCase):
+    """Restore/save/evict against a cache rooted in a temp directory."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = WorkspaceCache(root=os.path.join(self.tmp, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def workdir(self, files=None, modules=None):
+        path = tempfile.mkdtemp(dir=self.tmp)
+        seed_workspace(path, files)
+        if modules:
+            os.makedirs(os.path.join(path, "node_modules", modules))
+        return path
+
+    def snapshot(self, repository, files, modules):
+        source = self.workdir(files, modules)
+        return self.cache.save(repository, source, lockfile_hash(source))
+
+    def test_restore_exact_lockfile_then_latest(self):
+        self.snapshot("org/app", manifests("app", "1"), "left-pad")
+        self.snapshot("org/app", manifests("app", "2"), "right-pad")
+
+        exact = self.workdir(manifests("app", "1"))
+        self.assertEqual(self.cache.restore("org/app", exact), lockfile_hash(exact))
+        self.assertTrue(os.path.isdir(os.path.join(exact, "node_modules", "left-pad")))
+
+        other = self.workdir(manifests("app", "3"))
+        self.assertIsNotNone(self.cache.restore("org/app", other))
+        self.assertTrue(os.path.isdir(os.path.join(other, "node_modules", "right-pad")))
+        with open(os.path.join(other, "package-lock.json")) as fh:
+            self.assertEqual(json.load(fh)["v"], "3")  # the task's own files are kept
+
+    def test_no_snapshot_crosses_repositories(self):
+        self.snapshot("org/app", manifests("app"), "left-pad")
+        empty = self.workdir()
+        self.assertIsNone(self.cache.restore("org/other", empty))
+        self.assertEqual(os.listdir(empty), [])
+
+    def test_unknown_repository_is_never_cached(self):
+        for repository in ("unknown", ""):
+            with self.subTest(repository=repository):
+                self.assertIsNone(self.snapshot(repository, manifests("app"), "left-pad"))
+                self.assertIsNone(self.cache.restore(repository, self.workdir()))
+        self.assertEqual(self.cache.stats()["snapshots"], 0)
+
+    def test_eviction_keeps_total_under_budget(self):
+        self.cache.max_snapshot_bytes = 1
+        self.snapshot("org/a", manifests("a"), "x")
+        self.snapshot("org/b", manifests("b"), "y")
+        stats = self.cache.stats()
+        self.assertEqual(stats["snapshots"], 0)
+        self.assertEqual(stats["snapshot_bytes"], 0)
+
+    def test_restore_pins_its_snapshot_against_eviction(self):
+        key = self.snapshot("org/a", manifests("a"), "x")
+        entry = self.cache._index["snapshots"][f"org/a:{key}"]
+        target = self.workdir(manifests("a"))
+        copytree = shutil.copytree
+
+        def evict_midway(*args, **kwargs):
+            self.cache.max_snapshot_bytes = 0
+            with self.cache._lock:
+                self.cache._evict()
+            return copytree(*args, **kwargs)
+
+        with mock.patch("workspace_cache.shutil.copytree", side_effect=evict_midway):
+            self.assertEqual(self.cache.restore("org/a", target), key)
+        self.assertTrue(os.path.isdir(entry["path"]))
+        self.assertTrue(os.path.isdir(os.path.join(target, "node_modules", "x")))
+
+    def test_failed_restore_is_a_clean_miss(self):
+        self.snapshot("org/a", manifests("a"), "x")
+        target = self.workdir()
+        with mock.patch("workspace_cache.shutil.copytree", side_effect=OSError("gone")):
+            self.assertIsNone(self.cache.restore("org/a", target))
+        self.assertEqual(os.listdir(target), [])
+        self.assertEqual(self.cache._readers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
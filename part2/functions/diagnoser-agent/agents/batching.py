@@ -0,0 +1,79 @@
+# ============================================
+# 📦 agents/batching.py
+# Collects concurrent prompts for a few milliseconds (or until a batch is
+# full), hands them to a backend in one call and fans results back out.
+# ============================================
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+
+class MicroBatcher:
+    """
+    submit(item) -> Future. A worker thread waits for the first item, keeps
+    collecting until max_items are queued or max_wait_ms has passed since that
+    item arrived, then calls run_batch(items) -> results (same order; an
+    Exception in a slot fails only that caller). While a batch runs, the next
+    one accumulates, so batches grow with load and stay at size 1 when idle.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], max_items: int = 8,
+                 max_wait_ms: float = 20.0, name: str = "batcher"):
+        self.run_batch = run_batch
+        self.max_items = max(1, max_items)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Deque[Tuple[Any, Future]] = deque()
+        self._cond = threading.Condition()
+        self._stats = {"batches": 0, "items": 0, "largest": 0}
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._queue.append((item, future))
+            self._cond.notify()
+        return future
+
+    def _next_batch(self) -> List[Tuple[Any, Future]]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_items, len(self._queue)))]
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            items = [item for item, _ in batch]
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            with self._cond:
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+                self._stats["largest"] = max(self._stats["largest"], len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats, queued=len(self._queue))
+        stats["mean_size"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,106 @@
+# ============================================
+# 🖥️ agents/local_inference.py
+# Runs a small quantized GGUF model on CPU via llama.cpp (llama-cpp-python),
+# for offline / air-gapped diagnosis with no per-token cost.
+# ============================================
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", "")  # e.g. /models/qwen2.5-1.5b-instruct-q4_k_m.gguf
+CONTEXT_TOKENS = int(os.getenv("LOCAL_MODEL_CONTEXT", "4096"))
+BATCH_TOKENS = int(os.getenv("LOCAL_MODEL_BATCH", "512"))  # prompt tokens evaluated per step
+PROMPT_CACHE_BYTES = int(os.getenv("LOCAL_MODEL_PROMPT_CACHE_MB", "256")) * 1024 * 1024
+PRELOAD = os.getenv("LOCAL_MODEL_PRELOAD", "0") == "1"
+
+
+def default_threads() -> int:
+    """CPUs this process may run on (the cgroup/affinity view, not the host's core count)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+THREADS = int(os.getenv("LOCAL_MODEL_THREADS", "0")) or default_threads()
+
+
+def _messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+    head = [{"role": "system", "content": system}] if system else []
+    return head + [{"role": "user", "content": prompt}]
+
+
+class LocalModel:
+    """
+    One llama.cpp context, loaded once per instance. A context decodes a single
+    sequence at a time, so concurrent prompts take turns on the lock; the RAM
+    prompt cache lets prompts that share a prefix (the fixed instruction header)
+    skip re-evaluating it.
+    """
+
+    def __init__(self, path: str = MODEL_PATH, threads: int = THREADS):
+        self.path = path
+        self.threads = threads
+        self.load_seconds: Optional[float] = None
+        self._llm = None
+        self._error: Optional[str] = None
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._loaded.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                if not self.path or not os.path.exists(self.path):
+                    raise RuntimeError(f"LOCAL_MODEL_PATH not found: {self.path or '(unset)'}")
+                from llama_cpp import Llama, LlamaRAMCache
+                self._llm = Llama(
+                    model_path=self.path, n_ctx=CONTEXT_TOKENS, n_batch=BATCH_TOKENS,
+                    n_threads=self.threads, n_threads_batch=self.threads, verbose=False,
+                )
+                if PROMPT_CACHE_BYTES > 0:
+                    self._llm.set_cache(LlamaRAMCache(capacity_bytes=PROMPT_CACHE_BYTES))
+            except Exception as e:  # ImportError included: llama-cpp-python is optional
+                self._error = f"{type(e).__name__}: {e}"
+            self.load_seconds = time.perf_counter() - started
+            self._loaded.set()
+
+    def preload(self) -> threading.Thread:
+        """Load in the background so import (cold start) is not blocked; the first call waits if needed."""
+        thread = threading.Thread(target=self.load, name="local-model-load", daemon=True)
+        thread.start()
+        return thread
+
+    def complete(self, prompt: str, max_tokens: int = 300, temperature: float = 0.3,
+                 system: Optional[str] = None) -> Dict[str, Any]:
+        """OpenAI-style chat completion dict (choices, usage). Raises RuntimeError if the model is unavailable."""
+        if not self._loaded.is_set():
+            self.load()
+        if self._llm is None:
+            raise RuntimeError(self._error or "Local model not loaded")
+        with self._run_lock:
+            return self._llm.create_chat_completion(
+                messages=_messages(prompt, system), max_tokens=max_tokens, temperature=temperature,
+            )
+
+
+_model: Optional[LocalModel] = None
+_model_lock = threading.Lock()
+
+
+def get_local_model() -> LocalModel:
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = LocalModel()
+                if PRELOAD:
+                    _model.preload()
+    return _model
@@ -0,0 +1,175 @@
+# ============================================
+# 🗳️ ensemble.py (diagnoser-agent)
+# Asks several providers in parallel and votes on the normalized fix,
+# weighting each provider by the real outcomes of the fixes it proposed
+# (from the fix history) and by its latency.
+# ============================================
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from fix_history import learned_confidence
+
+PROVIDERS = [p.strip() for p in os.getenv("ENSEMBLE_PROVIDERS", "anthropic,openai,cloudflare").split(",") if p.strip()]
+QUORUM = float(os.getenv("ENSEMBLE_QUORUM", "0.5"))  # share of the total weight that ends the vote early
+TIMEOUT_SECONDS = float(os.getenv("ENSEMBLE_TIMEOUT_SECONDS", "25"))
+LATENCY_SCALE_SECONDS = float(os.getenv("ENSEMBLE_LATENCY_SCALE_SECONDS", "5"))  # latency at which a vote counts half
+LATENCY_ALPHA = 0.2
+STATS_TTL_SECONDS = float(os.getenv("ENSEMBLE_STATS_TTL_SECONDS", "300"))  # how often outcome counts are re-read
+
+
+def _prior_weights() -> Dict[str, float]:
+    """ENSEMBLE_WEIGHTS='anthropic=1.0,openai=0.9,cloudflare=0.6' (unlisted providers get 1.0)."""
+    weights = {}
+    for item in os.getenv("ENSEMBLE_WEIGHTS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            weights[name.strip()] = float(value)
+    return weights
+
+
+class ProviderRecord:
+    """
+    Outcomes of the fixes one provider proposed (successes/failures, read from
+    the fix history the outcome aggregator writes) and a latency EWMA.
+    """
+
+    def __init__(self, prior: float = 1.0):
+        self.prior = prior
+        self.successes = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+
+    @property
+    def accuracy(self) -> float:
+        return learned_confidence(self.successes, self.failures)
+
+    @property
+    def weight(self) -> float:
+        speed = 1.0 if self.latency is None else LATENCY_SCALE_SECONDS / (LATENCY_SCALE_SECONDS + self.latency)
+        return self.prior * self.accuracy * speed
+
+    def observe_latency(self, seconds: float) -> None:
+        self.latency = seconds if self.latency is None else LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * self.latency
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"weight": round(self.weight, 3), "accuracy": round(self.accuracy, 3),
+                "latency": None if self.latency is None else round(self.latency, 3),
+                "successes": self.successes, "failures": self.failures}
+
+
+class EnsembleDiagnoser:
+    """
+    Fans one prompt out to every provider through the ModelRouter, normalizes
+    each answer with `normalize(text) -> fix dict` and votes on fix["command"].
+    Returns as soon as one command holds more than QUORUM of the total weight.
+
+    Providers are weighted by the executed outcomes of the commands they
+    proposed, not by agreement with the ensemble (which would only reinforce
+    its own past decisions). The caller reports the winning command's
+    supporters with the fix; the outcome aggregator credits them in `history`.
+    Errors, empty answers and timeouts count for nothing.
+    """
+
+    def __init__(self, router: Any, normalize: Callable[[str], Dict[str, Any]], history: Any = None,
+                 providers: Optional[List[str]] = None, quorum: float = QUORUM, timeout: float = TIMEOUT_SECONDS):
+        self.router = router
+        self.normalize = normalize
+        self.providers = list(providers or PROVIDERS)
+        self.quorum = quorum
+        self.timeout = timeout
+        priors = _prior_weights()
+        self.records = {p: ProviderRecord(priors.get(p, 1.0)) for p in self.providers}
+        self.history = history
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4 * len(self.providers), thread_name_prefix="ensemble")
+
+    def _refresh(self) -> None:
+        """Re-read the providers' outcome counts from the fix history, at most every STATS_TTL_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            if self.history is None or (self._loaded_at is not None and now - self._loaded_at < STATS_TTL_SECONDS):
+                return
+            self._loaded_at = now  # one reader per interval; a failed read keeps the last counts until the next
+        try:
+            stats = self.history.provider_stats()
+        except Exception:
+            return
+        with self._lock:
+            for provider, record in self.records.items():
+                row = stats.get(provider) or {}
+                record.successes, record.failures = row.get("successes", 0), row.get("failures", 0)
+
+    def _ask(self, provider: str, prompt: str, system: Optional[str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = self.router.route(prompt, {"provider": provider, "system": system})
+        except Exception as e:
+            result = {"provider": provider, "response": None, "error": str(e)}
+        latency = time.perf_counter() - started
+        answer = {"latency": latency, "error": result.get("error")}
+        text = (result.get("response") or "").strip()
+        if not answer["error"] and text:
+            answer.update(text=text, fix=self.normalize(text))
+        elif not answer["error"]:
+            answer["error"] = "Empty response"
+        if "fix" in answer:  # a fast failure should not earn a speed bonus
+            with self._lock:
+                self.records[provider].observe_latency(latency)
+        return answer
+
+    def diagnose(self, prompt: str, system: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        `system` is the static instruction prefix (cacheable), `prompt` the per-event part.
+        Returns {"fix", "text", "provider", "supporters", "votes", "agreement", "quorum", "answers"}
+        or None when no provider produced an answer. `supporters` are the providers
+        that proposed the winning command: the ones its outcome should be credited to.
+        """
+        self._refresh()
+        with self._lock:
+            weights = {p: self.records[p].weight for p in self.providers}
+        total = sum(weights.values()) or 1.0
+        futures = {self._pool.submit(self._ask, p, prompt, system): p for p in self.providers}
+
+        tally: Dict[str, float] = {}
+        best: Dict[str, tuple] = {}  # command -> (weight, provider, answer) of its strongest supporter
+        answered, quorum_reached = {}, False
+        deadline = time.monotonic() + self.timeout
+        pending = set(futures)
+        while pending and not quorum_reached:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break  # timed out; decide with what has arrived
+            for future in done:
+                provider, answer = futures[future], future.result()
+                answered[provider] = answer
+                if "fix" not in answer:
+                    continue
+                command = answer["fix"]["command"]
+                tally[command] = tally.get(command, 0.0) + weights[provider]
+                if command not in best or weights[provider] > best[command][0]:
+                    best[command] = (weights[provider], provider, answer)
+                quorum_reached = quorum_reached or tally[command] > self.quorum * total
+
+        if not tally:
+            return None
+        winner = max(tally, key=lambda c: (tally[c], best[c][0]))
+        _, provider, answer = best[winner]
+        return {
+            "fix": answer["fix"], "text": answer["text"], "provider": provider,
+            "supporters": sorted(p for p, a in answered.items() if "fix" in a and a["fix"]["command"] == winner),
+            "votes": {command: round(weight, 3) for command, weight in tally.items()},
+            "agreement": round(tally[winner] / total, 3), "quorum": quorum_reached,
+            "answers": {p: {"latency": round(a["latency"], 3), "command": a["fix"]["command"] if "fix" in a else None,
+                            "error": a.get("error")} for p, a in answered.items()},
+        }
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {p: r.to_dict() for p, r in self.records.items()}
@@ -1,92 +1,243 @@
 # ============================================
-# 🧾 logging_utils.py (Improved for Readability)
-# Clean, scannable log blocks that prioritize the important information
-# and minimize noise for production environments.
+# 🧾 logging_utils.py (shared by every agent)
+# One structured JSON line per event (Cloud Logging jsonPayload), written
+# by a background thread so logging never blocks the request path.
 # ============================================
 
 from __future__ import annotations
+
+import atexit
+import contextvars
+import functools
 import json
-from typing import Iterable, Optional, Dict, Any
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # "json" | "text" (local runs)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # kept fraction of DEBUG lines
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+SEVERITIES = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "NOTICE": logging.INFO + 5,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+_LEVEL_NAMES = {level: name for name, level in SEVERITIES.items()}
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+_logger: Optional[logging.Logger] = None
+_queue: Optional[queue.Queue] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_init_lock = threading.Lock()
+dropped = 0  # records lost because the queue was full
+
+
+# ---------- trace correlation ----------
+
+def new_trace_id() -> str:
+    """32 hex chars: valid as a Cloud Trace / W3C trace id."""
+    return uuid.uuid4().hex
+
+
+def set_trace(trace_id: Optional[str] = None) -> str:
+    """Bind a trace id to the current context (a fresh one if None) and return it."""
+    trace_id = trace_id or new_trace_id()
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def get_trace() -> Optional[str]:
+    return _trace_id.get()
+
+
+# ---------- backend ----------
+
+class _JsonFormatter(logging.Formatter):
+    """Cloud Logging structured format; extra fields land in jsonPayload."""
+
+    def __init__(self):
+        super().__init__()
+        project = os.getenv("GCP_PROJECT") or os.getenv("GOOGLE_CLOUD_PROJECT") or os.getenv("GCLOUD_PROJECT")
+        self._trace_prefix = f"projects/{project}/traces/" if project else ""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "severity": _LEVEL_NAMES.get(record.levelno, record.levelname),
+            "message": record.getMessage(),
+            "agent": record.agent,
+            "timestamp": {"seconds": int(record.created), "nanos": int(record.created % 1 * 1e9)},
+        }
+        if record.trace_id:
+            entry["trace_id"] = record.trace_id
+            if self._trace_prefix:
+                entry["logging.googleapis.com/trace"] = self._trace_prefix + record.trace_id
+        head = json.dumps(entry, default=str, separators=(",", ":"), ensure_ascii=False)
+        if record.fields == "{}":
+            return head
+        return head[:-1] + "," + record.fields[1:]  # fields were rendered when the event was logged
+
+
+class _TextFormatter(logging.Formatter):
+    """Single-line human format for local runs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{record.agent} {record.getMessage()}"
+        if record.fields != "{}":
+            line += " " + record.fields
+        return line
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a full queue drops the record and counts it."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # formatting happens on the listener thread
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
+
+
+def _get_logger() -> logging.Logger:
+    global _logger
+    if _logger is None:
+        with _init_lock:  # concurrent first calls must not start two listeners
+            if _logger is None:
+                _logger = _start_logger()
+    return _logger
+
+
+def _start_logger() -> logging.Logger:
+    global _queue, _listener
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(_TextFormatter() if LOG_FORMAT == "text" else _JsonFormatter())
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_queue, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger("agents")
+    logger.setLevel(SEVERITIES.get(LOG_LEVEL, logging.INFO))
+    logger.propagate = False
+    logger.addHandler(_DroppingQueueHandler(_queue))
+    return logger
+
+
+def flush(timeout: float = 2.0) -> None:
+    """Wait (bounded) for queued records to be written; call before an invocation returns."""
+    if _queue is None:
+        return
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.002)
+    sys.stdout.flush()
 
 
-def log_block(
+def flush_after(func):
+    """Decorator for function entry points: flush queued logs when the invocation ends."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            flush()
+    return wrapper
+
+
+# ---------- public API ----------
+
+def log_event(
     agent: str,
-    title: str,
-    lines: Optional[Iterable[str]] = None,
-    mini: Optional[Dict[str, Any]] = None,
-    simple: bool = False,  # NEW: Simple mode for less verbose output
+    message: str,
+    *args: Any,
+    severity: str = "INFO",
+    sample_rate: Optional[float] = None,
+    **fields: Any,
 ) -> None:
     """
-    Clean log block optimized for Cloud Functions readability.
+    Emit one structured record.
 
-    agent: e.g. "🧠 [Diagnoser]" or "🛠️ [Remediator]"
-    title: e.g. "Event received", "Diagnosis ready"
-    lines: key information to display
-    mini: compact JSON for essential data
-    simple: if True, uses single-line format for brevity
+    message/args: %-style, only formatted if the record is actually written
+    severity: Cloud Logging severity name
+    sample_rate: fraction of calls kept (defaults to LOG_SAMPLE_RATE for DEBUG)
+    fields: extra jsonPayload fields (durations, ids, provider, ...), rendered to
+            JSON here: the caller may keep mutating them after the record is queued
     """
-
-    if simple:
-        # Single-line format for key events
-        header = f"{agent} {title}"
-        if lines:
-            details = " | ".join(str(line).strip() for line in lines if line)
-            print(f"{header} | {details}")
-        else:
-            print(header)
+    logger = _get_logger()
+    level = SEVERITIES.get(severity, logging.INFO)
+    if not logger.isEnabledFor(level):
+        return
+    if sample_rate is None and level == logging.DEBUG:
+        sample_rate = LOG_SAMPLE_RATE
+    if sample_rate is not None and sample_rate < 1.0 and random.random() >= sample_rate:
         return
+    if sample_rate is not None and sample_rate < 1.0:
+        fields["sample_rate"] = sample_rate
+    rendered = json.dumps(fields, default=str, separators=(",", ":"), ensure_ascii=False)
+    logger.log(level, message, *args, extra={"agent": agent, "trace_id": _trace_id.get(), "fields": rendered})
 
-    # Multi-line format for detailed events
-    buf = [f"{agent} {title}"]
 
+def log_block(
+    agent: str,
+    title: str,
+    lines: Optional[Iterable[str]] = None,
+    mini: Optional[Dict[str, Any]] = None,
+    simple: bool = False,
+) -> None:
+    """
+    One record for a titled group of details (lines -> "details", mini -> "data").
+    `simple` is accepted for compatibility; every block is a single entry now.
+    """
+    fields: Dict[str, Any] = {}
     if lines:
-        for line in lines:
-            if line and str(line).strip():
-                print(f"  • {str(line).strip()}")
-
-    # Add mini JSON on separate line if provided
+        fields["details"] = [str(line).strip() for line in lines if line and str(line).strip()]
     if mini:
-        try:
-            compact = json.dumps(mini, separators=(",", ":"))
-            print(f"  → {compact}")
-        except Exception:
-            pass
-
-    print()  # Blank line for readability
+        fields["data"] = mini
+    log_event(agent, title, **fields)
 
 
 def log_simple(agent: str, message: str) -> None:
     """Ultra-simple one-liner for basic events."""
-    print(f"{agent} {message}")
+    log_event(agent, message)
 
 
-def log_error(agent: str, error: str) -> None:
-    """Clean error logging."""
-    print(f"❌ {agent} ERROR: {error}")
+def log_error(agent: str, error: str, **fields: Any) -> None:
+    """Error record (ERROR severity)."""
+    log_event(agent, "%s", error, severity="ERROR", **fields)
 
 
 def log_success(agent: str, message: str, details: Optional[str] = None) -> None:
     """Success with optional details."""
-    print(f"✅ {agent} {message}")
     if details:
-        print(f"  → {details}")
-    print()
+        log_event(agent, message, status="success", details=details)
+    else:
+        log_event(agent, message, status="success")
 
 
 # ============================================
 # 🎯 Usage Examples:
 #
-# # Simple events
-# log_simple("🧠 [Diagnoser]", "Event received (Cloudflare)")
-#
-# # Detailed events
-# log_block("🧠 [Diagnoser]", "Diagnosis ready",
-#          lines=["React 18 dependency conflict detected"])
+# set_trace(event.get("trace_id"))        # once per invocation
 #
-# # Success events
-# log_success("🧠 [Diagnoser]", "Published to diagnosis-events",
-#            "Message ID: 123456")
+# log_event("[Diagnoser]", "Diagnosis ready", provider="anthropic", duration_seconds=1.42)
+# log_event("[Diagnoser]", "Raw event: %s", event, severity="DEBUG")   # sampled
+# log_error("[Diagnoser]", "Failed to parse event data", error_type="validation")
 #
-# # Errors
-# log_error("🧠 [Diagnoser]", "Failed to parse event data")
+# flush()                                 # before the function returns
 # ============================================
@@ -5,12 +5,34 @@ import time
 import uuid
 
 import functions_framework
-from google.cloud import pubsub_v1
 
 # Lazy-load the model router
 from agents.model_router import ModelRouter
+from fix_history import error_signature, get_history
+from logging_utils import flush_after, log_error, log_event
+from tracing import init as init_tracing, inject, record, span, start_trace
+
+AGENT = "[Diagnoser]"
+init_tracing(AGENT)
+
+DIAGNOSER_MODE = os.getenv("DIAGNOSER_MODE", "single").lower()  # single | ensemble | cascade
+DIAGNOSER_PROVIDER = os.getenv("DIAGNOSER_PROVIDER", "anthropic")
+DIAGNOSER_MAX_COST_USD = float(os.getenv("DIAGNOSER_MAX_COST_USD", "0.01"))  # per event, cascade mode
+
+# Identical on every call, so it is sent as the system prefix that providers can cache
+INSTRUCTIONS = (
+    "Analyze this CI/CD failure and propose a safe, specific fix "
+    "as a one-line command, plus a short diagnosis. If unsure, pick the safest, "
+    "non-destructive remediation."
+)
 
 router = None  # initialized on first invocation
+_ensemble = None
+
+if os.getenv("LOCAL_MODEL_PRELOAD", "0") == "1":
+    # Load the local model in the background while the instance boots, not on the first event
+    from agents.local_inference import get_local_model
+    get_local_model()
 
 
 def _decode_pubsub_message(cloud_event):
@@ -27,6 +49,52 @@ def _decode_pubsub_message(cloud_event):
     return message or data
 
 
+def _normalize(text):
+    """Map a model answer onto a structured fix (command, fix_type, risk, confidence, diagnosis)."""
+    lower = text.lower()
+
+    # Better pattern matching for consistent field mapping
+    if "legacy-peer-deps" in lower or "peer-deps" in lower:
+        return {"command": "npm install --legacy-peer-deps", "fix_type": "npm_fix", "risk": "low",
+                "confidence": 0.9, "diagnosis": "react dependency conflict"}
+    if "npm install" in lower and "react" in lower:
+        return {"command": "npm install --save", "fix_type": "npm_fix", "risk": "low",
+                "confidence": 0.8, "diagnosis": "react version mismatch"}
+    if "npm ci" in lower or "clean install" in lower:
+        return {"command": "npm ci", "fix_type": "npm_fix", "risk": "low",
+                "confidence": 0.7, "diagnosis": "npm cache issue"}
+    return {"command": "echo 'manual review required'", "fix_type": "manual_review", "risk": "high",
+            "confidence": 0.3, "diagnosis": "complex issue requiring manual review"}
+
+
+def _log_usage(call, ai, prompt, cost=None):
+    """Cost and prompt-cache hits of one model answer (the analytics function picks these fields up)."""
+    from agents.model_router import estimate_cost
+    cache = ai.get("cache") or {}
+    if cost is None:
+        # the configured model id; the response's own model field is a dated snapshot id
+        model = ai.get("model") or getattr(ai.get("raw"), "model", None)
+        cost = estimate_cost(ai.get("provider", ""), model, ai, INSTRUCTIONS + prompt)
+    for key, value in cache.items():
+        call.set_attribute(key, value)
+    log_event(AGENT, "Model usage", provider=ai.get("provider"), estimated_cost=round(cost, 6), **cache)
+
+
+def _get_ensemble():
+    """Ensemble over ENSEMBLE_PROVIDERS, weighted by the fix-history outcomes of each provider's fixes."""
+    global _ensemble
+    if _ensemble is None:
+        from ensemble import EnsembleDiagnoser
+        try:
+            history = get_history()
+        except Exception as e:
+            history = None
+            log_event(AGENT, "Fix history unavailable, ensemble weights use priors only", severity="WARNING",
+                      error=str(e))
+        _ensemble = EnsembleDiagnoser(router, _normalize, history)
+    return _ensemble
+
+
 def _resolve_validation_topic():
     """
     FIXED: Use validation-requests topic consistently.
@@ -48,105 +116,168 @@ def _resolve_validation_topic():
 
 
 @functions_framework.cloud_event
+@flush_after
 def diagnose_event(cloud_event):
     """
     Pub/Sub-triggered function:
       - Decodes pipeline event
-      - Asks ModelRouter for a diagnosis
+      - Reuses a known-good fix from the fix history, else asks ModelRouter for a diagnosis
+        (DIAGNOSER_MODE=ensemble: every provider in parallel, weighted vote;
+         DIAGNOSER_MODE=cascade: cheapest model first, escalating within a cost ceiling)
       - Publishes a normalized diagnosis to the validation-requests topic
+    Each stage is timed; the trace continues in the published metadata.
     """
     global router
 
     # Init router lazily (secrets only available at runtime)
     if router is None:
         router = ModelRouter()
-        print("[Diagnoser] ModelRouter initialized")
+        log_event(AGENT, "ModelRouter initialized")
 
     # Decode event
+    decode_started = time.perf_counter()
     event = _decode_pubsub_message(cloud_event)
-    print(f"[Diagnoser] Processing pipeline event: {event}")
-
-    # Build prompt for analysis
-    prompt = (
-        "Analyze this CI/CD failure and propose a safe, specific fix "
-        "as a one-line command, plus a short diagnosis. If unsure, pick the safest, "
-        "non-destructive remediation.\n\n"
-        f"Build Status: {event.get('buildStatus','unknown')}\n"
-        f"Step: {event.get('step','unknown')}\n"
-        f"Error: {event.get('error') or event.get('log','no details')}\n"
-        f"Provider: {event.get('provider','unknown')}\n"
-    )
+    start_trace(event)
 
-    # Call the router
-    try:
-        ai = router.route(prompt, {"provider": "anthropic"})  # adjust provider if you want
-        if ai.get("error"):
-            raise RuntimeError(ai["error"])
-        text = (ai.get("response") or "").strip()
-    except Exception as e:
-        # Soft-fallback so the pipeline keeps moving
-        text = (
-            "Diagnosis: Dependency conflict in npm install.\n"
-            "Command: npm install --legacy-peer-deps\n"
-            f"(fallback due to AI error: {e})"
+    with span("diagnose", repository=event.get("repository", "unknown")) as root:
+        record("decode", time.perf_counter() - decode_started)
+        log_event(
+            AGENT, "Processing pipeline event",
+            repository=event.get("repository", "unknown"), build_id=event.get("buildId", "unknown"),
+            step=event.get("step", "unknown"),
         )
-        print(f"[Diagnoser] AI analysis failed, using fallback: {e}")
+        log_event(AGENT, "Pipeline event payload", severity="DEBUG", event=event)
 
-    # IMPROVED: More robust heuristic normalization
-    lower = text.lower()
-    
-    # Better pattern matching for consistent field mapping
-    if "legacy-peer-deps" in lower or "peer-deps" in lower:
-        command = "npm install --legacy-peer-deps"
-        fix_type = "npm_fix"
-        risk = "low"
-        conf = 0.9
-        diagnosis = "react dependency conflict"
-    elif "npm install" in lower and "react" in lower:
-        command = "npm install --save"
-        fix_type = "npm_fix"
-        risk = "low"
-        conf = 0.8
-        diagnosis = "react version mismatch"
-    elif "npm ci" in lower or "clean install" in lower:
-        command = "npm ci"
-        fix_type = "npm_fix"
-        risk = "low"
-        conf = 0.7
-        diagnosis = "npm cache issue"
-    else:
-        command = "echo 'manual review required'"
-        fix_type = "manual_review"
-        risk = "high"
-        conf = 0.3
-        diagnosis = "complex issue requiring manual review"
-
-    payload = {
-        # generate a stable-enough id for tracing
-        "id": f"diag-{int(time.time())}-{uuid.uuid4().hex[:8]}",
-        "diagnosis": diagnosis,  # CONSISTENT naming
-        "fix_type": fix_type,
-        "command": command,
-        "risk": risk,
-        "confidence": conf,
-        "metadata": {
-            "repository": event.get("repository", "unknown"),
-            "buildId": event.get("buildId", "unknown"),
-            "provider": event.get("provider", "unknown"),
-            "step": event.get("step", "unknown"),
-        },
-        "ai_response": text[:200] + "..." if len(text) > 200 else text,  # Store original response
-        "diagnosis_timestamp": time.time()
-    }
-
-    # Publish to validator (validation-requests topic)
-    try:
-        topic_path = _resolve_validation_topic()
-        publisher = pubsub_v1.PublisherClient()
-        publisher.publish(topic_path, json.dumps(payload).encode("utf-8"))
-        print(f"[Diagnoser] Published diagnosis to validation: {payload}")
-        return {"status": "ok"}
-    except Exception as e:
-        print(f"[Diagnoser] Publish failed: {e}")
-        # still return ok to avoid retries storm; validator just won't receive this one
-        return {"status": "publish_failed", "error": str(e)}
\ No newline at end of file
+        repository, step = event.get("repository", "unknown"), event.get("step", "unknown")
+        signature = error_signature(event.get("error") or event.get("log", ""))
+
+        # Known-good fix for this exact failure? Reuse it without asking a model
+        known, history, ensemble, cascade = None, None, None, None
+        with span("history_lookup") as lookup:
+            try:
+                history = get_history()
+                known = history.lookup(repository, step, signature) if history else None
+            except Exception as e:
+                log_event(AGENT, "Fix history lookup failed", severity="WARNING", error=str(e))
+            lookup.set_attribute("hit", bool(known))
+
+        if known:
+            command, fix_type, risk = known["command"], known["fix_type"], known["risk"]
+            conf = known["confidence"]
+            diagnosis = f"known failure, fixed {known['successes']} times before ({known['scope']} history)"
+            text = f"Reused from fix history: {command}"
+            log_event(AGENT, "Reusing known-good fix", signature=signature, command=command,
+                      successes=known["successes"], failures=known["failures"], scope=known["scope"])
+        else:
+            # Build prompt for analysis (event details only; the instructions go in the cacheable system prefix)
+            with span("prompt_build"):
+                prompt = (
+                    f"Build Status: {event.get('buildStatus','unknown')}\n"
+                    f"Step: {event.get('step','unknown')}\n"
+                    f"Error: {event.get('error') or event.get('log','no details')}\n"
+                    f"Provider: {event.get('provider','unknown')}\n"
+                )
+
+            # Call the router (one provider, or every provider voting)
+            with span("model_call", mode=DIAGNOSER_MODE) as call:
+                try:
+                    if DIAGNOSER_MODE == "ensemble":
+                        decision = _get_ensemble().diagnose(prompt, system=INSTRUCTIONS)
+                        if decision is None:
+                            raise RuntimeError("No ensemble provider answered")
+                        text = decision["text"]
+                        ensemble = {key: decision[key] for key in ("provider", "supporters", "votes", "agreement", "quorum")}
+                        call.set_attribute("provider", decision["provider"])
+                        call.set_attribute("agreement", decision["agreement"])
+                        log_event(AGENT, "Ensemble decision", **ensemble, answers=decision["answers"])
+                    elif DIAGNOSER_MODE == "cascade":
+                        # Escalate only while the answer does not map to a confident, known fix
+                        ai = router.route(prompt, {
+                            "provider": "cascade", "system": INSTRUCTIONS,
+                            "accept": lambda answer: _normalize(answer)["confidence"],
+                            "max_cost_usd": DIAGNOSER_MAX_COST_USD,
+                        })
+                        cascade = dict(ai.get("cascade") or {}, provider=ai.get("provider"))
+                        call.set_attribute("provider", ai.get("provider"))
+                        call.set_attribute("escalations", cascade.get("escalations", 0))
+                        call.set_attribute("cost_usd", cascade.get("cost_usd", 0.0))
+                        log_event(AGENT, "Cascade finished", **cascade)
+                        if ai.get("error"):
+                            raise RuntimeError(ai["error"])
+                        text = (ai.get("response") or "").strip()
+                        _log_usage(call, ai, prompt, cost=cascade.get("cost_usd"))
+                    else:
+                        call.set_attribute("provider", DIAGNOSER_PROVIDER)
+                        ai = router.route(prompt, {"provider": DIAGNOSER_PROVIDER, "system": INSTRUCTIONS})
+                        if ai.get("error"):
+                            raise RuntimeError(ai["error"])
+                        text = (ai.get("response") or "").strip()
+                        _log_usage(call, ai, prompt)
+                except Exception as e:
+                    # Soft-fallback so the pipeline keeps moving
+                    text = (
+                        "Diagnosis: Dependency conflict in npm install.\n"
+                        "Command: npm install --legacy-peer-deps\n"
+                        f"(fallback due to AI error: {e})"
+                    )
+                    call.set_attribute("fallback", True)
+                    log_event(AGENT, "AI analysis failed, using fallback", severity="WARNING", error=str(e))
+
+            with span("normalize"):
+                fix = _normalize(text)
+                command, fix_type, risk = fix["command"], fix["fix_type"], fix["risk"]
+                conf, diagnosis = fix["confidence"], fix["diagnosis"]
+                if ensemble:
+                    conf = round(conf * (0.5 + 0.5 * ensemble["agreement"]), 3)  # split votes lower confidence
+
+                # Outcomes of this command against this failure beat the heuristic prior
+                try:
+                    past = history.stats(repository, step, signature, command) if history else None
+                except Exception:
+                    past = None
+                if past:
+                    conf = past["confidence"]
+
+        payload = {
+            # generate a stable-enough id for tracing
+            "id": f"diag-{int(time.time())}-{uuid.uuid4().hex[:8]}",
+            "diagnosis": diagnosis,  # CONSISTENT naming
+            "fix_type": fix_type,
+            "command": command,
+            "risk": risk,
+            "confidence": conf,
+            "metadata": {
+                "repository": event.get("repository", "unknown"),
+                "buildId": event.get("buildId", "unknown"),
+                "provider": event.get("provider", "unknown"),
+                "step": event.get("step", "unknown"),
+                "error_signature": signature,
+            },
+            "ai_response": text[:200] + "..." if len(text) > 200 else text,  # Store original response
+            "diagnosis_timestamp": time.time()
+        }
+        if ensemble and command == decision["fix"]["command"]:
+            # the outcome aggregator credits these providers with how this fix turns out
+            payload["metadata"]["ensemble_providers"] = ensemble["supporters"]
+        if isinstance(event.get("workspace"), dict):
+            payload["metadata"]["workspace"] = event["workspace"]  # manifests the remediator seeds its workdir with
+        root.set_attribute("diagnosis_id", payload["id"])
+
+        # Publish to validator (validation-requests topic)
+        try:
+            with span("publish"):
+                from google.cloud import pubsub_v1  # deferred: keeps it off the cold-start path
+                topic_path = _resolve_validation_topic()
+                publisher = pubsub_v1.PublisherClient()
+                inject(payload["metadata"])
+                publisher.publish(topic_path, json.dumps(payload).encode("utf-8"))
+            log_event(
+                AGENT, "Published diagnosis to validation", status="success",
+                diagnosis_id=payload["id"], fix_type=fix_type, risk=risk, confidence=conf,
+            )
+            log_event(AGENT, "Diagnosis payload", severity="DEBUG", payload=payload)
+            return {"status": "ok"}
+        except Exception as e:
+            log_error(AGENT, f"Publish failed: {e}", diagnosis_id=payload["id"])
+            # still return ok to avoid retries storm; validator just won't receive this one
+            return {"status": "publish_failed", "error": str(e)}
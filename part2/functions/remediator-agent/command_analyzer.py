@@ -0,0 +1,232 @@
+# ============================================
+# 🔎 command_analyzer.py (remediator-agent)
+# Parses a command once (pipelines, redirections, substitutions) and
+# classifies each argv against compiled allow/deny tables.
+# ============================================
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shlex
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+SEPARATORS = frozenset({"&&", "||", ";", "&"})
+PIPES = frozenset({"|", "|&"})
+REDIRECTIONS = frozenset({">", ">>", "<", "<<", "<<<", ">&", "<&", "&>", "&>>", ">|"})
+OPERATOR_CHARS = frozenset("();<>|&")
+SUBSTITUTION_MARKERS = ("$(", "`", "${", "<(", ">(")
+
+# Programs that are never run, whatever their arguments
+DENY_PROGRAMS = frozenset({
+    "sudo", "su", "doas", "dd", "fdisk", "parted", "mkfs", "shutdown", "reboot", "halt",
+    "poweroff", "kill", "killall", "pkill", "eval", "exec", "source", "passwd", "format",
+    "sh", "bash", "zsh", "dash",
+})
+
+# Argument-level denies: program -> flags that make it dangerous
+DENY_FLAGS = {
+    "rm": frozenset({"-r", "-R", "-f", "--recursive", "--force", "--no-preserve-root"}),
+    "chown": frozenset({"-R", "--recursive"}),
+    "chmod": frozenset({"777", "-R", "--recursive"}),
+    "git": frozenset({"-c", "--config-env", "--exec-path", "--upload-pack", "--receive-pack"}),
+}
+
+PROTECTED_PATHS = ("/etc", "/var", "/usr", "/bin", "/sbin", "/boot", "/dev", "/proc", "/sys", "/root")
+
+# Allow table: program -> allowed first arguments (None = any arguments)
+ALLOW_SUBCOMMANDS: Dict[str, Optional[frozenset]] = {
+    "npm": frozenset({"install", "update", "ci"}),
+    "git": frozenset({"pull", "checkout", "reset"}),
+    "pip": frozenset({"install", "upgrade"}),
+    "echo": None,
+    "cat": None,
+    "ls": None,
+    "pwd": None,
+    "touch": None,
+    "mkdir": None,
+}
+
+# Flags an allowed program must carry
+REQUIRED_FLAGS = {"mkdir": frozenset({"-p", "--parents"})}
+
+CACHE_SIZE = 2048
+
+
+def _expand_flags(arg: str) -> List[str]:
+    """"-rf" -> ["-rf", "-r", "-f"]; "--opt=value" -> ["--opt=value", "--opt"]."""
+    flags = [arg]
+    if arg.startswith("--") and "=" in arg:
+        flags.append(arg.split("=", 1)[0])
+    if len(arg) > 2 and arg[0] == "-" and arg[1] != "-" and "=" not in arg and arg[1:].isalpha():
+        flags.extend(f"-{ch}" for ch in arg[1:])
+    return flags
+
+
+def _is_protected_path(arg: str) -> bool:
+    value = arg.split("=", 1)[1] if arg.startswith("-") and "=" in arg else arg
+    if ".." in value.replace("\\", "/").split("/"):
+        return True  # relative traversal out of the task's working directory
+    if not value.startswith("/"):
+        return False
+    path = os.path.normpath(value)
+    return path == "/" or any(path == p or path.startswith(p + "/") for p in PROTECTED_PATHS)
+
+
+def _is_operator(token: str) -> bool:
+    return bool(token) and set(token) <= OPERATOR_CHARS
+
+
+def parse(command: str) -> Dict[str, Any]:
+    """
+    Parse a command line into its structure:
+        {"commands": [argv, ...], "pipes": int, "separators": int,
+         "redirections": [...], "substitutions": [...]}
+    Raises ValueError on unbalanced quotes.
+    """
+    substitutions = [m for m in SUBSTITUTION_MARKERS if m in command]
+
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+
+    structure: Dict[str, Any] = {
+        "commands": [],
+        "pipes": 0,
+        "separators": 0,
+        "redirections": [],
+        "substitutions": substitutions,
+    }
+    current: List[str] = []
+    for token in lexer:
+        if token in PIPES or token in SEPARATORS:
+            structure["pipes" if token in PIPES else "separators"] += 1
+            if current:
+                structure["commands"].append(current)
+            current = []
+        elif token in REDIRECTIONS or (_is_operator(token) and ("<" in token or ">" in token)):
+            structure["redirections"].append(token)
+        elif _is_operator(token):
+            # subshell parens and stray operators like ";;"
+            structure["separators"] += 1
+        else:
+            current.append(token)
+    if current:
+        structure["commands"].append(current)
+    return structure
+
+
+def classify_argv(argv: List[str]) -> Tuple[str, str]:
+    """
+    Classify one simple command against the compiled tables.
+    Returns ("deny" | "allow" | "review", reason).
+    """
+    if "=" in argv[0] and not argv[0].startswith("-"):
+        return "review", f"Environment assignment: {argv[0]}"
+
+    program = os.path.basename(argv[0]).lower()
+    args = argv[1:]
+
+    if program in DENY_PROGRAMS or program.startswith("mkfs."):
+        return "deny", f"Dangerous program: {program}"
+
+    deny_flags = DENY_FLAGS.get(program)
+    flags = {f for arg in args for f in _expand_flags(arg)}
+    if deny_flags:
+        hit = sorted(deny_flags & flags)
+        if hit:
+            return "deny", f"Dangerous arguments for {program}: {' '.join(hit)}"
+
+    for arg in args:
+        if _is_protected_path(arg):
+            return "deny", f"Protected path or traversal: {arg}"
+
+    if program not in ALLOW_SUBCOMMANDS:
+        return "review", f"Program not in allow table: {program}"
+
+    allowed = ALLOW_SUBCOMMANDS[program]
+    if allowed is not None:
+        subcommand = next((a for a in args if not a.startswith("-")), None)
+        if subcommand not in allowed:
+            return "review", f"Subcommand not in allow table: {program} {subcommand or ''}".rstrip()
+        pattern = f"{program} {subcommand}"
+    else:
+        pattern = program
+
+    required = REQUIRED_FLAGS.get(program)
+    if required and not (required & flags):
+        return "review", f"{program} requires one of: {' '.join(sorted(required))}"
+
+    return "allow", pattern
+
+
+class CommandAnalyzer:
+    """
+    Structural command analysis with a verdict cache keyed by the sha256 of
+    the command text. Verdicts: {"safe": bool, "verdict": str, "reason": str,
+    "structure": {...}}.
+    """
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, command: str) -> Dict[str, Any]:
+        key = hashlib.sha256(command.encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        verdict = self._analyze(command)
+        with self._lock:
+            self._cache[key] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    def _analyze(self, command: str) -> Dict[str, Any]:
+        try:
+            structure = parse(command)
+        except ValueError as e:
+            return self._verdict("deny", f"Unparseable command: {e}", None)
+
+        if structure["substitutions"]:
+            return self._verdict("deny", f"Command substitution: {structure['substitutions'][0]}", structure)
+        if structure["redirections"]:
+            return self._verdict("deny", f"Redirection: {structure['redirections'][0]}", structure)
+        if not structure["commands"]:
+            return self._verdict("review", "Empty command", structure)
+
+        # Classify every argv so a deny anywhere wins over an allow elsewhere
+        results = [classify_argv(argv) for argv in structure["commands"]]
+        for decision, reason in results:
+            if decision == "deny":
+                return self._verdict("deny", reason, structure)
+        if structure["pipes"] or structure["separators"]:
+            # The executor runs a single argv without a shell
+            return self._verdict("review", "Pipelines and command lists require manual review", structure)
+        decision, reason = results[0]
+        return self._verdict(decision, reason, structure)
+
+    @staticmethod
+    def _verdict(decision: str, reason: str, structure: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if decision == "allow":
+            reason = f"Safe command pattern: {reason}"
+        elif decision == "deny":
+            reason = f"Dangerous pattern detected: {reason}"
+        else:
+            reason = f"Command requires manual review ({reason})"
+        return {"safe": decision == "allow", "verdict": decision, "reason": reason, "structure": structure}
+
+    def is_safe(self, command: str) -> Tuple[bool, str]:
+        """(safe, reason), the contract of the remediator's _is_safe_command."""
+        verdict = self.analyze(command)
+        return verdict["safe"], verdict["reason"]
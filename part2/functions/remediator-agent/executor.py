@@ -0,0 +1,214 @@
+# ============================================
+# ⚙️ executor.py (remediator-agent)
+# Shell-free command execution: shlex tokenization, direct exec,
+# bounded output capture, prlimit-applied rlimits and resource usage reporting.
+# ============================================
+
+from __future__ import annotations
+
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource  # POSIX only
+except ImportError:  # pragma: no cover - Cloud Functions always run on Linux
+    resource = None
+
+# Tokens that only mean something to a shell; we never start one
+SHELL_OPERATORS = {"&&", "||", ";", "|", "&", ">", ">>", "<", "<<", "(", ")"}
+
+DEFAULT_MAX_OUTPUT_BYTES = int(os.getenv("REMEDIATOR_MAX_OUTPUT_BYTES", "65536"))
+DEFAULT_MEMORY_MB = int(os.getenv("REMEDIATOR_MEMORY_MB", "2048"))  # RLIMIT_DATA cap per command (0 disables)
+READ_CHUNK_BYTES = 4096
+POLL_INTERVAL = 0.05
+
+
+class RingBuffer:
+    """Keeps only the last `capacity` bytes written, plus a running total."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.total_bytes = 0
+        self._buf = bytearray()
+
+    def write(self, chunk: bytes) -> None:
+        self.total_bytes += len(chunk)
+        if len(chunk) >= self.capacity:
+            self._buf = bytearray(chunk[-self.capacity:])
+            return
+        self._buf += chunk
+        overflow = len(self._buf) - self.capacity
+        if overflow > 0:
+            del self._buf[:overflow]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self._buf)
+
+    def text(self) -> str:
+        return self._buf.decode("utf-8", errors="replace")
+
+
+def split_command(command: str) -> List[str]:
+    """
+    Tokenize a command with shlex. Raises ValueError for empty commands,
+    unbalanced quotes, or shell operators (there is no shell to run them).
+    """
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    argv = list(lexer)
+    if not argv:
+        raise ValueError("Empty command")
+    operators = [t for t in argv if t in SHELL_OPERATORS]
+    if operators:
+        raise ValueError(f"Shell operators are not supported: {' '.join(operators)}")
+    return argv
+
+
+def _limit_resources(pid: int, cpu_seconds: Optional[int], memory_mb: Optional[int]) -> None:
+    """
+    Apply rlimits to a started child with prlimit(2). (A preexec_fn would run
+    between fork and exec, which is unsafe once run_command is called from
+    worker threads.) Memory is capped with RLIMIT_DATA - heap and private
+    writable mappings - not RLIMIT_AS: node/V8 reserves far more virtual
+    address space than it ever touches and fails to start under an AS cap.
+    Children the command spawns (npm -> node) inherit the limits.
+    """
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        if cpu_seconds:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_DATA, (limit, limit))
+    except (ProcessLookupError, PermissionError):
+        pass  # already exited, or not ours to limit (sandboxed runtimes)
+
+
+def _pump(stream, sink: RingBuffer) -> None:
+    """Copy a pipe into a ring buffer until EOF."""
+    try:
+        for chunk in iter(lambda: stream.read(READ_CHUNK_BYTES), b""):
+            sink.write(chunk)
+    finally:
+        stream.close()
+
+
+def _wait(proc: subprocess.Popen, deadline: float):
+    """
+    Reap the child with wait4 so its rusage is reported.
+    Returns (status, rusage) or (None, None) if the deadline passed.
+    """
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return status, usage
+        if time.monotonic() >= deadline:
+            return None, None
+        time.sleep(POLL_INTERVAL)
+
+
+def run_command(
+    command: str,
+    timeout: int = 300,
+    cwd: str = "/tmp",
+    env: Optional[Dict[str, str]] = None,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+    cpu_seconds: Optional[int] = None,
+    memory_mb: Optional[int] = DEFAULT_MEMORY_MB,
+) -> Dict[str, Any]:
+    """
+    Execute a command without a shell.
+
+    Output is streamed through bounded ring buffers (the tail is kept), the
+    child runs in its own process group under CPU/data-segment rlimits and
+    is killed at the wall-clock timeout. Returns a dict with success,
+    returncode, stdout/stderr tails, byte counts and resource usage.
+    """
+    result: Dict[str, Any] = {
+        "success": False,
+        "returncode": None,
+        "stdout": "",
+        "stderr": "",
+        "stdout_bytes": 0,
+        "stderr_bytes": 0,
+        "output_truncated": False,
+        "timed_out": False,
+        "usage": {},
+        "error": None,
+    }
+
+    try:
+        argv = split_command(command)
+    except ValueError as e:
+        result["error"] = result["stderr"] = str(e)
+        return result
+
+    stdout_buf = RingBuffer(max_output_bytes)
+    stderr_buf = RingBuffer(max_output_bytes)
+    started = time.monotonic()
+
+    try:
+        proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+            start_new_session=True,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        result["error"] = result["stderr"] = f"Failed to start {argv[0]}: {e}"
+        return result
+    _limit_resources(proc.pid, cpu_seconds or timeout, memory_mb)
+
+    pumps = [
+        threading.Thread(target=_pump, args=(proc.stdout, stdout_buf), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, stderr_buf), daemon=True),
+    ]
+    for t in pumps:
+        t.start()
+
+    status, usage = _wait(proc, started + timeout)
+    if status is None:
+        result["timed_out"] = True
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        status, usage = _wait(proc, time.monotonic() + 5)
+
+    for t in pumps:
+        t.join(timeout=5)
+
+    wall = time.monotonic() - started
+    result.update(
+        {
+            "returncode": proc.returncode,
+            "success": proc.returncode == 0 and not result["timed_out"],
+            "stdout": stdout_buf.text(),
+            "stderr": stderr_buf.text(),
+            "stdout_bytes": stdout_buf.total_bytes,
+            "stderr_bytes": stderr_buf.total_bytes,
+            "output_truncated": stdout_buf.truncated or stderr_buf.truncated,
+            "usage": {
+                "wall_seconds": round(wall, 3),
+                "user_cpu_seconds": round(usage.ru_utime, 3) if usage else None,
+                "system_cpu_seconds": round(usage.ru_stime, 3) if usage else None,
+                "max_rss_kb": usage.ru_maxrss if usage else None,
+            },
+        }
+    )
+    if result["timed_out"]:
+        result["error"] = f"Command timed out after {timeout} seconds"
+    elif proc.returncode is not None and proc.returncode < 0:
+        result["error"] = f"Killed by signal {-proc.returncode}"
+    return result
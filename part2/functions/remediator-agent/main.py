@@ -1,12 +1,24 @@
 import base64
 import json
 import os
-import subprocess
 import time
 import uuid
 
 import functions_framework
-from google.cloud import pubsub_v1
+
+from command_analyzer import CommandAnalyzer
+from executor import run_command
+from fix_history import get_history
+from logging_utils import flush_after, log_error, log_event
+from scheduler import RemediationScheduler, repository_key
+from tracing import init as init_tracing, inject, record, span, start_trace
+from workspace_cache import WorkspaceCache, cacheable, lockfile_hash, seed_workspace
+
+AGENT = "[Remediator]"
+init_tracing(AGENT)
+
+# Parsed verdicts are cached per command for the lifetime of the instance
+COMMAND_ANALYZER = CommandAnalyzer()
 
 
 def _decode_pubsub_message(cloud_event):
@@ -24,142 +36,140 @@ def _decode_pubsub_message(cloud_event):
     return message or data
 
 
-def _execute_command(command, timeout=300):
+def _resolve_results_topic():
     """
-    Safely execute a command with timeout and logging.
-    Returns (success, stdout, stderr).
+    Resolve the execution results topic from environment variables.
+    Falls back to project/topic path if needed.
     """
-    print(f"[Remediator] Executing command: {command}")
-    
-    try:
-        # Use shell=False for better security, but allow shell=True for npm/git commands
-        if command.startswith(('npm ', 'git ', 'echo ')):
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd="/tmp"  # Safe working directory
-            )
-        else:
-            # Split command for non-shell execution
-            cmd_parts = command.split()
-            result = subprocess.run(
-                cmd_parts,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd="/tmp"
-            )
-        
-        success = result.returncode == 0
-        print(f"[Remediator] Command {'succeeded' if success else 'failed'} (code: {result.returncode})")
-        
-        if result.stdout:
-            print(f"[Remediator] STDOUT: {result.stdout[:500]}...")
-        if result.stderr:
-            print(f"[Remediator] STDERR: {result.stderr[:500]}...")
-            
-        return success, result.stdout, result.stderr
-        
-    except subprocess.TimeoutExpired:
-        print(f"[Remediator] Command timed out after {timeout}s")
-        return False, "", f"Command timed out after {timeout} seconds"
-    except Exception as e:
-        print(f"[Remediator] Command execution failed: {e}")
-        return False, "", str(e)
+    env_val = os.getenv("REMEDIATION_RESULTS_TOPIC", "").strip()
+    if env_val.startswith("projects/") and "/topics/" in env_val:
+        return env_val
+
+    topic_id = env_val or "remediation-results"
+    project = (
+        os.getenv("GCP_PROJECT")
+        or os.getenv("GOOGLE_CLOUD_PROJECT")
+        or os.getenv("GCLOUD_PROJECT")
+    )
+    if not project:
+        raise RuntimeError("Missing GOOGLE_CLOUD_PROJECT/GCP_PROJECT")
+    return f"projects/{project}/topics/{topic_id}"
+
+
+def _publish_result(result):
+    """Publish one execution result (stdout/stderr tails dropped) for the outcome aggregator."""
+    from google.cloud import pubsub_v1  # deferred: keeps it off the cold-start path
+    topic_path = _resolve_results_topic()
+    publisher = pubsub_v1.PublisherClient()
+    message = {key: value for key, value in result.items() if key not in ("stdout", "stderr")}
+    publisher.publish(topic_path, json.dumps(message).encode("utf-8"))
+
+
+def _execute_command(command, timeout=300, cwd="/tmp", env=None):
+    """
+    Execute a command without a shell (see executor.run_command).
+    Returns (success, stdout, stderr, usage).
+    """
+    log_event(AGENT, "Executing command", command=command, timeout=timeout)
+    
+    execution = run_command(command, timeout=timeout, cwd=cwd, env=env)
+    if execution["error"]:
+        log_error(AGENT, f"Command execution failed: {execution['error']}", command=command)
+    else:
+        success = execution["success"]
+        log_event(
+            AGENT, "Command %s", "succeeded" if success else "failed",
+            severity="INFO" if success else "ERROR", returncode=execution["returncode"],
+            usage=execution["usage"], timed_out=execution["timed_out"],
+        )
+    
+    if execution["stdout"]:
+        log_event(AGENT, "STDOUT tail", severity="DEBUG", bytes=execution["stdout_bytes"], tail=execution["stdout"][-500:])
+    if execution["stderr"]:
+        log_event(AGENT, "STDERR tail", severity="DEBUG", bytes=execution["stderr_bytes"], tail=execution["stderr"][-500:])
+    
+    return execution["success"], execution["stdout"], execution["stderr"], execution["usage"]
 
 
 def _is_safe_command(command):
     """
-    Additional safety check for commands.
+    Additional safety check for commands (see command_analyzer).
     Returns (safe, reason).
     """
-    command_lower = command.lower()
-    
-    # Dangerous patterns
-    dangerous_patterns = [
-        'rm -rf', 'sudo rm', 'rm -f /',
-        'format', 'fdisk', 'mkfs',
-        'dd if=', 'kill -9',
-        'shutdown', 'reboot',
-        'chmod 777', 'chown -R',
-        'curl | sh', 'wget | sh',
-        '$(', '`', '|sh', '|bash',
-        'eval', 'exec',
-        '/etc/', '/var/', '/usr/',
-        'passwd', 'su -', 'sudo su'
-    ]
-    
-    for pattern in dangerous_patterns:
-        if pattern in command_lower:
-            return False, f"Dangerous pattern detected: {pattern}"
-    
-    # Safe commands
-    safe_patterns = [
-        'npm install', 'npm update', 'npm ci',
-        'git pull', 'git checkout', 'git reset',
-        'echo ', 'cat ', 'ls ', 'pwd',
-        'mkdir -p', 'touch ',
-        'pip install', 'pip upgrade'
-    ]
-    
-    for pattern in safe_patterns:
-        if command_lower.startswith(pattern):
-            return True, f"Safe command pattern: {pattern}"
-    
-    # Default: require manual review
-    return False, "Command requires manual review"
+    return COMMAND_ANALYZER.is_safe(command)
 
 
-@functions_framework.cloud_event
-def remediate_event(cloud_event):
+def _check_task(task):
     """
-    Pub/Sub-triggered function:
-      - Receives approved fixes from validator
-      - Executes safe, low-risk remediation commands
-      - Logs execution results
+    Approval, risk and safety gates for a remediation task.
+    Returns a skip/reject response, or None if the task may run.
     """
-    print("[Remediator] Processing remediation task")
-    
-    # Decode remediation task
-    task = _decode_pubsub_message(cloud_event)
-    print(f"[Remediator] Received task: {task}")
-    
-    # Validate task structure
     if not task.get("approved", False):
-        print("[Remediator] ❌ Task not approved, skipping")
+        log_event(AGENT, "Task not approved, skipping", status="skipped")
         return {"status": "skipped", "reason": "Not approved"}
     
     command = task.get("command", "")
     risk = task.get("risk", "high")
-    fix_type = task.get("fix_type", "unknown")
     
     if not command or command == "echo 'manual review required'":
-        print("[Remediator] ❌ No valid command to execute")
+        log_event(AGENT, "No valid command to execute", status="skipped")
         return {"status": "skipped", "reason": "No valid command"}
     
     # Risk assessment
     if risk not in ["low"]:
-        print(f"[Remediator] ❌ Risk level '{risk}' requires manual approval")
+        log_event(AGENT, "Risk level requires manual approval", severity="WARNING", status="rejected", risk=risk)
         return {"status": "rejected", "reason": f"Risk level {risk} requires manual approval"}
     
     # Safety check
     is_safe, safety_reason = _is_safe_command(command)
     if not is_safe:
-        print(f"[Remediator] ❌ Safety check failed: {safety_reason}")
+        log_event(AGENT, "Safety check failed", severity="WARNING", status="rejected", reason=safety_reason)
         return {"status": "rejected", "reason": safety_reason}
     
-    print(f"[Remediator] ✅ Safety check passed: {safety_reason}")
+    log_event(AGENT, "Safety check passed", reason=safety_reason)
+    return None
+
+
+def _run_remediation(task, workdir):
+    """Execute an approved task inside its own working directory (called by the scheduler)."""
+    command = task.get("command", "")
+    risk = task.get("risk", "high")
+    fix_type = task.get("fix_type", "unknown")
+    
+    # npm runs start from the task's manifests plus the repository's last snapshot,
+    # and share a warm package cache. Only a named repository has snapshots: an
+    # 'unknown' one would hand the task some other project's package.json.
+    is_npm = fix_type == "npm_fix" or command.startswith("npm ")
+    repository = repository_key(task)
+    snapshots = is_npm and cacheable(repository)
+    seeded = seed_workspace(workdir, (task.get("metadata") or {}).get("workspace"))
+    lockfile = lockfile_hash(workdir)  # the lockfile the task arrived with keys its snapshot
+    with span("snapshot_restore"):
+        snapshot = WORKSPACE_CACHE.restore(repository, workdir, lockfile) if snapshots else None
+    if snapshot:
+        log_event(AGENT, "Restored workspace snapshot", snapshot=snapshot[:12], repository=repository,
+                  exact=snapshot == lockfile)
+    if is_npm and not os.path.isfile(os.path.join(workdir, "package.json")):
+        # Nothing to install against; running anyway would record a bogus failure in the fix history
+        log_event(AGENT, "No package.json for npm fix, skipping", severity="WARNING", status="skipped",
+                  repository=repository, seeded=seeded)
+        return {"status": "skipped", "reason": "No package.json in metadata.workspace or a snapshot"}
     
     # Execute the command
-    if fix_type == "npm_fix":
-        print("[Remediator] Executing npm fix:", command)
-        success, stdout, stderr = _execute_command(command, timeout=600)  # 10 min for npm
-    else:
-        print(f"[Remediator] Executing {fix_type}:", command)
-        success, stdout, stderr = _execute_command(command, timeout=300)  # 5 min default
+    with span("execute", fix_type=fix_type) as execution:
+        if fix_type == "npm_fix":
+            success, stdout, stderr, usage = _execute_command(
+                command, timeout=600, cwd=workdir, env=WORKSPACE_CACHE.npm_env()
+            )  # 10 min for npm
+        else:
+            success, stdout, stderr, usage = _execute_command(
+                command, timeout=300, cwd=workdir, env=WORKSPACE_CACHE.npm_env() if is_npm else None
+            )  # 5 min default
+        execution.set_attribute("success", success)
+    
+    if success and snapshots:
+        with span("snapshot_save"):
+            WORKSPACE_CACHE.save(repository, workdir, lockfile)
     
     # Create execution result
     result = {
@@ -169,23 +179,119 @@ def remediate_event(cloud_event):
         "fix_type": fix_type,
         "risk": risk,
         "success": success,
-        "stdout": stdout[:1000] if stdout else "",  # Truncate long output
-        "stderr": stderr[:1000] if stderr else "",
+        "stdout": stdout[-1000:] if stdout else "",  # Keep the tail of long output
+        "stderr": stderr[-1000:] if stderr else "",
+        "usage": usage,
+        "workspace_snapshot": snapshot,
         "execution_timestamp": time.time(),
-        "metadata": task.get("metadata", {})
+        # carries the pipeline's stage timings; the seeded manifests are not worth republishing
+        "metadata": inject({k: v for k, v in (task.get("metadata") or {}).items() if k != "workspace"})
     }
     
-    if success:
-        print("[Remediator] ✅ Remediator Fix executed successfully")
-        print(f"[Remediator] Output: {stdout[:200]}...")
-    else:
-        print("[Remediator] ❌ Fix execution failed")
-        print(f"[Remediator] Error: {stderr[:200]}...")
+    # Report the outcome; the aggregator folds it into the fix history
+    with span("publish_result"):
+        try:
+            _publish_result(result)
+        except Exception as e:
+            log_event(AGENT, "Failed to publish execution result", severity="WARNING", error=str(e))
     
     # Log result (in production, you might want to store this in Firestore or BigQuery)
-    print(f"[Remediator] Execution result: {result}")
+    if success:
+        log_event(AGENT, "Fix executed successfully", status="success", execution_id=result["id"],
+                  fix_type=fix_type, usage=usage)
+    else:
+        log_event(AGENT, "Fix execution failed", severity="ERROR", status="error", execution_id=result["id"],
+                  fix_type=fix_type, usage=usage, stderr=result["stderr"][-200:])
+    log_event(AGENT, "Execution result", severity="DEBUG", result=result)
     
     return {
         "status": "executed" if success else "failed",
         "result": result
-    }
\ No newline at end of file
+    }
+
+
+# Shared across concurrent invocations on the same instance
+WORKSPACE_CACHE = WorkspaceCache()
+SCHEDULER = RemediationScheduler(_run_remediation)
+
+
+@functions_framework.cloud_event
+@flush_after
+def remediate_event(cloud_event):
+    """
+    Pub/Sub-triggered function:
+      - Receives approved fixes from validator
+      - Executes safe, low-risk remediation commands
+        (via the scheduler: parallel across repositories, serialized per repository)
+      - Logs execution results and publishes them to the remediation-results topic
+    """
+    # Decode remediation task
+    decode_started = time.perf_counter()
+    task = _decode_pubsub_message(cloud_event)
+    start_trace(task)
+    
+    with span("remediate", task_id=str(task.get("id", "unknown"))) as root:
+        record("decode", time.perf_counter() - decode_started)
+        log_event(AGENT, "Processing remediation task", task_id=task.get("id", "unknown"))
+        log_event(AGENT, "Received task", severity="DEBUG", task=task)
+        
+        with span("safety_check"):
+            rejection = _check_task(task)
+        if rejection:
+            root.set_attribute("status", rejection["status"])
+            return rejection
+        
+        response = SCHEDULER.run(task)
+        record("queue_wait", response.get("queue_wait_seconds", 0.0))
+        root.set_attribute("status", response.get("status", "unknown"))
+        log_event(AGENT, "Scheduler stats", **SCHEDULER.stats())
+        return response
+
+
+@functions_framework.cloud_event
+@flush_after
+def aggregate_outcome_event(cloud_event):
+    """
+    Pub/Sub-triggered function (remediation-results topic):
+      - Folds each execution result into the fix history, the Beta posterior of
+        success per repository / step / error signature / command, and into
+        the track record of the ensemble providers that proposed the command
+      - The diagnoser and validator read those posteriors to set confidence,
+        reuse proven fixes and withhold ones that keep failing
+    """
+    decode_started = time.perf_counter()
+    result = _decode_pubsub_message(cloud_event)
+    start_trace(result)
+    
+    with span("aggregate", execution_id=str(result.get("id", "unknown"))) as root:
+        record("decode", time.perf_counter() - decode_started)
+        metadata = result.get("metadata") or {}
+        signature, command = metadata.get("error_signature"), result.get("command")
+        if not signature or not command or not isinstance(result.get("success"), bool):
+            log_event(AGENT, "Result has no outcome to aggregate", status="skipped", execution_id=result.get("id"))
+            return {"status": "skipped", "reason": "No error signature, command or outcome"}
+        history = get_history()
+        if history is None:
+            return {"status": "skipped", "reason": "Fix history disabled"}
+        repository, step = repository_key(result), str(metadata.get("step") or "unknown")
+        supporters = metadata.get("ensemble_providers")  # ensemble providers that proposed this command
+        try:
+            with span("history_record"):
+                # Counted at most once per result id (Pub/Sub delivers at least once)
+                counted = history.record(repository, step, signature, command, result["success"],
+                                         fix_type=result.get("fix_type", "unknown"), risk=result.get("risk", "high"),
+                                         outcome_id=str(result["id"]) if result.get("id") else None,
+                                         providers=[str(p) for p in supporters] if isinstance(supporters, list) else ())
+                if not counted:
+                    log_event(AGENT, "Duplicate result ignored", status="skipped", execution_id=result.get("id"))
+                    return {"status": "duplicate"}
+                track = history.stats(repository, step, signature, command)
+        except Exception as e:
+            log_error(AGENT, f"Failed to record outcome: {e}", execution_id=result.get("id"))
+            return {"status": "failed", "error": str(e)}
+        
+        root.set_attribute("success", result["success"])
+        log_event(AGENT, "Outcome recorded", status="success", signature=signature, command=command,
+                  outcome="success" if result["success"] else "failure", successes=track["successes"],
+                  failures=track["failures"], confidence=track["confidence"], proven=track["proven"])
+        return {"status": "recorded", "confidence": track["confidence"], "proven": track["proven"]}
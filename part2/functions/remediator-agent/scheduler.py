@@ -0,0 +1,164 @@
+# ============================================
+# 🗂️ scheduler.py (remediator-agent)
+# Runs remediation tasks concurrently on a bounded worker pool,
+# one task at a time per repository, each in its own working directory.
+# ============================================
+
+from __future__ import annotations
+
+import contextvars
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+DEFAULT_WORKERS = int(os.getenv("REMEDIATOR_MAX_WORKERS", "0")) or (os.cpu_count() or 1)
+WORKDIR_ROOT = os.getenv("REMEDIATOR_WORKDIR_ROOT", os.path.join(tempfile.gettempdir(), "remediation"))
+
+
+# What the diagnoser puts in metadata.repository when the pipeline event names none
+UNKNOWN_REPOSITORY = "unknown"
+
+
+def known_repository(task: Dict[str, Any]) -> Optional[str]:
+    """metadata.repository, or None when it is missing, empty or 'unknown'."""
+    metadata = task.get("metadata") or {}
+    repository = str(metadata.get("repository") or "").strip()
+    return repository if repository and repository != UNKNOWN_REPOSITORY else None
+
+
+def repository_key(task: Dict[str, Any]) -> str:
+    """Repository a task targets, from metadata.repository ('unknown' when it has none)."""
+    return known_repository(task) or UNKNOWN_REPOSITORY
+
+
+def lane_key(task: Dict[str, Any]) -> str:
+    """
+    Serialization lane: the repository, or a lane of its own for a task
+    without one (unrelated unknown-repository tasks must not queue behind each other).
+    """
+    repository = known_repository(task)
+    if repository:
+        return f"repo:{repository}"
+    return f"task:{uuid.uuid4().hex}"
+
+
+def _safe_prefix(repository: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", repository)[:40] or "repo"
+
+
+class RemediationScheduler:
+    """
+    Bounded concurrent executor for remediation tasks.
+
+    Tasks for different repositories run in parallel (at most `max_workers`
+    child processes at once, since each worker blocks on one command).
+    Tasks for the same repository are queued FIFO and dispatched only after
+    the previous one finishes, which acts as a per-repository lock without
+    parking a worker thread on it. Tasks without a repository (or with
+    'unknown', as the diagnoser sends) run unserialized.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any], str], Dict[str, Any]], max_workers: int = DEFAULT_WORKERS,
+                 workdir_root: str = WORKDIR_ROOT):
+        self.handler = handler
+        self.max_workers = max(1, max_workers)
+        self.workdir_root = workdir_root
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="remediation")
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, Deque[Tuple[Dict[str, Any], Future, float, contextvars.Context]]] = {}
+        self._active: set = set()
+        self._running = 0
+        self._queued = 0
+        self._completed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def submit(self, task: Dict[str, Any]) -> Future:
+        """Queue a task; the returned future resolves to the handler's result dict."""
+        lane = lane_key(task)
+        future: Future = Future()
+        context = contextvars.copy_context()  # the handler runs with the caller's trace/context
+        with self._lock:
+            self._queued += 1
+            if lane in self._active:
+                self._waiting.setdefault(lane, deque()).append((task, future, time.monotonic(), context))
+                return future
+            self._active.add(lane)
+        self._dispatch(lane, task, future, time.monotonic(), context)
+        return future
+
+    def run(self, task: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Submit a task and wait for its result."""
+        return self.submit(task).result(timeout=timeout)
+
+    def _dispatch(self, lane: str, task: Dict[str, Any], future: Future, enqueued: float,
+                  context: contextvars.Context) -> None:
+        self._pool.submit(context.run, self._run_task, lane, task, future, enqueued)
+
+    def _run_task(self, lane: str, task: Dict[str, Any], future: Future, enqueued: float) -> None:
+        wait = time.monotonic() - enqueued
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+
+        workdir = None
+        result: Any = None
+        error: Optional[BaseException] = None
+        if not future.set_running_or_notify_cancel():
+            self._release(lane)
+            return
+        try:
+            os.makedirs(self.workdir_root, exist_ok=True)
+            workdir = tempfile.mkdtemp(prefix=f"{_safe_prefix(repository_key(task))}-", dir=self.workdir_root)
+            result = self.handler(task, workdir)
+            if isinstance(result, dict):
+                result.setdefault("queue_wait_seconds", round(wait, 3))
+        except BaseException as e:  # surface handler failures to the caller
+            error = e
+        finally:
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+            self._release(lane)
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _release(self, lane: str) -> None:
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+            pending = self._waiting.get(lane)
+            if not pending:
+                self._waiting.pop(lane, None)
+                self._active.discard(lane)
+                return
+            task, future, enqueued, context = pending.popleft()
+        self._dispatch(lane, task, future, enqueued, context)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running count and wait-time figures."""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "active_repositories": len(self._active),
+                "avg_wait_seconds": round(self._total_wait / started, 3) if started else 0.0,
+                "max_wait_seconds": round(self._max_wait, 3),
+                "max_workers": self.max_workers,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
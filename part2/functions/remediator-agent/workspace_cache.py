@@ -0,0 +1,305 @@
+# ============================================
+# 📦 workspace_cache.py (remediator-agent)
+# Warm npm cache plus per-repository workspace snapshots keyed by
+# the task's lockfile hash, with LRU eviction by disk size.
+# ============================================
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from logging_utils import log_event
+from scheduler import UNKNOWN_REPOSITORY
+
+# /tmp survives between warm invocations; point this at a mounted volume to persist longer
+CACHE_ROOT = os.getenv("REMEDIATOR_CACHE_ROOT", os.path.join(tempfile.gettempdir(), "remediation-cache"))
+MAX_SNAPSHOT_MB = int(os.getenv("REMEDIATOR_SNAPSHOT_MAX_MB", "1024"))
+MAX_NPM_CACHE_MB = int(os.getenv("REMEDIATOR_NPM_CACHE_MAX_MB", "1024"))
+NPM_CACHE_CHECK_SECONDS = float(os.getenv("REMEDIATOR_NPM_CACHE_CHECK_SECONDS", "600"))  # re-measure at least this often
+
+LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json", "yarn.lock")
+# Files a task may carry in metadata.workspace to seed its working directory
+MANIFESTS = ("package.json",) + LOCKFILES
+MAX_MANIFEST_BYTES = int(os.getenv("REMEDIATOR_MAX_MANIFEST_KB", "4096")) * 1024
+
+
+def lockfile_hash(workdir: str) -> Optional[str]:
+    """sha256 of the first lockfile found in the workspace, or None."""
+    for name in LOCKFILES:
+        path = os.path.join(workdir, name)
+        if os.path.isfile(path):
+            digest = hashlib.sha256()
+            with open(path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(65536), b""):
+                    digest.update(chunk)
+            return digest.hexdigest()
+    return None
+
+
+def seed_workspace(workdir: str, files: Any) -> list:
+    """
+    Write the manifest files a task carries ({"package.json": "...", "package-lock.json": "..."})
+    into its working directory. Other names and oversized files are ignored. Returns the names written.
+    """
+    if not isinstance(files, dict):
+        return []
+    written = []
+    for name in MANIFESTS:
+        content = files.get(name)
+        if not isinstance(content, str) or len(content.encode("utf-8")) > MAX_MANIFEST_BYTES:
+            continue
+        with open(os.path.join(workdir, name), "w", encoding="utf-8") as fh:
+            fh.write(content)
+        written.append(name)
+    return written
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def cacheable(repository: Optional[str]) -> bool:
+    """Only a named repository gets snapshots: 'unknown' would pool unrelated projects."""
+    return bool(repository) and repository != UNKNOWN_REPOSITORY
+
+
+def _repo_dir(repository: str) -> str:
+    return hashlib.sha256(repository.encode("utf-8")).hexdigest()[:16]
+
+
+class WorkspaceCache:
+    """
+    Two layers of reuse for npm remediations:
+
+    - npm's own content-addressed cache (cacache) lives under `root/npm`
+      and is shared by every run, so packages are downloaded once.
+    - After a successful run the workspace is snapshotted under
+      `root/snapshots/<repo>/<lockfile sha256>`, keyed by the lockfile the
+      task arrived with; the next task with that lockfile starts from the
+      snapshot (node_modules included), others from the repository's latest.
+      Tasks without a named repository are never snapshotted or restored.
+
+    Snapshots are evicted least-recently-used once their total size
+    exceeds `max_snapshot_bytes`. Sizes are tracked incrementally: each
+    snapshot is measured once when saved, and the npm cache estimate grows
+    by the size of each snapshot and is only re-measured (outside the lock)
+    when it crosses its budget or NPM_CACHE_CHECK_SECONDS have passed.
+    The index is a small JSON file.
+    """
+
+    def __init__(self, root: str = CACHE_ROOT, max_snapshot_mb: int = MAX_SNAPSHOT_MB,
+                 max_npm_cache_mb: int = MAX_NPM_CACHE_MB):
+        self.root = root
+        self.npm_cache = os.path.join(root, "npm")
+        self.snapshots = os.path.join(root, "snapshots")
+        self.index_path = os.path.join(root, "index.json")
+        self.max_snapshot_bytes = max_snapshot_mb * 1024 * 1024
+        self.max_npm_cache_bytes = max_npm_cache_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(self.npm_cache, exist_ok=True)
+        os.makedirs(self.snapshots, exist_ok=True)
+        self._index = self._load_index()
+        self._snapshot_bytes = sum(e["size"] for e in self._index["snapshots"].values())
+        self._npm_cache_bytes = _tree_size(self.npm_cache)
+        self._npm_measured_at = time.monotonic()
+        self._npm_checking = False
+        self._readers: Dict[str, int] = {}  # entry id -> restores copying from it
+
+    # ---------- index ----------
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if isinstance(data, dict) and "snapshots" in data:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"snapshots": {}, "latest": {}}
+
+    def _save_index(self) -> None:
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self._index, fh)
+        os.replace(tmp, self.index_path)
+
+    # ---------- npm ----------
+
+    def npm_env(self) -> Dict[str, str]:
+        """Environment for npm commands: shared cache, prefer offline, no audit/fund round-trips."""
+        env = dict(os.environ)
+        env.update(
+            {
+                "npm_config_cache": self.npm_cache,
+                "npm_config_prefer_offline": "true",
+                "npm_config_audit": "false",
+                "npm_config_fund": "false",
+                "npm_config_update_notifier": "false",
+            }
+        )
+        return env
+
+    # ---------- snapshots ----------
+
+    def restore(self, repository: str, workdir: str, lockfile: Optional[str] = None) -> Optional[str]:
+        """
+        Seed `workdir` from the best snapshot for this repository: the one
+        taken for the task's lockfile hash (`lockfile`, or the lockfile already
+        in the workdir) if there is one, otherwise the repository's most
+        recent snapshot. Files already in the workdir are kept. Returns the
+        snapshot key used.
+        """
+        if not cacheable(repository):
+            return None
+        lockfile = lockfile or lockfile_hash(workdir)
+        with self._lock:
+            entry, key = None, None
+            for key in (lockfile, self._index["latest"].get(repository)):
+                entry = self._index["snapshots"].get(f"{repository}:{key}") if key else None
+                if entry and os.path.isdir(entry["path"]):
+                    break
+            else:
+                return None
+            entry_id = f"{repository}:{key}"
+            entry["last_used"] = time.time()
+            self._readers[entry_id] = self._readers.get(entry_id, 0) + 1
+            self._save_index()
+            path = entry["path"]
+
+        copied = []
+        try:
+            for name in os.listdir(path):
+                src, dst = os.path.join(path, name), os.path.join(workdir, name)
+                if os.path.lexists(dst):
+                    continue  # never clobber files the task already has
+                copied.append(dst)
+                if os.path.isdir(src) and not os.path.islink(src):
+                    shutil.copytree(src, dst, symlinks=True)
+                else:
+                    shutil.copy2(src, dst, follow_symlinks=False)
+        except (OSError, shutil.Error) as e:
+            # A half-restored workspace is worse than none: undo it and report a miss
+            for dst in copied:
+                if os.path.isdir(dst) and not os.path.islink(dst):
+                    shutil.rmtree(dst, ignore_errors=True)
+                elif os.path.lexists(dst):
+                    os.remove(dst)
+            log_event("[Remediator]", "Workspace restore failed", severity="WARNING", error=str(e))
+            return None
+        finally:
+            with self._lock:
+                self._readers[entry_id] -= 1
+                if not self._readers[entry_id]:
+                    del self._readers[entry_id]
+        return key
+
+    def save(self, repository: str, workdir: str, lockfile: Optional[str] = None) -> Optional[str]:
+        """
+        Snapshot a workspace after a successful run, keyed by the lockfile hash
+        the task arrived with (npm may rewrite the lockfile), else the current one.
+        """
+        if not cacheable(repository):
+            return None
+        key = lockfile or lockfile_hash(workdir)
+        if key is None:
+            return None
+
+        entry_id = f"{repository}:{key}"
+        target = os.path.join(self.snapshots, _repo_dir(repository), key)
+        with self._lock:
+            self._index["latest"][repository] = key
+            existing = self._index["snapshots"].get(entry_id)
+            if existing and os.path.isdir(existing["path"]):
+                existing["last_used"] = time.time()
+                self._save_index()
+                return key
+
+        staging = tempfile.mkdtemp(prefix="snapshot-", dir=self.snapshots)
+        try:
+            shutil.copytree(workdir, os.path.join(staging, "tree"), symlinks=True)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(os.path.join(staging, "tree"), target)
+        except OSError as e:
+            log_event("[Remediator]", "Workspace snapshot failed", severity="WARNING", error=str(e))
+            return None
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        size = _tree_size(target)  # measured once, outside the lock
+
+        with self._lock:
+            previous = self._index["snapshots"].get(entry_id)
+            if previous:  # a concurrent save of the same key
+                self._snapshot_bytes -= previous["size"]
+            self._index["snapshots"][entry_id] = {"path": target, "size": size, "last_used": time.time()}
+            self._snapshot_bytes += size
+            # What was just installed came through the npm cache: an upper-bound estimate of its growth
+            self._npm_cache_bytes += size
+            self._evict()
+            self._save_index()
+        self._check_npm_cache()
+        return key
+
+    def _evict(self) -> None:
+        """Drop least-recently-used snapshots (not those being restored) until under budget. Caller holds the lock."""
+        snapshots = self._index["snapshots"]
+        for entry_id, entry in sorted(snapshots.items(), key=lambda kv: kv[1]["last_used"]):
+            if self._snapshot_bytes <= self.max_snapshot_bytes:
+                break
+            if self._readers.get(entry_id):
+                continue
+            shutil.rmtree(entry["path"], ignore_errors=True)
+            self._snapshot_bytes -= entry["size"]
+            del snapshots[entry_id]
+            repository, key = entry_id.rsplit(":", 1)
+            if self._index["latest"].get(repository) == key:
+                del self._index["latest"][repository]
+
+    def _check_npm_cache(self) -> None:
+        """
+        Re-measure the npm cache when the running estimate crosses its budget
+        (or is stale), walking it without holding the lock; one thread at a time.
+        """
+        with self._lock:
+            due = (self._npm_cache_bytes > self.max_npm_cache_bytes
+                   or time.monotonic() - self._npm_measured_at > NPM_CACHE_CHECK_SECONDS)
+            if not due or self._npm_checking:
+                return
+            self._npm_checking = True
+        size = None
+        try:
+            size = _tree_size(self.npm_cache)
+            if size > self.max_npm_cache_bytes:
+                # cacache has no partial eviction; start over once it outgrows its budget.
+                # Concurrent npm runs tolerate a missing cache (they refetch).
+                shutil.rmtree(self.npm_cache, ignore_errors=True)
+                os.makedirs(self.npm_cache, exist_ok=True)
+                size = 0
+        finally:
+            with self._lock:
+                if size is not None:
+                    self._npm_cache_bytes = size
+                self._npm_measured_at = time.monotonic()
+                self._npm_checking = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "snapshots": len(self._index["snapshots"]),
+                "snapshot_bytes": self._snapshot_bytes,
+                "npm_cache_bytes_estimate": self._npm_cache_bytes,
+                "repositories": len(self._index["latest"]),
+            }
@@ -5,27 +5,231 @@
 
 import os
 import json
-import requests
-from typing import Dict, Any, Optional
-from openai import OpenAI
-from anthropic import Anthropic
+import logging
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
 # Configuration
 VERBOSE = os.getenv("VERBOSE_LOGS", "0") == "1"
 
+# Cascade: cheapest tier first, escalate while the answer looks weak and budget remains
+CASCADE_TIERS = os.getenv(
+    "MODEL_CASCADE", "cloudflare,anthropic:claude-3-haiku-20240307,anthropic:claude-3-5-sonnet-20240620"
+)
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.6"))
+CASCADE_MAX_COST_USD = float(os.getenv("CASCADE_MAX_COST_USD", "0.01"))  # per routed prompt
+
+# Micro-batching of concurrent prompts for backends that take several at once
+BATCH_MAX_ITEMS = int(os.getenv("MODEL_BATCH_MAX_ITEMS", "1"))  # 1 disables batching
+BATCH_MAX_WAIT_MS = float(os.getenv("MODEL_BATCH_MAX_WAIT_MS", "20"))
+# Only backends with a real multi-prompt call: llama-cpp-python decodes one sequence per context, so a
+# local "batch" would just run prompts back to back after waiting for the batch to fill
+BATCH_PROVIDERS = {p.strip() for p in os.getenv("MODEL_BATCH_PROVIDERS", "cloudflare").split(",") if p.strip()}
+# Workers AI async batch API; only models that support it (e.g. @cf/meta/llama-3.3-70b-instruct-fp8-fast)
+CLOUDFLARE_BATCH_MODEL = os.getenv("CLOUDFLARE_BATCH_MODEL", "")
+CLOUDFLARE_BATCH_POLL_SECONDS = float(os.getenv("CLOUDFLARE_BATCH_POLL_SECONDS", "1"))
+CLOUDFLARE_BATCH_TIMEOUT_SECONDS = float(os.getenv("CLOUDFLARE_BATCH_TIMEOUT_SECONDS", "60"))
+
+# USD per 1M tokens (input, output); MODEL_PRICES='{"gpt-4o": [5, 15]}' adds or overrides
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (5.00, 15.00),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-sonnet-20240620": (3.00, 15.00),
+    "claude-3-opus-20240229": (15.00, 75.00),
+    "cloudflare": (0.0, 0.0),
+    "local": (0.0, 0.0),
+}
+
+
+def _price_overrides(raw: str) -> Dict[str, Tuple[float, float]]:
+    """MODEL_PRICES entries that parse; a bad value is logged and skipped rather than failing the import."""
+    try:
+        entries = json.loads(raw or "{}")
+        if not isinstance(entries, dict):
+            raise ValueError("expected a JSON object")
+    except ValueError as e:
+        logging.getLogger(__name__).warning("Ignoring MODEL_PRICES: %s", e)
+        return {}
+    prices = {}
+    for model, value in entries.items():
+        try:
+            price_in, price_out = (float(v) for v in value)
+        except (TypeError, ValueError):
+            logging.getLogger(__name__).warning("Ignoring MODEL_PRICES entry %r: %r", model, value)
+            continue
+        prices[model] = (price_in, price_out)
+    return prices
+
+
+PRICES.update(_price_overrides(os.getenv("MODEL_PRICES", "{}")))
+# Provider-side prompt caching of the static system prefix (Anthropic cache_control; OpenAI caches
+# long prefixes automatically). Cached input is billed at a fraction of the normal rate.
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "1") == "1"
+CACHE_READ_RATE = {"anthropic": 0.1, "openai": 0.5}  # share of the input price paid for cached tokens
+CACHE_WRITE_RATE = {"anthropic": 1.25}  # premium for writing the cache
+DEFAULT_MODELS = {"openai": "gpt-3.5-turbo", "anthropic": "claude-3-haiku-20240307", "cloudflare": None, "local": None}
+
+_HEDGES = re.compile(r"\b(unclear|not sure|unsure|cannot determine|can't determine|need more (?:info|information|context)|"
+                     r"insufficient|unable to)\b", re.IGNORECASE)
+_COMMAND = re.compile(r"(?im)^\s*(?:command|fix|run)\s*:\s*\S+|`[^`]+`|\$ \S+")
+
+
+def estimate_confidence(text: str) -> float:
+    """Cheap local check of an answer: does it commit to a concrete command without hedging?"""
+    if not text or not text.strip():
+        return 0.0
+    score = 0.5
+    if _COMMAND.search(text):
+        score += 0.3
+    if _HEDGES.search(text):
+        score -= 0.4
+    if len(text.strip()) < 20:
+        score -= 0.2
+    return round(max(0.0, min(1.0, score)), 3)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def _price(provider: str, model: Optional[str]) -> Tuple[float, float]:
+    """
+    Exact model id, else the longest priced id it extends (dated snapshots such as
+    gpt-3.5-turbo-0125), else the provider's default model, else the provider entry.
+    """
+    model = model or ""
+    if model in PRICES:
+        return PRICES[model]
+    prefixes = [name for name in PRICES if model.startswith(name + "-")]
+    if prefixes:
+        return PRICES[max(prefixes, key=len)]
+    return PRICES.get(DEFAULT_MODELS.get(provider) or "", PRICES.get(provider, (0.0, 0.0)))
+
+
+def _usage_block(result: Dict[str, Any]) -> Any:
+    raw = result.get("raw")
+    return raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+
+
+def returned_tokens(result: Dict[str, Any]) -> bool:
+    """Did the call produce anything billable (a usage block or response text)? Failed calls did not."""
+    return _usage_block(result) is not None or bool(result.get("response"))
+
+
+def _usage(result: Dict[str, Any], prompt: str) -> Tuple[int, int]:
+    """(input, output) tokens from the provider's usage block, else estimated from text length."""
+    usage = _usage_block(result)
+    if usage is not None:
+        field = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+        input_tokens = field("prompt_tokens") or field("input_tokens")
+        output_tokens = field("completion_tokens") or field("output_tokens")
+        if input_tokens is not None and output_tokens is not None:
+            return int(input_tokens), int(output_tokens)
+    return _tokens(prompt), _tokens(result.get("response") or "")
+
+
+def cache_usage(result: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Prompt-cache accounting from the provider's usage block:
+    prompt_tokens (all input, cached or not), cache_read_tokens, cache_write_tokens.
+    """
+    usage = getattr(result.get("raw"), "usage", None)
+    if usage is None:
+        return {}
+    if result.get("provider") == "anthropic":
+        read = getattr(usage, "cache_read_input_tokens", None) or 0
+        write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return {"prompt_tokens": (getattr(usage, "input_tokens", 0) or 0) + read + write,
+                "cache_read_tokens": read, "cache_write_tokens": write}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {"prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "cache_read_tokens": getattr(details, "cached_tokens", None) or 0, "cache_write_tokens": 0}
+
+
+def estimate_cost(provider: str, model: Optional[str], result: Dict[str, Any], prompt: str) -> float:
+    """USD for one call, pricing cached input at the provider's cache rates."""
+    price_in, price_out = _price(provider, model)
+    input_tokens, output_tokens = _usage(result, prompt)
+    cache = result.get("cache") or {}
+    read, write = cache.get("cache_read_tokens", 0), cache.get("cache_write_tokens", 0)
+    if provider == "anthropic":  # input_tokens excludes cache reads and writes
+        cached = read * CACHE_READ_RATE["anthropic"] + write * CACHE_WRITE_RATE["anthropic"]
+    else:  # prompt_tokens includes cached tokens
+        input_tokens -= read
+        cached = read * CACHE_READ_RATE.get(provider, 1.0)
+    return ((input_tokens + cached) * price_in + output_tokens * price_out) / 1e6
+
+
+def _messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, str]]:
+    """Chat messages with the static system prefix first (what prefix caches key on)."""
+    head = [{"role": "system", "content": system}] if system else []
+    return head + [{"role": "user", "content": prompt}]
+
+
+def parse_tiers(spec: Any) -> List[Tuple[str, Optional[str]]]:
+    """'provider[:model],...' (or a list of such strings) -> [(provider, model)]."""
+    items = spec.split(",") if isinstance(spec, str) else list(spec)
+    tiers = []
+    for item in items:
+        provider, _, model = str(item).strip().partition(":")
+        if provider and provider.lower() != "cascade":
+            tiers.append((provider.lower(), model or DEFAULT_MODELS.get(provider.lower())))
+    return tiers
+
 class ModelRouter:
     def __init__(self):
-        """Initialize AI clients without testing noise."""
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        self.cloudflare_url = f"https://api.cloudflare.com/client/v4/accounts/{os.getenv('CLOUDFLARE_ACCOUNT_ID')}/ai/run/@cf/meta/llama-2-7b-chat-fp16"
+        """
+        Initialize AI clients without testing noise.
+        SDK clients are created on first use, so a provider that is never
+        called is never imported (openai/anthropic dominate cold start).
+        """
+        self._openai = None
+        self._anthropic = None
+        # OPENAI_BASE_URL / ANTHROPIC_BASE_URL are read by the SDKs; this is the
+        # Cloudflare equivalent (e.g. local stand-ins in benchmarks/fake_providers.py)
+        cloudflare_base = os.getenv("CLOUDFLARE_API_BASE", "https://api.cloudflare.com/client/v4").rstrip("/")
+        self.cloudflare_url = f"{cloudflare_base}/accounts/{os.getenv('CLOUDFLARE_ACCOUNT_ID')}/ai/run/@cf/meta/llama-2-7b-chat-fp16"
         self.cloudflare_headers = {
             "Authorization": f"Bearer {os.getenv('CLOUDFLARE_API_TOKEN')}",
             "Content-Type": "application/json"
         }
+        self.cloudflare_batch_url = (
+            f"{cloudflare_base}/accounts/{os.getenv('CLOUDFLARE_ACCOUNT_ID')}/ai/run/{CLOUDFLARE_BATCH_MODEL}"
+            if CLOUDFLARE_BATCH_MODEL else None
+        )
+        self._batchers = {}
+        self._batchers_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache_totals = {"calls": 0, "prompt_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
         
         # NO TESTING IN PRODUCTION - keeps logs clean
 
+    @property
+    def openai(self):
+        if self._openai is None:
+            from openai import OpenAI
+            self._openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai
+
+    @openai.setter
+    def openai(self, client):
+        self._openai = client
+
+    @property
+    def anthropic(self):
+        if self._anthropic is None:
+            from anthropic import Anthropic
+            self._anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        return self._anthropic
+
+    @anthropic.setter
+    def anthropic(self, client):
+        self._anthropic = client
+
     def route(self, prompt: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Route prompt to appropriate AI model."""
         if not metadata:
@@ -33,40 +237,184 @@ class ModelRouter:
             
         provider = metadata.get("provider", "openai").lower()
         model = metadata.get("model")
+        max_tokens = int(metadata.get("max_tokens", 300))
+        system = metadata.get("system")  # static instructions, sent first so providers can cache them
         
+        if provider == "cascade":
+            return self.cascade(prompt, metadata)
+        if self._batchable(provider) and not metadata.get("unbatched"):
+            return self._batched(provider, prompt, max_tokens, system)
         if provider == "openai":
-            return self._call_openai(prompt, model or "gpt-3.5-turbo")
+            return self._track_cache(self._call_openai(prompt, model or "gpt-3.5-turbo", max_tokens, system))
         elif provider == "anthropic":
-            return self._call_anthropic(prompt, model or "claude-3-haiku-20240307")
+            return self._track_cache(self._call_anthropic(prompt, model or "claude-3-haiku-20240307", max_tokens, system))
         elif provider == "cloudflare":
-            return self._call_cloudflare(prompt)
+            return self._call_cloudflare(prompt, max_tokens, system)
+        elif provider == "local":
+            return self._call_local(prompt, max_tokens, system)
         else:
             return {"provider": provider, "response": None, "error": "Unknown provider"}
 
-    def _call_openai(self, prompt: str, model: str) -> Dict[str, Any]:
-        """Call OpenAI API."""
+    def _track_cache(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach prompt-cache usage to a result and add it to the router's running totals."""
+        cache = cache_usage(result)
+        if cache:
+            result["cache"] = cache
+            with self._cache_lock:
+                self._cache_totals["calls"] += 1
+                for key, value in cache.items():
+                    self._cache_totals[key] += value
+        return result
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            totals = dict(self._cache_totals)
+        totals["hit_ratio"] = round(totals["cache_read_tokens"] / totals["prompt_tokens"], 3) if totals["prompt_tokens"] else 0.0
+        return totals
+
+    def cascade(self, prompt: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Try tiers cheapest-first and stop at the first answer whose confidence
+        reaches min_confidence. metadata may set "tiers", "min_confidence",
+        "max_cost_usd", "max_tokens" and "accept" (text -> confidence in [0, 1];
+        defaults to estimate_confidence). A tier is only tried while its
+        worst-case cost fits the remaining budget (the first tier always runs).
+        Returns the best answer seen, plus a "cascade" summary.
+        """
+        metadata = metadata or {}
+        tiers = parse_tiers(metadata.get("tiers") or CASCADE_TIERS)
+        threshold = float(metadata.get("min_confidence", CASCADE_MIN_CONFIDENCE))
+        ceiling = float(metadata.get("max_cost_usd", CASCADE_MAX_COST_USD))
+        max_tokens = int(metadata.get("max_tokens", 300))
+        accept = metadata.get("accept") or estimate_confidence
+
+        spent, steps, best = 0.0, [], None
+        for provider, model in tiers:
+            price_in, price_out = _price(provider, model)
+            worst_case = (_tokens((metadata.get("system") or "") + prompt) * price_in + max_tokens * price_out) / 1e6
+            if steps and spent + worst_case > ceiling:
+                steps.append({"provider": provider, "model": model, "skipped": "cost ceiling"})
+                break
+            started = time.perf_counter()
+            result = self.route(prompt, {"provider": provider, "model": model, "max_tokens": max_tokens,
+                                         "system": metadata.get("system")})
+            # a call that errored before returning tokens is not billed, so it does not use up the budget
+            cost = (estimate_cost(provider, model, result, (metadata.get("system") or "") + prompt)
+                    if returned_tokens(result) else 0.0)
+            spent += cost
+            step = {"provider": provider, "model": model, "latency": round(time.perf_counter() - started, 3),
+                    "cost_usd": round(cost, 6)}
+            steps.append(step)
+            if result.get("error"):
+                step["error"] = result["error"]
+                continue
+            step["confidence"] = round(float(accept(result.get("response") or "")), 3)
+            if best is None or step["confidence"] >= best[0]:  # ties go to the stronger (later) tier
+                best = (step["confidence"], result)
+            if step["confidence"] >= threshold:
+                break
+
+        summary = {"steps": steps, "cost_usd": round(spent, 6),
+                   "escalations": max(0, sum(1 for s in steps if "skipped" not in s) - 1)}
+        if best is None:
+            return {"provider": "cascade", "response": None, "error": "All cascade tiers failed", "cascade": summary}
+        summary["confidence"] = best[0]
+        return dict(best[1], cascade=summary)
+
+    def _batchable(self, provider: str) -> bool:
+        if BATCH_MAX_ITEMS <= 1 or provider not in BATCH_PROVIDERS:
+            return False
+        return provider == "cloudflare" and self.cloudflare_batch_url is not None
+
+    def _batched(self, provider: str, prompt: str, max_tokens: int, system: Optional[str] = None) -> Dict[str, Any]:
+        """Queue the prompt on the (provider, max_tokens, system) micro-batcher and wait for its result."""
+        from agents.batching import MicroBatcher
+        key = (provider, max_tokens, system)
+        with self._batchers_lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = MicroBatcher(lambda prompts: self._run_batch(provider, prompts, max_tokens, system),
+                                       max_items=BATCH_MAX_ITEMS, max_wait_ms=BATCH_MAX_WAIT_MS,
+                                       name=f"batch-{provider}")
+                self._batchers[key] = batcher
+        try:
+            return batcher.submit(prompt).result()
+        except Exception as e:
+            return {"provider": provider, "response": None, "error": f"Batched {provider} call failed: {e}"}
+
+    def batch_stats(self) -> Dict[str, Any]:
+        with self._batchers_lock:
+            return {f"{provider}/{max_tokens}{'/system' if system else ''}": b.stats()
+                    for (provider, max_tokens, system), b in self._batchers.items()}
+
+    def _run_batch(self, provider: str, prompts: List[str], max_tokens: int,
+                   system: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self._call_cloudflare_batch(prompts, max_tokens, system)
+
+    def _call_cloudflare_batch(self, prompts: List[str], max_tokens: int = 300,
+                               system: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Queue prompts on the Workers AI async batch API and poll until every response is in."""
+        import requests
+        url = f"{self.cloudflare_batch_url}?queueRequest=true"
+        body = {"requests": [{"messages": _messages(p, system), "max_tokens": max_tokens} for p in prompts]}
+        resp = requests.post(url, headers=self.cloudflare_headers, json=body, timeout=30)
+        resp.raise_for_status()
+        result = resp.json().get("result") or {}
+        deadline = time.monotonic() + CLOUDFLARE_BATCH_TIMEOUT_SECONDS
+        while "responses" not in result:
+            if not result.get("request_id"):
+                raise RuntimeError(f"Unexpected batch response: {result}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("Cloudflare batch timed out")
+            time.sleep(CLOUDFLARE_BATCH_POLL_SECONDS)
+            resp = requests.post(url, headers=self.cloudflare_headers, json={"request_id": result["request_id"]},
+                                 timeout=30)
+            resp.raise_for_status()
+            result = resp.json().get("result") or {}
+
+        by_id = {item.get("id"): item for item in result["responses"]}
+        results = []
+        for i in range(len(prompts)):
+            item = by_id.get(i) or {}
+            if item.get("success", True) and isinstance(item.get("result"), dict):
+                results.append({"provider": "cloudflare", "response": item["result"].get("response", ""),
+                                "raw": item, "batch_size": len(prompts)})
+            else:
+                results.append({"provider": "cloudflare", "response": None, "error": "Batch item failed"})
+        return results
+
+    def _call_openai(self, prompt: str, model: str, max_tokens: int = 300, system: Optional[str] = None) -> Dict[str, Any]:
+        """Call OpenAI API (a long, stable system prefix is cached by OpenAI automatically)."""
         try:
             resp = self.openai.chat.completions.create(
                 model=model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=300,
+                messages=_messages(prompt, system),
+                max_tokens=max_tokens,
                 temperature=0.3,
             )
             return {
                 "provider": "openai",
+                "model": model,  # as configured; resp.model is the dated snapshot id
                 "response": resp.choices[0].message.content,
                 "raw": resp,
             }
         except Exception as e:
             return {"provider": "openai", "response": None, "error": f"OpenAI call failed: {e}"}
 
-    def _call_anthropic(self, prompt: str, model: str) -> Dict[str, Any]:
-        """Call Anthropic API with safe text extraction."""
+    def _call_anthropic(self, prompt: str, model: str, max_tokens: int = 300, system: Optional[str] = None) -> Dict[str, Any]:
+        """Call Anthropic API with safe text extraction; the system prefix is marked cacheable."""
         try:
+            kwargs = {}
+            if system:
+                block = {"type": "text", "text": system}
+                if PROMPT_CACHE:
+                    block["cache_control"] = {"type": "ephemeral"}
+                kwargs["system"] = [block]
             resp = self.anthropic.messages.create(
                 model=model,
-                max_tokens=300,
+                max_tokens=max_tokens,
                 messages=[{"role": "user", "content": prompt}],
+                **kwargs,
             )
             content = resp.content[0]
             
@@ -78,18 +426,20 @@ class ModelRouter:
             
             return {
                 "provider": "anthropic",
+                "model": model,
                 "response": response_text,
                 "raw": resp,
             }
         except Exception as e:
             return {"provider": "anthropic", "response": None, "error": f"Anthropic call failed: {e}"}
 
-    def _call_cloudflare(self, prompt: str) -> Dict[str, Any]:
+    def _call_cloudflare(self, prompt: str, max_tokens: int = 300, system: Optional[str] = None) -> Dict[str, Any]:
         """Call Cloudflare Workers AI API."""
         try:
+            import requests
             payload = {
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 300,
+                "messages": _messages(prompt, system),
+                "max_tokens": max_tokens,
             }
             
             resp = requests.post(
@@ -113,4 +463,17 @@ class ModelRouter:
                 return {"provider": "cloudflare", "response": None, "error": f"HTTP {resp.status_code}"}
                 
         except Exception as e:
-            return {"provider": "cloudflare", "response": None, "error": f"Cloudflare call failed: {e}"}
\ No newline at end of file
+            return {"provider": "cloudflare", "response": None, "error": f"Cloudflare call failed: {e}"}
+
+    def _call_local(self, prompt: str, max_tokens: int = 300, system: Optional[str] = None) -> Dict[str, Any]:
+        """Run the prompt on the local llama.cpp model (agents/local_inference.py)."""
+        try:
+            from agents.local_inference import get_local_model
+            completion = get_local_model().complete(prompt, max_tokens=max_tokens, system=system)
+            return {
+                "provider": "local",
+                "response": completion["choices"][0]["message"]["content"],
+                "raw": completion,
+            }
+        except Exception as e:
+            return {"provider": "local", "response": None, "error": f"Local inference failed: {e}"}
@@ -0,0 +1,296 @@
+# ============================================
+# 🧭 drift_engine.py (terraform-fixer)
+# Groups and deduplicates drift issues, generates one fix per group
+# (a single batched model call for all groups) and emits a plan.
+# ============================================
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shlex
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+SAMPLE_ADDRESSES = int(os.getenv("DRIFT_SAMPLE_ADDRESSES", "5"))
+MAX_AI_GROUPS = int(os.getenv("DRIFT_MAX_AI_GROUPS", "25"))
+MAX_TARGETS = int(os.getenv("DRIFT_MAX_TARGETS", "20"))
+AI_MAX_TOKENS = int(os.getenv("DRIFT_AI_MAX_TOKENS", "1500"))
+
+# Drift kinds as reported by detectors, folded into the actions we plan for
+DRIFT_KINDS = {
+    "modified": "update", "update": "update", "changed": "update", "drift": "update",
+    "deleted": "create", "missing": "create", "create": "create",
+    "unmanaged": "import", "added": "import", "import": "import",
+    "orphaned": "remove", "remove": "remove",
+}
+
+ADDRESS_RE = re.compile(r"^[A-Za-z0-9_.\-\[\]\"]+$")
+PLANFILE_RE = re.compile(r"^[A-Za-z0-9_.-]+\.tfplan$")
+
+# What a model-proposed fix may be and run: targeted plans, applies of a saved plan, read-only state queries
+AI_ACTIONS = ("reconcile", "manual_review")
+PLAN_FLAGS = ("-refresh-only", "-input=false", "-no-color")
+READ_ONLY = (("state", "list"), ("state", "show"))
+
+
+def normalize_issue(issue: Dict[str, Any]) -> Dict[str, Any]:
+    """Map the loose drift_issues schema onto the fields the planner uses."""
+    resource_type = issue.get("resource_type") or issue.get("type") or "unknown"
+    resource_name = issue.get("resource_name") or issue.get("name") or "unknown"
+    module = issue.get("module") or ""
+    address = issue.get("address") or ".".join(p for p in (module, resource_type, resource_name) if p)
+    drift_type = str(issue.get("drift_type") or issue.get("change") or "modified").lower()
+    return {
+        "address": address,
+        "module": module,
+        "resource_type": resource_type,
+        "resource_name": resource_name,
+        "drift_type": drift_type,
+        "action": DRIFT_KINDS.get(drift_type, "update"),
+        "attribute": issue.get("attribute") or "",
+    }
+
+
+class DriftPlanner:
+    """
+    Streaming aggregation of drift issues.
+
+    Issues are consumed one at a time: duplicates (same address, attribute
+    and drift type) are dropped, the rest are counted into groups keyed by
+    (module, resource type). Per group only counters, the address set (for
+    -target flags) and a bounded sample are kept, so memory grows with the
+    number of groups and unique issues, not with the size of each issue.
+    """
+
+    def __init__(self, router=None, provider: str = "anthropic"):
+        self.router = router
+        self.provider = provider
+        self.total = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self._seen: set = set()
+        self.groups: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, issue: Dict[str, Any]) -> None:
+        self.total += 1
+        if not isinstance(issue, dict):
+            self.invalid += 1
+            return
+        norm = normalize_issue(issue)
+        key = (norm["address"], norm["attribute"], norm["drift_type"])
+        if key in self._seen:
+            self.duplicates += 1
+            return
+        self._seen.add(key)
+
+        group_id = f"{norm['module'] or 'root'}/{norm['resource_type']}"
+        group = self.groups.get(group_id)
+        if group is None:
+            group = self.groups[group_id] = {
+                "group_id": group_id,
+                "module": norm["module"],
+                "resource_type": norm["resource_type"],
+                "count": 0,
+                "actions": Counter(),
+                "attributes": Counter(),
+                "addresses": set(),
+                "sample": [],
+            }
+        group["count"] += 1
+        group["actions"][norm["action"]] += 1
+        if norm["attribute"]:
+            group["attributes"][norm["attribute"]] += 1
+        group["addresses"].add(norm["address"])
+        if len(group["sample"]) < SAMPLE_ADDRESSES:
+            group["sample"].append(norm["address"])
+
+    def extend(self, issues: Iterable[Dict[str, Any]]) -> "DriftPlanner":
+        for issue in issues:
+            self.add(issue)
+        return self
+
+    # ---------- fix generation ----------
+
+    @staticmethod
+    def _template_fix(group: Dict[str, Any]) -> Dict[str, Any]:
+        """Deterministic fix used when AI is off, fails, or the group is past the prompt budget."""
+        action = group["actions"].most_common(1)[0][0]
+        # Only well-formed addresses make it into -target flags
+        addresses = sorted(a for a in group["addresses"] if ADDRESS_RE.match(a))
+        if action == "import":
+            return {
+                "group_id": group["group_id"],
+                "action": "manual_review",
+                "commands": [],
+                "rationale": f"{group['count']} unmanaged {group['resource_type']} resources need IDs for terraform import",
+                "source": "template",
+            }
+        if action == "remove":
+            return {
+                "group_id": group["group_id"],
+                "action": "manual_review",
+                "commands": ["terraform state list"],
+                "rationale": f"Orphaned {group['resource_type']} state entries; confirm before terraform state rm",
+                "source": "template",
+            }
+        untargetable = len(group["addresses"]) - len(addresses)
+        if addresses:
+            chunks = [addresses[i:i + MAX_TARGETS] for i in range(0, len(addresses), MAX_TARGETS)]
+        elif group["module"] and ADDRESS_RE.match(group["module"]):
+            chunks = [[group["module"]]]
+        else:
+            return {
+                "group_id": group["group_id"],
+                "action": "manual_review",
+                "commands": [],
+                "rationale": f"No targetable {group['resource_type']} addresses; refusing an untargeted plan",
+                "source": "template",
+            }
+        # At most MAX_TARGETS per plan: large groups become several targeted plan/apply pairs
+        commands = []
+        for i, chunk in enumerate(chunks, 1):
+            planfile = "drift.tfplan" if len(chunks) == 1 else f"drift-{i}.tfplan"
+            targets = " ".join(f"-target={a}" for a in chunk)
+            commands += [f"terraform plan -out={planfile} {targets}", f"terraform apply {planfile}"]
+        rationale = f"Re-converge {group['count']} drifted {group['resource_type']} resources to configuration"
+        if untargetable:
+            rationale += f"; {untargetable} malformed addresses need manual review"
+        return {
+            "group_id": group["group_id"],
+            "action": "reconcile",
+            "commands": commands,
+            "rationale": rationale,
+            "source": "template",
+        }
+
+    def _build_prompt(self, groups: List[Dict[str, Any]]) -> str:
+        lines = [
+            "You are fixing Terraform drift. For each group below, propose ONE safe fix.",
+            "Reply with ONLY a JSON array of objects: "
+            '{"group_id": str, "action": "reconcile"|"manual_review", "command": str, "rationale": str}. '
+            'Allowed commands: "terraform plan -out=<name>.tfplan -target=<address> ..." (targeted, addresses '
+            'from the group), "terraform apply <name>.tfplan", "terraform state list|show". Anything else is discarded.',
+            "",
+        ]
+        for group in groups:
+            lines.append(json.dumps({
+                "group_id": group["group_id"],
+                "resource_type": group["resource_type"],
+                "count": group["count"],
+                "actions": dict(group["actions"]),
+                "top_attributes": [a for a, _ in group["attributes"].most_common(5)],
+                "sample": group["sample"],
+            }, separators=(",", ":")))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _in_group(address: str, group: Dict[str, Any]) -> bool:
+        prefix = ".".join(p for p in (group["module"], group["resource_type"]) if p) + "."
+        return address in group["addresses"] or address.startswith(prefix) or address == group["module"]
+
+    @classmethod
+    def _check_ai_command(cls, command: str, group: Dict[str, Any]) -> Optional[str]:
+        """Why a model-proposed command is not allowed for this group, or None if it is."""
+        try:
+            argv = shlex.split(command)
+        except ValueError as e:
+            return f"unparseable: {e}"
+        if len(argv) < 2 or argv[0] != "terraform":
+            return "not a terraform command"
+        if argv[1] == "plan":
+            targets = 0
+            for arg in argv[2:]:
+                if arg.startswith("-target="):
+                    address = arg[len("-target="):]
+                    if not ADDRESS_RE.match(address) or not cls._in_group(address, group):
+                        return f"target outside the group: {address}"
+                    targets += 1
+                elif not (arg.startswith("-out=") and PLANFILE_RE.match(arg[len("-out="):])) and arg not in PLAN_FLAGS:
+                    return f"plan flag not allowed: {arg}"
+            return None if targets else "untargeted plan"
+        if argv[1] == "apply":
+            return None if len(argv) == 3 and PLANFILE_RE.match(argv[2]) else "apply only takes a saved plan file"
+        if tuple(argv[1:3]) in READ_ONLY:
+            return None
+        return f"subcommand not allowed: {' '.join(argv[1:3])}"
+
+    @classmethod
+    def _parse_ai_fixes(cls, text: str, groups: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Model fixes that pass the allowlist, keyed by group; rejected ones are listed under None."""
+        start, end = text.find("["), text.rfind("]")
+        if start < 0 or end <= start:
+            raise ValueError("No JSON array in model response")
+        fixes: Dict[Any, Any] = {None: []}
+        for item in json.loads(text[start:end + 1]):
+            if not isinstance(item, dict):
+                continue
+            group_id, command = str(item.get("group_id")), str(item.get("command", "")).strip()
+            action = item.get("action", "reconcile")
+            if group_id not in groups:
+                reason = "unknown group"
+            elif action not in AI_ACTIONS:
+                reason = f"action not allowed: {action}"
+            else:
+                reason = cls._check_ai_command(command, groups[group_id])
+            if reason:
+                fixes[None].append({"group_id": group_id, "command": command[:200], "reason": reason})
+                continue
+            fixes[group_id] = {
+                "group_id": group_id,
+                "action": action,
+                "commands": [command],
+                "rationale": str(item.get("rationale", ""))[:300],
+                "source": "ai",
+            }
+        return fixes
+
+    def plan(self) -> Dict[str, Any]:
+        """Generate fixes for every group and return the consolidated plan."""
+        started = time.time()
+        ordered = sorted(self.groups.values(), key=lambda g: -g["count"])
+        ai_info: Dict[str, Any] = {"used": False, "calls": 0}
+
+        ai_fixes: Dict[str, Dict[str, Any]] = {}
+        if self.router is not None and ordered:
+            batch = ordered[:MAX_AI_GROUPS]
+            ai_info.update({"used": True, "calls": 1, "groups": len(batch)})
+            try:
+                result = self.router.route(
+                    self._build_prompt(batch), {"provider": self.provider, "max_tokens": AI_MAX_TOKENS}
+                )
+                if result.get("error"):
+                    raise RuntimeError(result["error"])
+                ai_fixes = self._parse_ai_fixes(result.get("response") or "", {g["group_id"]: g for g in batch})
+                rejected = ai_fixes.pop(None)
+                if rejected:
+                    ai_info.update(rejected=len(rejected), rejections=rejected[:5])
+            except Exception as e:
+                ai_info["error"] = str(e)
+
+        fixes = [ai_fixes.get(g["group_id"]) or self._template_fix(g) for g in ordered]
+        groups = [
+            {
+                "group_id": g["group_id"],
+                "module": g["module"],
+                "resource_type": g["resource_type"],
+                "count": g["count"],
+                "actions": dict(g["actions"]),
+                "sample": g["sample"],
+            }
+            for g in ordered
+        ]
+        return {
+            "id": f"tfplan-{int(time.time())}-{uuid.uuid4().hex[:8]}",
+            "total_issues": self.total,
+            "unique_issues": self.total - self.duplicates - self.invalid,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "groups": groups,
+            "fixes": fixes,
+            "ai": ai_info,
+            "planning_seconds": round(time.time() - started, 3),
+        }
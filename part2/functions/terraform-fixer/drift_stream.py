@@ -0,0 +1,260 @@
+# ============================================
+# 🌊 drift_stream.py (terraform-fixer)
+# Incremental parsing of drift reports: yields drift_issues one at a
+# time from a byte stream, so memory stays flat for any report size.
+# ============================================
+
+from __future__ import annotations
+
+import base64
+import codecs
+import json
+import os
+import re
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+MAX_FIELD_CHARS = 4096  # top-level scalars kept in .fields (e.g. drift_report_uri)
+
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_PRIMITIVE_END = re.compile(r"[\s,}\]]")
+
+
+class DriftStreamError(ValueError):
+    """Raised when the drift report is not valid JSON of the expected shape."""
+
+
+class Base64Reader:
+    """File-like reader that base64-decodes a str lazily, chunk by chunk."""
+
+    def __init__(self, encoded: str):
+        self._encoded = encoded
+        self._pos = 0
+
+    def read(self, size: int = CHUNK_SIZE) -> bytes:
+        if self._pos >= len(self._encoded):
+            return b""
+        step = max(4, (size // 3) * 4)  # keep reads aligned to 4-char quanta
+        piece = self._encoded[self._pos:self._pos + step]
+        self._pos += step
+        return base64.b64decode(piece)
+
+
+class DriftReportParser:
+    """
+    Streams a drift report of the form {"drift_issues": [...], ...}
+    (or a bare top-level array of issues).
+
+    `issues()` yields each issue as a dict while the rest of the document is
+    skipped without being materialized. Small top-level scalar fields are
+    collected into `fields` as they are passed.
+    """
+
+    def __init__(self, fp: BinaryIO, chunk_size: int = CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.fields: Dict[str, Any] = {}
+        self.bytes_read = 0
+
+    # ---------- buffer ----------
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._fp.read(self._chunk_size)
+        self.bytes_read += len(data)
+        if not data:
+            self._eof = True
+            tail = self._decoder.decode(b"", final=True)
+        else:
+            tail = self._decoder.decode(data)
+        self._buf = self._buf[self._pos:] + tail
+        self._pos = 0
+        return bool(data) or bool(tail)
+
+    def _peek(self) -> str:
+        """Next non-whitespace char (not consumed), or '' at EOF."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise DriftStreamError(f"Expected {char!r}, found {found or 'EOF'!r}")
+        self._pos += 1
+
+    # ---------- scanners (sink=None skips without copying) ----------
+
+    def _scan_string(self, sink: Optional[List[str]]) -> None:
+        self._expect('"')
+        if sink is not None:
+            sink.append('"')
+        while True:
+            m = _STRING_SPECIAL.search(self._buf, self._pos)
+            if m is None:
+                if sink is not None:
+                    sink.append(self._buf[self._pos:])
+                self._pos = len(self._buf)
+                if not self._fill():
+                    raise DriftStreamError("Unterminated string")
+                continue
+            if sink is not None:
+                sink.append(self._buf[self._pos:m.end()])
+            self._pos = m.end()
+            if m.group() == '"':
+                return
+            # backslash: the escaped char belongs to the string
+            if self._pos >= len(self._buf) and not self._fill():
+                raise DriftStreamError("Unterminated escape")
+            if sink is not None:
+                sink.append(self._buf[self._pos])
+            self._pos += 1
+
+    def _scan_value(self, sink: Optional[List[str]]) -> None:
+        first = self._peek()
+        if first == '"':
+            self._scan_string(sink)
+            return
+        if first not in "{[":
+            while True:
+                m = _PRIMITIVE_END.search(self._buf, self._pos)
+                end = m.start() if m else len(self._buf)
+                if sink is not None:
+                    sink.append(self._buf[self._pos:end])
+                self._pos = end
+                if m or not self._fill():
+                    return
+
+        depth = 0
+        while True:
+            m = _STRUCTURAL.search(self._buf, self._pos)
+            if m is None:
+                if sink is not None:
+                    sink.append(self._buf[self._pos:])
+                self._pos = len(self._buf)
+                if not self._fill():
+                    raise DriftStreamError("Unexpected EOF inside value")
+                continue
+            if m.group() == '"':
+                if sink is not None:
+                    sink.append(self._buf[self._pos:m.start()])
+                self._pos = m.start()
+                self._scan_string(sink)
+                continue
+            if sink is not None:
+                sink.append(self._buf[self._pos:m.end()])
+            self._pos = m.end()
+            depth += 1 if m.group() in "{[" else -1
+            if depth == 0:
+                return
+
+    def _read_json(self) -> Any:
+        sink: List[str] = []
+        self._scan_value(sink)
+        try:
+            return json.loads("".join(sink))
+        except json.JSONDecodeError as e:
+            raise DriftStreamError(f"Invalid JSON value: {e}") from e
+
+    def _iter_array(self) -> Iterator[Any]:
+        self._expect("[")
+        while True:
+            char = self._peek()
+            if char == "]":
+                self._pos += 1
+                return
+            if char == ",":
+                self._pos += 1
+                continue
+            if not char:
+                raise DriftStreamError("Unexpected EOF inside array")
+            yield self._read_json()
+
+    # ---------- public ----------
+
+    def issues(self) -> Iterator[Dict[str, Any]]:
+        """Yield drift issues one at a time."""
+        first = self._peek()
+        if first == "[":
+            yield from self._iter_array()
+            return
+        self._expect("{")
+        while True:
+            char = self._peek()
+            if char == "}":
+                self._pos += 1
+                return
+            if char == ",":
+                self._pos += 1
+                continue
+            if not char:
+                raise DriftStreamError("Unexpected EOF inside object")
+
+            key_sink: List[str] = []
+            self._scan_string(key_sink)
+            key = json.loads("".join(key_sink))
+            self._expect(":")
+
+            if key == "drift_issues" and self._peek() == "[":
+                yield from self._iter_array()
+            elif self._peek() in "{[":
+                self._scan_value(None)
+            else:
+                sink: List[str] = []
+                self._scan_value(sink)
+                text = "".join(sink)
+                if len(text) <= MAX_FIELD_CHARS:
+                    self.fields[key] = json.loads(text)
+
+
+def open_report(uri: str) -> BinaryIO:
+    """
+    Open a drift report by reference, as a binary stream. The reference comes
+    from a Pub/Sub message, so only gs://bucket/path is accepted:
+      - read from DRIFT_REPORT_LOCAL_ROOT/bucket/path when that local stand-in
+        is configured (the resolved path must stay inside that bucket)
+      - otherwise streamed from Cloud Storage
+    Raises DriftStreamError for anything else.
+    """
+    if not uri.startswith("gs://"):
+        raise DriftStreamError("drift_report_uri must be a gs:// URI")
+    bucket_and_path = uri[len("gs://"):]
+    bucket, _, path = bucket_and_path.partition("/")
+    if not bucket or not path:
+        raise DriftStreamError("drift_report_uri must name a bucket and an object")
+
+    local_root = os.getenv("DRIFT_REPORT_LOCAL_ROOT", "").strip()
+    if local_root:
+        root = os.path.realpath(local_root)
+        bucket_dir = os.path.realpath(os.path.join(root, bucket))
+        resolved = os.path.realpath(os.path.join(bucket_dir, path))
+        if os.path.dirname(bucket_dir) != root or os.path.commonpath([bucket_dir, resolved]) != bucket_dir:
+            raise DriftStreamError("drift_report_uri resolves outside its bucket under DRIFT_REPORT_LOCAL_ROOT")
+        return open(resolved, "rb")
+    from google.cloud import storage  # only needed for real GCS references
+
+    return storage.Client().bucket(bucket).blob(path).open("rb")
+
+
+def iter_report_issues(fp: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Yield issues from an inline report, following a drift_report_uri
+    reference (to GCS or a local stand-in) when the message carries one.
+    """
+    parser = DriftReportParser(fp)
+    yield from parser.issues()
+
+    uri = parser.fields.get("drift_report_uri")
+    if uri:
+        with open_report(str(uri)) as report:
+            yield from DriftReportParser(report).issues()
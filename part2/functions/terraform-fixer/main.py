@@ -1,89 +1,132 @@
 import os
-import base64
 import json
 import functions_framework
 
+from drift_engine import DriftPlanner
+from drift_stream import Base64Reader, iter_report_issues
+from logging_utils import flush_after, log_error, log_event
+from tracing import init as init_tracing, inject, span, start_trace
+
+AGENT = "🔧 [Terraform Fixer]"
+init_tracing(AGENT)
+
+router = None  # initialized on first invocation when AI is enabled
+
+
+def _get_router():
+    """Lazily create the shared ModelRouter; None if AI is disabled or unavailable."""
+    global router
+    if os.getenv("TERRAFORM_FIXER_AI", "1") != "1":
+        return None
+    if router is None:
+        try:
+            from agents.model_router import ModelRouter
+            router = ModelRouter()
+            log_event(AGENT, "ModelRouter initialized")
+        except Exception as e:
+            log_event(AGENT, "ModelRouter unavailable, using templates", severity="WARNING", error=str(e))
+            return None
+    return router
+
+
+def _publish_plan(plan):
+    """Publish the consolidated plan when TERRAFORM_PLAN_TOPIC is configured."""
+    topic = os.getenv("TERRAFORM_PLAN_TOPIC", "").strip()
+    if not topic:
+        return
+    if not topic.startswith("projects/"):
+        project = os.getenv("GCP_PROJECT") or os.getenv("GOOGLE_CLOUD_PROJECT")
+        topic = f"projects/{project}/topics/{topic}"
+    try:
+        from google.cloud import pubsub_v1
+        inject(plan.setdefault("metadata", {}))
+        pubsub_v1.PublisherClient().publish(topic, json.dumps(plan).encode("utf-8"))
+        log_event(AGENT, "Published plan", status="success", plan_id=plan["id"], topic=topic)
+    except Exception as e:
+        log_error(AGENT, f"Failed to publish plan: {e}", plan_id=plan["id"])
+
+
+def _process_drift(drift_issues):
+    """
+    Group, deduplicate and plan fixes for drift issues.
+    Accepts any iterable; issues are consumed one at a time.
+    """
+    with span("terraform_fix") as root:
+        return _plan_drift(drift_issues, root)
+
+
+def _plan_drift(drift_issues, root):
+    planner = DriftPlanner(router=_get_router(), provider=os.getenv("TERRAFORM_FIXER_PROVIDER", "anthropic"))
+    with span("ingest") as ingest:  # decode + parse + group, streamed
+        try:
+            planner.extend(drift_issues)
+        except ValueError as e:  # DriftStreamError, bad base64
+            ingest.set_attribute("parse_error", str(e))
+            log_error(AGENT, f"Report parse error after {planner.total} issues: {e}")
+        ingest.set_attribute("issues", planner.total)
+    with span("plan", groups=len(planner.groups)) as planning:  # includes the batched model call
+        plan = planner.plan()
+        planning.set_attribute("ai_calls", plan["ai"]["calls"])
+    root.set_attribute("plan_id", plan["id"])
+    log_event(
+        AGENT, "Plan ready", plan_id=plan["id"], total_issues=plan["total_issues"],
+        unique_issues=plan["unique_issues"], duplicates=plan["duplicates"], groups=len(plan["groups"]),
+        ai_calls=plan["ai"]["calls"], planning_seconds=plan["planning_seconds"],
+        fixes=[{k: fix[k] for k in ("group_id", "action", "source", "commands")} for fix in plan["fixes"][:5]],
+    )
+    log_event(AGENT, "Plan payload", severity="DEBUG", plan=plan)
+    with span("publish"):
+        _publish_plan(plan)
+    return plan
+
+
 @functions_framework.cloud_event  
+@flush_after
 def terraform_fix_event(cloud_event):
-    """Terraform Fix Generator - with maximum defensive programming."""
-    print("🔧 [Terraform Fixer] Function started")
+    """Terraform Fix Generator - decodes drift_issues and emits a consolidated fix plan."""
+    start_trace(None)
+    log_event(AGENT, "Function started")
     
     try:
-        print("🔧 [Terraform Fixer] Processing event (AI disabled for debugging)")
-        
         # Step 1: Check if event exists
         if not cloud_event:
-            print("🔧 [Terraform Fixer] No cloud_event received")
+            log_event(AGENT, "No cloud_event received", severity="WARNING")
             return
         
         # Step 2: Check if data exists  
         if not hasattr(cloud_event, 'data') or not cloud_event.data:
-            print("🔧 [Terraform Fixer] No event data")
+            log_event(AGENT, "No event data", severity="WARNING")
             return
-            
-        print("🔧 [Terraform Fixer] Event data exists")
         
         # Step 3: Log the type and basic info
-        try:
-            print(f"🔧 [Terraform Fixer] Event data type: {type(cloud_event.data)}")
-            print(f"🔧 [Terraform Fixer] Event data keys: {list(cloud_event.data.keys()) if isinstance(cloud_event.data, dict) else 'not dict'}")
-        except Exception as e:
-            print(f"🔧 [Terraform Fixer] Error logging data info: {e}")
+        log_event(
+            AGENT, "Event data received", severity="DEBUG",
+            data_type=type(cloud_event.data).__name__,
+            keys=list(cloud_event.data.keys()) if isinstance(cloud_event.data, dict) else None,
+        )
         
         # Step 4: Try to extract message
         try:
             if isinstance(cloud_event.data, dict) and 'message' in cloud_event.data:
                 message = cloud_event.data['message']
-                print(f"🔧 [Terraform Fixer] Found message: {type(message)}")
-                
                 if 'data' in message:
                     base64_data = message['data']
-                    print(f"🔧 [Terraform Fixer] Found base64 data: {len(base64_data)} chars")
+                    log_event(AGENT, "Found base64 data", chars=len(base64_data))
                     
-                    # Step 5: Try base64 decode
-                    try:
-                        decoded_message = base64.b64decode(base64_data).decode('utf-8')
-                        print(f"🔧 [Terraform Fixer] Decoded successfully: {len(decoded_message)} chars")
-                        
-                        # Step 6: Try JSON parse
-                        try:
-                            drift_data = json.loads(decoded_message)
-                            print("🔧 [Terraform Fixer] JSON parsed successfully")
-                            
-                            drift_issues = drift_data.get("drift_issues", [])
-                            print(f"🔧 [Terraform Fixer] Found {len(drift_issues)} drift issues")
-                            
-                            # Log each issue safely
-                            for i, issue in enumerate(drift_issues[:5]):  # Limit to 5
-                                try:
-                                    issue_type = issue.get('type', 'unknown')
-                                    resource_name = issue.get('resource_name', 'unknown')
-                                    print(f"🔧 [Terraform Fixer] Issue {i+1}: {issue_type} - {resource_name}")
-                                except Exception as e:
-                                    print(f"🔧 [Terraform Fixer] Error logging issue {i+1}: {e}")
-                            
-                        except json.JSONDecodeError as e:
-                            print(f"🔧 [Terraform Fixer] JSON parse error: {e}")
-                            drift_issues = []
-                            
-                    except Exception as e:
-                        print(f"🔧 [Terraform Fixer] Base64 decode error: {e}")
-                        drift_issues = []
+                    # Step 5: Stream-decode and parse issues one at a time
+                    _process_drift(iter_report_issues(Base64Reader(base64_data)))
                         
                 else:
-                    print("🔧 [Terraform Fixer] No 'data' field in message")
-                    drift_issues = []
+                    log_event(AGENT, "No 'data' field in message", severity="WARNING")
             else:
-                print("🔧 [Terraform Fixer] No 'message' field in event data")
-                drift_issues = []
+                log_event(AGENT, "No 'message' field in event data", severity="WARNING")
                 
         except Exception as e:
-            print(f"🔧 [Terraform Fixer] Error in message processing: {e}")
-            drift_issues = []
+            log_error(AGENT, f"Error in message processing: {e}")
         
-        print("🔧 [Terraform Fixer] Function completed successfully")
+        log_event(AGENT, "Function completed successfully", status="success")
         # No return needed for CloudEvent functions
         
     except Exception as e:
-        print(f"🔧 [Terraform Fixer] Critical error: {e}")
+        log_error(AGENT, f"Critical error: {e}")
         # No return needed for CloudEvent functions
@@ -0,0 +1,265 @@
+# ============================================
+# 🧠 fix_history.py (shared by diagnoser + remediator)
+# Remembers which commands fixed which failures: keyed by repository, step
+# and error signature; SQLite locally, Firestore in production. Each row is
+# a Beta posterior over the command's success rate (prior + outcome counts).
+# ============================================
+
+from __future__ import annotations
+
+import abc
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+BACKEND = os.getenv("FIX_HISTORY_BACKEND", "firestore" if os.getenv("K_SERVICE") else "sqlite").lower()  # sqlite | firestore | off
+SQLITE_PATH = os.getenv("FIX_HISTORY_PATH", "/tmp/fix_history.db")
+COLLECTION = os.getenv("FIX_HISTORY_COLLECTION", "fix_history")
+OUTCOMES_COLLECTION = os.getenv("FIX_HISTORY_OUTCOMES_COLLECTION", f"{COLLECTION}_outcomes")  # counted result ids
+OUTCOME_TTL_DAYS = int(os.getenv("FIX_HISTORY_OUTCOME_TTL_DAYS", "30"))  # expires_at, for a Firestore TTL policy
+MIN_SUCCESSES = int(os.getenv("FIX_HISTORY_MIN_SUCCESSES", "2"))  # before a fix is reused without asking a model
+MIN_SUCCESS_RATE = float(os.getenv("FIX_HISTORY_MIN_SUCCESS_RATE", "0.8"))
+PRIOR_ALPHA = float(os.getenv("FIX_HISTORY_PRIOR_ALPHA", "1"))  # Beta prior: uniform by default
+PRIOR_BETA = float(os.getenv("FIX_HISTORY_PRIOR_BETA", "1"))
+ANY_REPOSITORY = "*"  # every outcome is also counted here, so one repo's fix helps the others
+
+# Volatile parts of error text: paths, hashes, versions, numbers, quoted values
+_VOLATILE = [
+    (re.compile(r"(?:[a-z]:)?[\\/][\w.@\\/-]+"), "<path>"),
+    (re.compile(r"\b[0-9a-f]{7,64}\b"), "<hex>"),
+    (re.compile(r"\bv?\d+(?:\.\d+)+(?:[-+][\w.]+)?\b"), "<ver>"),
+    (re.compile(r"\d+"), "<n>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\"|`[^`]*`"), "<q>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def error_signature(error_text: Any, max_chars: int = 300) -> str:
+    """Stable fingerprint of an error message (volatile details normalized away)."""
+    text = str(error_text or "").lower()[:max_chars * 4]
+    for pattern, replacement in _VOLATILE:
+        text = pattern.sub(replacement, text)
+    return hashlib.sha1(text.strip()[:max_chars].encode("utf-8")).hexdigest()[:16]
+
+
+def history_key(repository: str, step: str, signature: str) -> str:
+    return hashlib.sha1(f"{repository}\x00{step}\x00{signature}".encode("utf-8")).hexdigest()
+
+
+# Outcomes of the commands each ensemble provider proposed, one row per provider under one key
+PROVIDER_KEY = history_key(ANY_REPOSITORY, "ensemble", "providers")
+
+
+def posterior(successes: int, failures: int, z: float = 1.645) -> Dict[str, float]:
+    """Beta(alpha, beta) over the success rate: mean plus a one-sided lower bound (normal approximation)."""
+    alpha, beta = PRIOR_ALPHA + successes, PRIOR_BETA + failures
+    mean = alpha / (alpha + beta)
+    sd = (alpha * beta / ((alpha + beta) ** 2 * (alpha + beta + 1))) ** 0.5
+    return {"alpha": alpha, "beta": beta, "mean": round(mean, 3), "lower": round(max(0.0, mean - z * sd), 3)}
+
+
+def learned_confidence(successes: int, failures: int) -> float:
+    """Posterior mean success rate."""
+    return posterior(successes, failures)["mean"]
+
+
+def is_proven(successes: int, failures: int) -> bool:
+    """Enough successes, and few enough failures, to trust a fix without review."""
+    return successes >= MIN_SUCCESSES and successes / max(1, successes + failures) >= MIN_SUCCESS_RATE
+
+
+def _with_posterior(row: Dict[str, Any]) -> Dict[str, Any]:
+    post = posterior(row["successes"], row["failures"])
+    return dict(row, confidence=post["mean"], lower_bound=post["lower"],
+                proven=is_proven(row["successes"], row["failures"]))
+
+
+def _best(rows: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The proven fix among candidate rows, if any meets the reuse bar."""
+    proven = [_with_posterior(row) for row in rows if is_proven(row["successes"], row["failures"])]
+    if not proven:
+        return None
+    return max(proven, key=lambda r: (r["confidence"], r["successes"]))
+
+
+class FixHistory(abc.ABC):
+    """Backend interface: candidates per key, and outcome counters per (key, command)."""
+
+    @abc.abstractmethod
+    def _candidates(self, key: str) -> List[Dict[str, Any]]:
+        """Every (command, counters) row stored under one history key."""
+
+    @abc.abstractmethod
+    def _apply(self, increments: List[Tuple[str, Dict[str, Any]]], success: bool,
+               outcome_id: Optional[str]) -> bool:
+        """
+        Count one outcome on every (key, fields) row in a single transaction.
+        With an outcome_id the outcome is counted at most once, across
+        instances and restarts: returns False if it already was.
+        """
+
+    def lookup(self, repository: str, step: str, signature: str) -> Optional[Dict[str, Any]]:
+        """Best known-good fix for this failure: this repository first, then any repository."""
+        for repo in (repository, ANY_REPOSITORY):
+            best = _best(self._candidates(history_key(repo, step, signature)))
+            if best:
+                return dict(best, scope="repository" if repo == repository else "global")
+        return None
+
+    def stats(self, repository: str, step: str, signature: str, command: str) -> Optional[Dict[str, Any]]:
+        """Posterior for one command against this failure: this repository first, then any repository."""
+        for repo in (repository, ANY_REPOSITORY):
+            for row in self._candidates(history_key(repo, step, signature)):
+                if row["command"] == command:
+                    return dict(_with_posterior(row), scope="repository" if repo == repository else "global")
+        return None
+
+    def record(self, repository: str, step: str, signature: str, command: str, success: bool,
+               fix_type: str = "unknown", risk: str = "high", outcome_id: Optional[str] = None,
+               providers: Sequence[str] = ()) -> bool:
+        """
+        Count one outcome for this repository and for any repository, and for
+        each ensemble provider that proposed the command. Pass the execution
+        result id as outcome_id so a redelivered result is not counted twice;
+        returns False for such a duplicate.
+        """
+        increments = [
+            (history_key(repo, step, signature), {
+                "repository": repo, "step": step, "signature": signature,
+                "command": command, "fix_type": fix_type, "risk": risk,
+            })
+            for repo in sorted({repository, ANY_REPOSITORY})
+        ]
+        increments += [
+            (PROVIDER_KEY, {
+                "repository": ANY_REPOSITORY, "step": "ensemble", "signature": "providers",
+                "command": provider, "fix_type": "provider", "risk": risk,
+            })
+            for provider in sorted(set(providers))
+        ]
+        return self._apply(increments, success, outcome_id)
+
+    def provider_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Posterior success rate of the fixes each ensemble provider proposed, by provider."""
+        return {row["command"]: _with_posterior(row) for row in self._candidates(PROVIDER_KEY)}
+
+
+class SQLiteFixHistory(FixHistory):
+    def __init__(self, path: str = SQLITE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fixes ("
+            "key TEXT, command TEXT, repository TEXT, step TEXT, signature TEXT, fix_type TEXT, risk TEXT, "
+            "successes INTEGER DEFAULT 0, failures INTEGER DEFAULT 0, updated_at REAL, "
+            "PRIMARY KEY (key, command))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS outcomes (outcome_id TEXT PRIMARY KEY, recorded_at REAL)")
+        self._conn.commit()
+
+    def _candidates(self, key):
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT command, repository, step, signature, fix_type, risk, successes, failures, updated_at "
+                "FROM fixes WHERE key = ?", (key,)
+            )
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _apply(self, increments, success, outcome_id):
+        with self._lock:
+            try:
+                if outcome_id:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO outcomes (outcome_id, recorded_at) VALUES (?, ?)",
+                        (outcome_id, time.time()),
+                    )
+                    if cursor.rowcount == 0:
+                        self._conn.rollback()
+                        return False
+                for key, fields in increments:
+                    self._conn.execute(
+                        "INSERT INTO fixes (key, command, repository, step, signature, fix_type, risk, successes, "
+                        "failures, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (key, command) DO UPDATE SET successes = successes + excluded.successes, "
+                        "failures = failures + excluded.failures, fix_type = excluded.fix_type, "
+                        "risk = excluded.risk, updated_at = excluded.updated_at",
+                        (key, fields["command"], fields["repository"], fields["step"], fields["signature"],
+                         fields["fix_type"], fields["risk"], int(success), int(not success), time.time()),
+                    )
+                self._conn.commit()
+                return True
+            except Exception:
+                self._conn.rollback()
+                raise
+
+
+class FirestoreFixHistory(FixHistory):
+    """
+    One document per (key, command). An outcome's counter increments and its
+    marker document in OUTCOMES_COLLECTION (keyed by the result id) are
+    written in one transaction, so a redelivered result - to any instance,
+    before or after a cold start - is counted once. Markers carry expires_at
+    for a Firestore TTL policy.
+    """
+
+    def __init__(self, collection: str = COLLECTION, outcomes_collection: str = OUTCOMES_COLLECTION):
+        from google.cloud import firestore
+        self._firestore = firestore
+        self._client = firestore.Client()
+        self._collection = self._client.collection(collection)
+        self._outcomes = self._client.collection(outcomes_collection)
+
+    def _candidates(self, key):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        docs = self._collection.where(filter=FieldFilter("key", "==", key)).limit(50).stream()
+        return [
+            {"successes": 0, "failures": 0, **{k: v for k, v in doc.to_dict().items() if k != "key"}}
+            for doc in docs
+        ]
+
+    def _apply(self, increments, success, outcome_id):
+        firestore = self._firestore
+        marker = (self._outcomes.document(hashlib.sha1(outcome_id.encode("utf-8")).hexdigest())
+                  if outcome_id else None)
+
+        @firestore.transactional
+        def apply(transaction):
+            if marker is not None:
+                if marker.get(transaction=transaction).exists:
+                    return False
+                transaction.create(marker, {
+                    "outcome_id": outcome_id, "success": success, "recorded_at": time.time(),
+                    "expires_at": datetime.datetime.now(datetime.timezone.utc)
+                    + datetime.timedelta(days=OUTCOME_TTL_DAYS),
+                })
+            for key, fields in increments:
+                doc_id = hashlib.sha1(f"{key}\x00{fields['command']}".encode("utf-8")).hexdigest()
+                transaction.set(self._collection.document(doc_id), {
+                    **fields, "key": key,
+                    "successes": firestore.Increment(int(success)),
+                    "failures": firestore.Increment(int(not success)),
+                    "updated_at": time.time(),
+                }, merge=True)
+            return True
+
+        return apply(self._client.transaction())
+
+
+_history: Optional[FixHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> Optional[FixHistory]:
+    """Process-wide store for FIX_HISTORY_BACKEND (None when it is 'off')."""
+    global _history
+    if _history is None and BACKEND != "off":
+        with _history_lock:
+            if _history is None:
+                _history = FirestoreFixHistory() if BACKEND == "firestore" else SQLiteFixHistory()
+    return _history
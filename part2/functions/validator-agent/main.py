@@ -1,11 +1,32 @@
 import base64
+import contextvars
 import json
 import os
 import time
 import uuid
 
 import functions_framework
-from google.cloud import pubsub_v1
+
+from fix_history import get_history
+from logging_utils import flush_after, log_error, log_event
+from policy_engine import PolicyError, load_policy
+from tracing import init as init_tracing, inject, record, span, start_trace
+
+AGENT = "[Validator]"
+init_tracing(AGENT)
+
+# Compiled once per instance (cold start), reused for every message
+try:
+    POLICY = load_policy()
+except PolicyError as e:
+    log_error(AGENT, f"{e}; falling back to built-in policy")
+    POLICY = load_policy(policy_file="")  # built-in rules plus APPROVED_KEYWORDS, as on the primary path
+log_event(AGENT, "Policy compiled", rules=len(POLICY.rules))
+
+# Outcome feedback: fixes that keep failing are not re-run; optionally only proven fixes are
+HISTORY_MIN_ATTEMPTS = int(os.getenv("VALIDATOR_HISTORY_MIN_ATTEMPTS", "3"))
+HISTORY_MIN_SUCCESS = float(os.getenv("VALIDATOR_HISTORY_MIN_SUCCESS", "0.5"))
+REQUIRE_PROVEN = os.getenv("VALIDATOR_REQUIRE_PROVEN", "0") == "1"
 
 
 def _decode_pubsub_message(cloud_event):
@@ -23,50 +44,6 @@ def _decode_pubsub_message(cloud_event):
     return message or data
 
 
-def _parse_approved_keywords():
-    """
-    Parse APPROVED_KEYWORDS with multiple fallback strategies.
-    Prevents the parsing errors that crash the validator.
-    """
-    raw_value = os.getenv("APPROVED_KEYWORDS", "")
-    
-    if not raw_value:
-        # Default safe keywords
-        default_keywords = ["fix", "update", "install", "upgrade", "patch", "resolve", "npm"]
-        print(f"[Validator] Using default approved keywords: {default_keywords}")
-        return default_keywords
-    
-    # Try multiple parsing strategies
-    try:
-        # Strategy 1: Comma-separated
-        if "," in raw_value:
-            keywords = [k.strip().lower() for k in raw_value.split(",") if k.strip()]
-            if keywords:
-                print(f"[Validator] Parsed {len(keywords)} approved keywords from comma-separated")
-                return keywords
-        
-        # Strategy 2: Space-separated  
-        if " " in raw_value:
-            keywords = [k.strip().lower() for k in raw_value.split() if k.strip()]
-            if keywords:
-                print(f"[Validator] Parsed {len(keywords)} approved keywords from space-separated")
-                return keywords
-        
-        # Strategy 3: Single keyword
-        single_keyword = raw_value.strip().lower()
-        if single_keyword:
-            print(f"[Validator] Using single approved keyword: {single_keyword}")
-            return [single_keyword]
-            
-    except Exception as e:
-        print(f"[Validator] Failed to parse APPROVED_KEYWORDS '{raw_value}': {e}")
-    
-    # Fallback to safe defaults
-    default_keywords = ["fix", "update", "install", "upgrade", "patch", "resolve", "npm"]
-    print(f"[Validator] Using fallback approved keywords: {default_keywords}")
-    return default_keywords
-
-
 def _resolve_remediation_topic():
     """
     Resolve remediation topic from environment variables.
@@ -87,53 +64,72 @@ def _resolve_remediation_topic():
     return f"projects/{project}/topics/{topic_id}"
 
 
-@functions_framework.cloud_event
-def validate_fix_event(cloud_event):
-    """
-    Pub/Sub-triggered function:
-      - Receives diagnosis from diagnoser agent
-      - Validates command against approved keywords
-      - Publishes approved fixes to remediation topic
-    """
-    print("[Validator] Processing validation request")
-    
-    # Decode diagnosis event
-    diagnosis = _decode_pubsub_message(cloud_event)
-    print(f"[Validator] Received diagnosis: {diagnosis}")
+def _resolve_subscription(subscription):
+    """Expand a bare subscription id into a full subscription path."""
+    if subscription.startswith("projects/") and "/subscriptions/" in subscription:
+        return subscription
+    project = (
+        os.getenv("GCP_PROJECT")
+        or os.getenv("GOOGLE_CLOUD_PROJECT")
+        or os.getenv("GCLOUD_PROJECT")
+    )
+    if not project:
+        raise RuntimeError("Missing GOOGLE_CLOUD_PROJECT/GCP_PROJECT")
+    return f"projects/{project}/subscriptions/{subscription}"
 
-    # Get approved keywords
-    approved_keywords = _parse_approved_keywords()
-    
+
+def _outcome_track(diagnosis, command):
+    """Posterior of this command against this failure, from the fix history (None if unknown)."""
+    metadata = diagnosis.get("metadata") or {}
+    if not metadata.get("error_signature"):
+        return None
+    try:
+        history = get_history()
+        if not history:
+            return None
+        return history.stats(str(metadata.get("repository") or "unknown"), str(metadata.get("step") or "unknown"),
+                             metadata["error_signature"], str(command))
+    except Exception as e:
+        log_event(AGENT, "Fix history lookup failed", severity="WARNING", error=str(e))
+        return None
+
+
+def _history_rejection(track):
+    """Reason to withhold approval based on past outcomes, or None."""
+    if track:
+        attempts = track["successes"] + track["failures"]
+        if attempts >= HISTORY_MIN_ATTEMPTS and track["confidence"] < HISTORY_MIN_SUCCESS:
+            return f"Fix failed {track['failures']} of {attempts} past attempts (success posterior {track['confidence']})"
+    if REQUIRE_PROVEN and not (track and track["proven"]):
+        return "Fix not yet proven by past outcomes"
+    return None
+
+
+def _build_validation_result(diagnosis):
+    """Evaluate one diagnosis against the compiled policy and build its validation result."""
     # Extract command and metadata
-    command = diagnosis.get("command", "").lower()
+    command = diagnosis.get("command", "")
     fix_type = diagnosis.get("fix_type", "unknown")
     risk = diagnosis.get("risk", "high")
     confidence = diagnosis.get("confidence", 0.3)
     
-    # Validation logic
-    approved = False
-    reason = "Unknown command"
-    
-    # Check if command contains approved keywords
-    for keyword in approved_keywords:
-        if keyword in command:
-            approved = True
-            reason = f"Contains approved keyword: {keyword}"
-            break
+    # Evaluate against the compiled policy (cached per command/risk)
+    verdict = POLICY.evaluate(str(command), str(risk))
+    approved = verdict["approved"]
+    reason = verdict["reason"]
+    rule = verdict["rule"]
+    if os.getenv("VERBOSE_LOGS", "0") == "1":
+        log_event(AGENT, "Policy trace", severity="DEBUG", sample_rate=1.0, trace=verdict["trace"])
     
-    # Additional validation rules
-    if not approved and "npm install" in command:
-        approved = True
-        reason = "Standard npm install command"
-    elif not approved and risk == "low":
-        approved = True
-        reason = "Low risk operation"
-    elif "rm -rf" in command or "sudo" in command or "delete" in command:
-        approved = False
-        reason = "Dangerous command detected"
+    # Past outcomes of this exact fix set the confidence and can veto the policy
+    track = _outcome_track(diagnosis, command)
+    if track:
+        confidence = track["confidence"]
+    rejection = _history_rejection(track) if approved else None
+    if rejection:
+        approved, reason, rule = False, rejection, "outcome_history"
     
-    # Create validation result
-    validation_result = {
+    return {
         "id": f"rem-{int(time.time())}-{uuid.uuid4().hex[:8]}",
         "original_diagnosis_id": diagnosis.get("id", "unknown"),
         "command": diagnosis.get("command", "echo 'no command'"),
@@ -142,23 +138,221 @@ def validate_fix_event(cloud_event):
         "confidence": confidence,
         "approved": approved,
         "reason": reason,
-        "metadata": diagnosis.get("metadata", {}),
+        "policy_rule": rule,
+        "outcome_history": {
+            key: track[key] for key in ("successes", "failures", "confidence", "lower_bound", "proven", "scope")
+        } if track else None,
+        "metadata": dict(diagnosis.get("metadata") or {}),
         "validation_timestamp": time.time()
     }
-    
-    print(f"[Validator] Validation result: {validation_result}")
-    
-    if approved:
-        # Publish to remediation topic
+
+
+@functions_framework.cloud_event
+@flush_after
+def validate_fix_event(cloud_event):
+    """
+    Pub/Sub-triggered function:
+      - Receives diagnosis from diagnoser agent
+      - Validates command against approved keywords
+      - Withholds fixes whose past outcomes (fix history) show they keep failing
+      - Publishes approved fixes to remediation topic
+    """
+    # Decode diagnosis event
+    decode_started = time.perf_counter()
+    diagnosis = _decode_pubsub_message(cloud_event)
+    start_trace(diagnosis)
+
+    with span("validate", diagnosis_id=str(diagnosis.get("id", "unknown"))) as root:
+        record("decode", time.perf_counter() - decode_started)
+        log_event(AGENT, "Processing validation request", diagnosis_id=diagnosis.get("id", "unknown"))
+        log_event(AGENT, "Received diagnosis", severity="DEBUG", diagnosis=diagnosis)
+
+        with span("policy_evaluate"):
+            validation_result = _build_validation_result(diagnosis)
+        approved = validation_result["approved"]
+        reason = validation_result["reason"]
+        root.set_attribute("approved", approved)
+
+        log_event(
+            AGENT, "Validation result", approved=approved, reason=reason,
+            policy_rule=validation_result["policy_rule"], command=validation_result["command"],
+        )
+
+        if approved:
+            # Publish to remediation topic
+            try:
+                with span("publish"):
+                    from google.cloud import pubsub_v1
+                    topic_path = _resolve_remediation_topic()
+                    publisher = pubsub_v1.PublisherClient()
+                    inject(validation_result["metadata"])
+                    publisher.publish(topic_path, json.dumps(validation_result).encode("utf-8"))
+                log_event(AGENT, "Published approved fix to remediation", status="success", command=validation_result["command"])
+                return {"status": "approved", "published": True}
+            except Exception as e:
+                log_error(AGENT, f"Failed to publish to remediation: {e}")
+                return {"status": "approved", "published": False, "error": str(e)}
+        else:
+            log_event(AGENT, "Rejected fix", severity="WARNING", status="rejected", reason=reason)
+            return {"status": "rejected", "reason": reason}
+
+
+def _continue_trace(diagnosis, metadata):
+    """Carry a diagnosis's trace context into its outgoing metadata (run in a copied context)."""
+    start_trace(diagnosis)
+    inject(metadata)
+
+
+def _parse_flag(value, default):
+    """JSON boolean, or the strings "true"/"false"; None if it is neither."""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    return None
+
+
+def validate_batch(diagnoses, publish=True):
+    """
+    Validate a list of diagnoses against the compiled policy.
+      - Every approved result is published to the remediation topic in one
+        batched publish (futures are awaited together)
+      - Returns one verdict per input item, in input order
+    """
+    results = []
+    for diagnosis in diagnoses:
+        if isinstance(diagnosis, dict):
+            results.append(_build_validation_result(diagnosis))
+        else:
+            results.append(None)
+
+    verdicts = []
+    for index, result in enumerate(results):
+        if result is None:
+            verdicts.append({"index": index, "status": "invalid", "reason": "Diagnosis must be a JSON object"})
+        else:
+            verdicts.append({
+                "index": index,
+                "original_diagnosis_id": result["original_diagnosis_id"],
+                "status": "approved" if result["approved"] else "rejected",
+                "reason": result["reason"],
+                "policy_rule": result["policy_rule"],
+            })
+
+    approved = [(i, r) for i, r in enumerate(results) if r is not None and r["approved"]]
+    log_event(AGENT, "Batch validated", approved=len(approved), total=len(results))
+    if not approved or not publish:
+        return verdicts
+
+    # Each item continues its own diagnosis's trace, as on the single-message path
+    for i, r in approved:
+        contextvars.copy_context().run(_continue_trace, diagnoses[i], r["metadata"])
+
+    try:
+        from google.cloud import pubsub_v1
+        topic_path = _resolve_remediation_topic()
+        publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=min(len(approved), 1000),
+                max_latency=0.05,
+            )
+        )
+        futures = [
+            (i, publisher.publish(topic_path, json.dumps(r).encode("utf-8")))
+            for i, r in approved
+        ]
+    except Exception as e:
+        log_error(AGENT, f"Batch publish failed: {e}")
+        for i, _ in approved:
+            verdicts[i].update({"published": False, "error": str(e)})
+        return verdicts
+
+    for i, future in futures:
         try:
-            topic_path = _resolve_remediation_topic()
-            publisher = pubsub_v1.PublisherClient()
-            publisher.publish(topic_path, json.dumps(validation_result).encode("utf-8"))
-            print(f"[Validator] ✅ Published approved fix to remediation: {validation_result['command']}")
-            return {"status": "approved", "published": True}
+            verdicts[i].update({"published": True, "message_id": future.result(timeout=60)})
         except Exception as e:
-            print(f"[Validator] ❌ Failed to publish to remediation: {e}")
-            return {"status": "approved", "published": False, "error": str(e)}
+            verdicts[i].update({"published": False, "error": str(e)})
+
+    published = sum(1 for i, _ in approved if verdicts[i].get("published"))
+    log_event(AGENT, "Published approved fixes to remediation", status="success", published=published, approved=len(approved))
+    return verdicts
+
+
+def _pull_diagnoses(subscription, max_messages):
+    """
+    Pull up to max_messages diagnoses from a subscription. Returns (subscriber, path, ack_ids, diagnoses);
+    the caller closes the subscriber.
+    """
+    from google.cloud import pubsub_v1
+    subscriber = pubsub_v1.SubscriberClient()
+    try:
+        subscription_path = _resolve_subscription(subscription)
+        response = subscriber.pull(request={"subscription": subscription_path, "max_messages": max_messages})
+    except Exception:
+        subscriber.close()
+        raise
+
+    ack_ids, diagnoses = [], []
+    for received in response.received_messages:
+        ack_ids.append(received.ack_id)
+        try:
+            diagnoses.append(json.loads(received.message.data.decode("utf-8")))
+        except Exception:
+            diagnoses.append({"raw": received.message.data.decode("utf-8", "replace")})
+    return subscriber, subscription_path, ack_ids, diagnoses
+
+
+@functions_framework.http
+@flush_after
+def validate_batch_http(request):
+    """
+    HTTP-triggered function for replaying backlogs:
+      - {"diagnoses": [...]} validates the posted list
+      - {"subscription": "<id>", "max_messages": N} pulls a backlog, validates it and acks it
+      - Optional "publish": false for a dry run
+    """
+    body = request.get_json(silent=True) or {}
+    publish = _parse_flag(body.get("publish"), True)
+    if publish is None:
+        return {"status": "error", "error": "'publish' must be true or false"}, 400
+    max_batch = int(os.getenv("VALIDATOR_MAX_BATCH", "500"))
+
+    if "diagnoses" in body:
+        diagnoses = body["diagnoses"]
+        if not isinstance(diagnoses, list):
+            return {"status": "error", "error": "'diagnoses' must be a list"}, 400
+        if len(diagnoses) > max_batch:
+            return {"status": "error", "error": f"Batch exceeds {max_batch} diagnoses"}, 413
+        verdicts = validate_batch(diagnoses, publish=publish)
+    elif "subscription" in body:
+        max_messages = body.get("max_messages", max_batch)
+        if isinstance(max_messages, bool) or not isinstance(max_messages, int) or max_messages < 1:
+            return {"status": "error", "error": "'max_messages' must be a positive integer"}, 400
+        if not isinstance(body["subscription"], str) or not body["subscription"].strip():
+            return {"status": "error", "error": "'subscription' must be a non-empty string"}, 400
+        try:
+            subscriber, subscription_path, ack_ids, diagnoses = _pull_diagnoses(
+                body["subscription"], min(max_messages, max_batch)
+            )
+        except Exception as e:
+            log_error(AGENT, f"Failed to pull backlog: {e}")
+            return {"status": "error", "error": str(e)}, 502
+        try:
+            verdicts = validate_batch(diagnoses, publish=publish)
+            # Leave approved-but-unpublished messages unacked so they are redelivered
+            done = [a for a, v in zip(ack_ids, verdicts) if v["status"] != "approved" or v.get("published")]
+            if done and publish:
+                subscriber.acknowledge(request={"subscription": subscription_path, "ack_ids": done})
+        finally:
+            subscriber.close()
     else:
-        print(f"[Validator] ❌ Rejected fix: {reason}")
-        return {"status": "rejected", "reason": reason}
\ No newline at end of file
+        return {"status": "error", "error": "Provide 'diagnoses' or 'subscription'"}, 400
+
+    summary = {
+        "total": len(verdicts),
+        "approved": sum(1 for v in verdicts if v["status"] == "approved"),
+        "published": sum(1 for v in verdicts if v.get("published")),
+    }
+    return {"status": "ok", "summary": summary, "verdicts": verdicts}
@@ -0,0 +1,305 @@
+# ============================================
+# 🛡️ policy_engine.py (validator-agent)
+# Compiles allow/deny rules once at cold start into a token trie
+# and evaluates commands against it deterministically.
+# ============================================
+
+from __future__ import annotations
+
+import json
+import os
+import shlex
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Operators that split a command line into simple commands
+COMMAND_SEPARATORS = {"&&", "||", ";", "|", "&", "(", ")"}
+
+# Rules used when no policy file is configured
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "name": "deny-recursive-rm",
+        "effect": "deny",
+        "priority": 100,
+        "tokens": ["rm"],
+        "args_any": ["-r", "-R", "--recursive"],
+        "reason": "Dangerous command detected",
+    },
+    {"name": "deny-sudo", "effect": "deny", "priority": 100, "tokens": ["sudo"], "reason": "Dangerous command detected"},
+    {
+        "name": "deny-delete",
+        "effect": "deny",
+        "priority": 100,
+        "tokens": ["delete"],
+        "anchor": "any",
+        "reason": "Dangerous command detected",
+    },
+    {
+        "name": "allow-npm-install",
+        "effect": "allow",
+        "priority": 50,
+        "tokens": ["npm", "install"],
+        "reason": "Standard npm install command",
+    },
+    {"name": "allow-low-risk", "effect": "allow", "priority": 10, "risk": ["low"], "reason": "Low risk operation"},
+]
+
+DEFAULT_KEYWORDS = ["fix", "update", "install", "upgrade", "patch", "resolve", "npm"]
+
+
+class PolicyError(ValueError):
+    """Raised when a policy file or rule cannot be compiled."""
+
+
+class _Rule:
+    __slots__ = ("index", "name", "effect", "priority", "override", "tokens", "anchor", "args_any", "args_none", "risk",
+                 "reason")
+
+    def __init__(self, index: int, spec: Dict[str, Any]):
+        if not isinstance(spec, dict):
+            raise PolicyError(f"Rule {index}: must be a JSON object")
+        effect = str(spec.get("effect", "")).lower()
+        if effect not in ("allow", "deny"):
+            raise PolicyError(f"Rule {spec.get('name', index)!r}: effect must be 'allow' or 'deny'")
+
+        self.index = index
+        self.name = str(spec.get("name") or f"rule-{index}")
+        self.effect = effect
+        try:
+            self.priority = int(spec.get("priority", 100 if effect == "deny" else 50))
+        except (TypeError, ValueError) as e:
+            raise PolicyError(f"Rule {self.name!r}: priority must be an integer") from e
+        self.tokens = tuple(str(t).lower() for t in spec.get("tokens", []))
+        self.anchor = str(spec.get("anchor", "command")).lower()
+        self.args_any = frozenset(str(a).lower() for a in spec.get("args_any", []))
+        self.args_none = frozenset(str(a).lower() for a in spec.get("args_none", []))
+        self.risk = frozenset(str(r).lower() for r in spec.get("risk", []))
+        self.reason = str(spec.get("reason") or f"Matched rule: {self.name}")
+
+        if self.anchor not in ("command", "any"):
+            raise PolicyError(f"Rule {self.name!r}: anchor must be 'command' or 'any'")
+        if isinstance(spec.get("tokens", []), str):
+            raise PolicyError(f"Rule {self.name!r}: tokens must be a list")
+        self.override = spec.get("override", False)
+        if not isinstance(self.override, bool):
+            raise PolicyError(f"Rule {self.name!r}: override must be true or false")
+        if self.override and (effect != "allow" or not self.tokens):
+            raise PolicyError(f"Rule {self.name!r}: override is only valid on allow rules with tokens")
+
+    def matches_at(self, start: int) -> bool:
+        """Deny rules fire at any token position (after xargs/env/nohup wrappers too); allow rules honor their anchor."""
+        return self.effect == "deny" or self.anchor == "any" or start == 0
+
+    def overrides(self, deny: "_Rule") -> bool:
+        """An override allow lifts a lower-priority deny matched in the same simple command."""
+        return self.override and deny.effect == "deny" and self.priority > deny.priority
+
+    def sort_key(self) -> Tuple[int, int, int, int]:
+        """Any (remaining) deny beats any allow; then higher priority, then longer match, then declaration order."""
+        return (0 if self.effect == "deny" else 1, -self.priority, -len(self.tokens), self.index)
+
+
+class _TrieNode:
+    __slots__ = ("children", "rules")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.rules: List[_Rule] = []
+
+
+def _keyword_rules(keywords: Iterable[str]) -> List[Dict[str, Any]]:
+    """Translate APPROVED_KEYWORDS entries into anywhere-anchored allow rules."""
+    rules = []
+    for keyword in keywords:
+        tokens = keyword.split()
+        if tokens:
+            rules.append(
+                {
+                    "name": f"keyword:{keyword}",
+                    "effect": "allow",
+                    "priority": 50,
+                    "tokens": tokens,
+                    "anchor": "any",
+                    "reason": f"Contains approved keyword: {keyword}",
+                }
+            )
+    return rules
+
+
+def parse_approved_keywords(raw_value: str) -> List[str]:
+    """Parse APPROVED_KEYWORDS as a comma-separated, space-separated or single value."""
+    raw_value = (raw_value or "").strip()
+    if not raw_value:
+        return list(DEFAULT_KEYWORDS)
+    if "," in raw_value:
+        keywords = [k.strip().lower() for k in raw_value.split(",") if k.strip()]
+    else:
+        keywords = [k.strip().lower() for k in raw_value.split() if k.strip()]
+    return keywords or list(DEFAULT_KEYWORDS)
+
+
+def _expand_arg(arg: str) -> Iterable[str]:
+    """Yield an argument plus each flag of a short-flag cluster ("-rf" -> "-r", "-f")."""
+    yield arg
+    if len(arg) > 2 and arg[0] == "-" and arg[1] != "-" and "=" not in arg:
+        for ch in arg[1:]:
+            yield f"-{ch}"
+
+
+def tokenize(command: str) -> List[List[str]]:
+    """
+    Split a command line into simple commands (lists of lowercased tokens).
+    Raises ValueError on unbalanced quotes.
+    """
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+
+    commands: List[List[str]] = []
+    current: List[str] = []
+    for token in lexer:
+        if token in COMMAND_SEPARATORS:
+            if current:
+                commands.append(current)
+            current = []
+            continue
+        current.append(token.lower())
+    if current:
+        commands.append(current)
+
+    # Quoted command strings ("sh -c 'sudo reboot'") are scanned as commands of their own
+    for simple in list(commands):
+        for token in simple[1:]:
+            if any(ch.isspace() for ch in token) or any(op in token for op in COMMAND_SEPARATORS):
+                try:
+                    commands.extend(tokenize(token))
+                except ValueError:  # a stray quote inside the string: scan its words instead
+                    commands.append(token.split())
+
+    # Normalize program paths so "/bin/rm" matches "rm", wherever the program appears
+    for simple in commands:
+        for i, token in enumerate(simple):
+            if "/" in token:
+                simple[i] = os.path.basename(token) or token
+    return commands
+
+
+class PolicyEngine:
+    """
+    Allow/deny policy compiled into a single token trie.
+
+    Every rule's token sequence is inserted once; evaluating a command walks
+    the trie from each token, so the cost depends on command length rather
+    than on the number of rules. Verdicts are cached per (command, risk).
+
+    Precedence: a deny matched anywhere wins over every allow, whatever the
+    priorities, unless an allow rule marked "override": true with a higher
+    priority matches the same simple command (so an exception for
+    "npm install --force" cannot approve "... && sudo reboot"). Otherwise
+    priority orders rules of the same effect.
+    """
+
+    def __init__(self, rules: Iterable[Dict[str, Any]], cache_size: int = 1024):
+        self.rules = [_Rule(i, spec) for i, spec in enumerate(rules)]
+        self._root = _TrieNode()
+        self._global_rules: List[_Rule] = []
+
+        for rule in self.rules:
+            if not rule.tokens:
+                self._global_rules.append(rule)
+                continue
+            node = self._root
+            for token in rule.tokens:
+                node = node.children.setdefault(token, _TrieNode())
+            node.rules.append(rule)
+
+        self.evaluate = lru_cache(maxsize=cache_size)(self._evaluate)
+
+    def _rule_applies(self, rule: _Rule, args: frozenset, risk: str) -> bool:
+        if rule.risk and risk not in rule.risk:
+            return False
+        if rule.args_any and not (rule.args_any & args):
+            return False
+        if rule.args_none and (rule.args_none & args):
+            return False
+        return True
+
+    def _evaluate(self, command: str, risk: str = "high") -> Dict[str, Any]:
+        """
+        Evaluate a command and return a verdict:
+            {"approved": bool, "reason": str, "rule": str|None, "trace": [...]}
+        """
+        risk = (risk or "high").lower()
+        trace: List[str] = []
+
+        try:
+            simple_commands = tokenize(command or "")
+        except ValueError as e:
+            trace.append(f"tokenize failed: {e}")
+            return {"approved": False, "reason": f"Unparseable command: {e}", "rule": None, "trace": tuple(trace)}
+
+        matched: Dict[int, _Rule] = {}
+        for tokens in simple_commands:
+            trace.append(f"command {tokens}")
+            segment: Dict[int, _Rule] = {}
+            for start in range(len(tokens)):
+                # Arguments of the program at `start` ("xargs rm -rf": the flags belong to rm)
+                args = frozenset(a for arg in tokens[start + 1:] for a in _expand_arg(arg))
+                node = self._root
+                for token in tokens[start:]:
+                    node = node.children.get(token)
+                    if node is None:
+                        break
+                    for rule in node.rules:
+                        if not rule.matches_at(start):
+                            continue
+                        if self._rule_applies(rule, args, risk):
+                            segment.setdefault(rule.index, rule)
+                            trace.append(f"matched {rule.effect} rule {rule.name!r} (priority {rule.priority})")
+            exceptions = [rule for rule in segment.values() if rule.override]
+            for rule in list(segment.values()):
+                lifted_by = next((e for e in exceptions if e.overrides(rule)), None)
+                if lifted_by is not None:
+                    del segment[rule.index]
+                    trace.append(f"deny rule {rule.name!r} overridden by {lifted_by.name!r}")
+            for index, rule in segment.items():
+                matched.setdefault(index, rule)
+
+        for rule in self._global_rules:
+            if self._rule_applies(rule, frozenset(), risk):
+                matched.setdefault(rule.index, rule)
+                trace.append(f"matched {rule.effect} rule {rule.name!r} (priority {rule.priority})")
+
+        if not matched:
+            trace.append("no rule matched, default deny")
+            return {"approved": False, "reason": "Unknown command", "rule": None, "trace": tuple(trace)}
+
+        winner = min(matched.values(), key=_Rule.sort_key)
+        trace.append(f"decision: {winner.effect} by {winner.name!r}")
+        return {
+            "approved": winner.effect == "allow",
+            "reason": winner.reason,
+            "rule": winner.name,
+            "trace": tuple(trace),
+        }
+
+
+def load_policy(policy_file: Optional[str] = None, approved_keywords: Optional[str] = None) -> PolicyEngine:
+    """
+    Build the policy engine from a JSON policy file (rules replace the
+    built-in defaults) plus APPROVED_KEYWORDS allow rules.
+    """
+    policy_file = policy_file if policy_file is not None else os.getenv("VALIDATOR_POLICY_FILE", "")
+    raw_keywords = approved_keywords if approved_keywords is not None else os.getenv("APPROVED_KEYWORDS", "")
+
+    rules: List[Dict[str, Any]] = list(DEFAULT_RULES)
+    if policy_file:
+        try:
+            with open(policy_file, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, json.JSONDecodeError) as e:
+            raise PolicyError(f"Failed to load policy file {policy_file}: {e}") from e
+        rules = data.get("rules", []) if isinstance(data, dict) else data
+        if not isinstance(rules, list):
+            raise PolicyError(f"Policy file {policy_file}: 'rules' must be a list")
+
+    return PolicyEngine(list(rules) + _keyword_rules(parse_approved_keywords(raw_keywords)))
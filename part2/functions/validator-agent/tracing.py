@@ -0,0 +1,197 @@
+# ============================================
+# ⏱️ tracing.py (shared by every agent)
+# Lightweight OpenTelemetry-compatible spans: per-stage timings, trace
+# context carried in the Pub/Sub payload metadata, local OTLP/JSON export.
+# ============================================
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from logging_utils import get_trace, log_event, set_trace
+
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "").strip()  # OTLP/JSON lines; empty = logs only
+SERVICE_NAME = os.getenv("K_SERVICE") or os.getenv("FUNCTION_TARGET") or "agent"
+
+_agent = "[Agent]"
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_remote_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("remote_parent", default=None)
+_inherited: contextvars.ContextVar[Dict[str, float]] = contextvars.ContextVar("inherited_timings", default={})
+_started_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("trace_started_at", default=None)
+_export_lock = threading.Lock()
+
+
+def init(agent: str) -> None:
+    """Set the agent label used when spans are logged."""
+    global _agent
+    _agent = agent
+
+
+class Span:
+    """One timed operation. Children roll their durations up into the root span."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "root", "attributes", "stages",
+                 "start_ns", "end_ns", "_t0", "duration", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], root: Optional["Span"],
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.root = root or self
+        self.attributes = attributes
+        self.stages: Dict[str, float] = {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self._t0 = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otel(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otel_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _export(span: Span) -> None:
+    if not TRACE_EXPORT_FILE:
+        return
+    line = json.dumps({"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "agentic-devops"}, "spans": [span.to_otel()]}],
+    }]}, separators=(",", ":"))
+    try:
+        with _export_lock, open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+    except OSError as e:
+        log_event(_agent, "Span export failed", severity="WARNING", error=str(e))
+
+
+# ---------- propagation ----------
+
+def start_trace(payload: Any) -> str:
+    """
+    Continue the trace carried by an incoming payload (metadata.trace_id /
+    parent_span_id, or a top-level trace_id), or start a new one.
+    Upstream stage timings and Pub/Sub transit time are picked up too.
+    """
+    payload = payload if isinstance(payload, dict) else {}
+    metadata = payload.get("metadata") if isinstance(payload.get("metadata"), dict) else {}
+    trace_id = set_trace(metadata.get("trace_id") or payload.get("trace_id"))
+    _remote_parent.set(metadata.get("parent_span_id"))
+    _current.set(None)
+
+    timings = dict(metadata.get("timings") or {})
+    published_at = metadata.get("published_at")
+    if isinstance(published_at, (int, float)):
+        timings[f"{SERVICE_NAME}.pubsub_transit"] = round(max(0.0, time.time() - published_at), 4)
+    _inherited.set(timings)
+    started_at = metadata.get("trace_started_at")
+    _started_at.set(started_at if isinstance(started_at, (int, float)) else time.time())
+    return trace_id
+
+
+def inject(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Write trace context and the timings so far into an outgoing payload's metadata."""
+    current = _current.get()
+    timings = dict(_inherited.get())
+    if current is not None:
+        timings.update({f"{SERVICE_NAME}.{name}": d for name, d in current.root.stages.items()})
+        metadata["parent_span_id"] = current.span_id
+    metadata["trace_id"] = get_trace() or set_trace()
+    metadata["timings"] = timings
+    metadata["trace_started_at"] = _started_at.get() or time.time()
+    metadata["published_at"] = time.time()
+    return metadata
+
+
+# ---------- spans ----------
+
+def _finish(current: Span) -> None:
+    _export(current)
+    if current.root is not current:
+        current.root.stages[current.name] = round(current.root.stages.get(current.name, 0.0) + current.duration, 4)
+        # A stage, not a request: its own wording and field so analytics never reads it as processing_time
+        log_event(_agent, "stage %s: %.3fs", current.name, current.duration, severity="DEBUG",
+                  span=current.name, span_kind="stage", stage_seconds=round(current.duration, 4),
+                  span_id=current.span_id)
+        return
+    upstream = _inherited.get()
+    started_at = _started_at.get()
+    log_event(
+        _agent, "%s took %.3fs", current.name, current.duration,
+        severity="ERROR" if current.error else "INFO",
+        span=current.name, duration_seconds=round(current.duration, 4), span_id=current.span_id,
+        stages=current.stages, attributes=current.attributes or None, upstream_timings=upstream or None,
+        end_to_end_seconds=round(time.time() - started_at, 4) if upstream and started_at else None,
+        **({"error": current.error} if current.error else {}),
+    )
+
+
+def _new_span(name: str, attributes: Dict[str, Any]) -> Span:
+    parent = _current.get()
+    return Span(
+        name, get_trace() or set_trace(),
+        parent.span_id if parent else _remote_parent.get(),
+        parent.root if parent else None,
+        attributes,
+    )
+
+
+def record(name: str, seconds: float, **attributes: Any) -> None:
+    """Record a stage that was timed before its span could be opened (e.g. decoding the trace context)."""
+    current = _new_span(name, attributes)
+    current.duration = seconds
+    current.end_ns = current.start_ns
+    current.start_ns -= int(seconds * 1e9)
+    _finish(current)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a stage. The outermost span of an invocation logs one INFO line with
+    its duration and every stage's duration; nested spans log at DEBUG.
+    """
+    current = _new_span(name, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        current.duration = time.perf_counter() - current._t0
+        _finish(current)
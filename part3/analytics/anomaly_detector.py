@@ -0,0 +1,313 @@
+# ============================================
+# 📈 anomaly_detector.py (analytics)
+# Streaming per-service baselines (EWMA, quantile sketch, sliding error
+# rate) that score each metric against what is normal for that service.
+# ============================================
+
+from __future__ import annotations
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.05"))
+ERROR_DECAY = float(os.getenv("ANOMALY_ERROR_DECAY", "0.999"))  # per expired bucket (~2h half-life at 10s buckets)
+WARMUP = int(os.getenv("ANOMALY_WARMUP", "30"))  # samples before a baseline is trusted
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3"))
+WINDOW_SECONDS = int(os.getenv("ANOMALY_WINDOW_SECONDS", "600"))
+WINDOW_BUCKETS = int(os.getenv("ANOMALY_WINDOW_BUCKETS", "60"))
+MIN_WINDOW_ERRORS = int(os.getenv("ANOMALY_MIN_WINDOW_ERRORS", "5"))
+SKETCH_DECAY_COUNT = int(os.getenv("ANOMALY_SKETCH_DECAY_COUNT", "5000"))  # halve sketch weights past this
+CHECKPOINT_PATH = os.getenv("ANOMALY_CHECKPOINT_PATH", "/tmp/anomaly_state.json")
+CHECKPOINT_SECONDS = float(os.getenv("ANOMALY_CHECKPOINT_SECONDS", "30"))
+
+STATE_VERSION = 1
+
+
+class Ewma:
+    """Exponentially weighted mean and variance."""
+
+    __slots__ = ("mean", "var", "count")
+
+    def __init__(self, mean: float = 0.0, var: float = 0.0, count: int = 0):
+        self.mean, self.var, self.count = mean, var, count
+
+    def zscore(self, x: float) -> float:
+        if self.count < WARMUP:
+            return 0.0
+        return (x - self.mean) / math.sqrt(max(self.var, 1e-12))
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        if self.count == 1:
+            self.mean, self.var = x, 0.0
+            return
+        delta = x - self.mean
+        self.mean += ALPHA * delta
+        self.var = (1 - ALPHA) * (self.var + ALPHA * delta * delta)
+
+    def to_list(self) -> List[float]:
+        return [self.mean, self.var, self.count]
+
+
+class QuantileSketch:
+    """
+    Log-bucketed sketch (DDSketch-style): quantiles within `accuracy` relative
+    error, at most `max_buckets` buckets (the lowest ones are merged).
+    """
+
+    def __init__(self, accuracy: float = 0.02, max_buckets: int = 256):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, float] = {}
+        self.count = 0.0
+
+    def add(self, x: float) -> None:
+        key = math.ceil(math.log(max(x, 1e-9)) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0.0) + 1
+        self.count += 1
+        if len(self.buckets) > self.max_buckets:
+            low = sorted(self.buckets)[:2]
+            self.buckets[low[1]] += self.buckets.pop(low[0])
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def decay(self, factor: float) -> None:
+        """Age out old observations so the baseline follows slow drift."""
+        self.buckets = {k: v * factor for k, v in self.buckets.items() if v * factor >= 0.01}
+        self.count = sum(self.buckets.values())
+
+
+class SlidingErrorRate:
+    """
+    Errors / total over the last WINDOW_SECONDS, in WINDOW_BUCKETS time buckets.
+    Buckets leaving the window are folded into decayed long-run counters, so
+    the baseline never includes the window it is compared against.
+    """
+
+    def __init__(self, window: int = WINDOW_SECONDS, buckets: int = WINDOW_BUCKETS):
+        self.width = max(1, window // buckets)
+        self.slots = buckets
+        self.ring: List[List[int]] = [[-1, 0, 0] for _ in range(buckets)]  # [epoch, total, errors]
+        self.base_total = 0.0
+        self.base_errors = 0.0
+
+    def add(self, ts: float, is_error: bool) -> None:
+        epoch = int(ts // self.width)
+        slot = self.ring[epoch % self.slots]
+        if slot[0] != epoch:
+            if slot[1]:
+                self.base_total = self.base_total * ERROR_DECAY + slot[1]
+                self.base_errors = self.base_errors * ERROR_DECAY + slot[2]
+            slot[:] = [epoch, 0, 0]
+        slot[1] += 1
+        slot[2] += int(is_error)
+
+    def totals(self, ts: float) -> Tuple[int, int]:
+        oldest = int(ts // self.width) - self.slots + 1
+        total = errors = 0
+        for epoch, t, e in self.ring:
+            if epoch >= oldest:
+                total += t
+                errors += e
+        return total, errors
+
+    def baseline(self) -> Optional[float]:
+        """Long-run error rate, once WARMUP events have aged out of the window."""
+        return self.base_errors / self.base_total if self.base_total >= WARMUP else None
+
+
+class ServiceState:
+    """Everything learned about one service."""
+
+    def __init__(self):
+        self.latency = Ewma()
+        self.cost = Ewma()
+        self.latency_sketch = QuantileSketch()
+        self.window = SlidingErrorRate()
+        self.observed = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency.to_list(),
+            "cost": self.cost.to_list(),
+            "sketch": {"buckets": self.latency_sketch.buckets, "count": self.latency_sketch.count},
+            "window": self.window.ring,
+            "error_baseline": [self.window.base_total, self.window.base_errors],
+            "observed": self.observed,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ServiceState":
+        state = cls()
+        state.latency = Ewma(*data["latency"])
+        state.cost = Ewma(*data["cost"])
+        state.latency_sketch.buckets = {int(k): v for k, v in data["sketch"]["buckets"].items()}
+        state.latency_sketch.count = data["sketch"]["count"]
+        if len(data["window"]) == state.window.slots:
+            state.window.ring = [list(slot) for slot in data["window"]]
+        state.window.base_total, state.window.base_errors = data["error_baseline"]
+        state.observed = data.get("observed", 0)
+        return state
+
+
+def _event_time(metrics: Dict[str, Any]) -> float:
+    ts = metrics.get("timestamp")
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        try:
+            return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class AnomalyDetector:
+    """
+    Scores each metric against its service's learned baseline and then folds
+    it into that baseline. Score components (summed, capped at 1.0):
+      - latency: z-score against the EWMA, only above the sketch's p95
+      - error burst: sliding-window error rate far above the long-run rate
+      - error: the event itself is an error (small weight)
+      - cost: z-score against the cost EWMA
+    State is checkpointed to CHECKPOINT_PATH and restored on start.
+    """
+
+    def __init__(self, checkpoint_path: Optional[str] = CHECKPOINT_PATH,
+                 checkpoint_seconds: float = CHECKPOINT_SECONDS):
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_seconds = checkpoint_seconds
+        self.services: Dict[str, ServiceState] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # serializes checkpoint writes
+        self._last_checkpoint = time.monotonic()
+        self.load()
+
+    def observe(self, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one metrics row and update the baselines. Returns {score, reasons, ...}."""
+        service = str(metrics.get("service", "unknown"))
+        ts = _event_time(metrics)
+        is_error = metrics.get("status") == "error"
+        latency = metrics.get("processing_time")
+        cost = metrics.get("estimated_cost")
+
+        with self._lock:
+            state = self.services.get(service)
+            if state is None:
+                state = self.services[service] = ServiceState()
+
+            score = 0.0
+            reasons: List[str] = []
+
+            if isinstance(latency, (int, float)):
+                z = state.latency.zscore(latency)
+                p95 = state.latency_sketch.quantile(0.95)
+                if z > Z_THRESHOLD and p95 is not None and latency > p95:
+                    score += min(0.5, 0.2 + 0.05 * (z - Z_THRESHOLD))
+                    reasons.append(f"latency {latency:.2f}s is {z:.1f} sd above baseline (p95 {p95:.2f}s)")
+                state.latency.update(latency)
+                state.latency_sketch.add(latency)
+                if state.latency_sketch.count > SKETCH_DECAY_COUNT:
+                    state.latency_sketch.decay(0.5)
+
+            state.window.add(ts, is_error)
+            total, errors = state.window.totals(ts)
+            baseline = state.window.baseline()
+            if baseline is not None and total and errors >= MIN_WINDOW_ERRORS:
+                rate = errors / total
+                z = (rate - baseline) / math.sqrt(max(baseline * (1 - baseline), 1e-4) / total)
+                if z > Z_THRESHOLD:
+                    score += min(0.7, 0.5 + 0.05 * (z - Z_THRESHOLD))
+                    reasons.append(f"error rate {rate:.0%} over {total} events vs baseline {baseline:.0%}")
+            if is_error:
+                score += 0.1
+
+            if isinstance(cost, (int, float)):
+                z = state.cost.zscore(cost)
+                if z > Z_THRESHOLD:
+                    score += 0.2
+                    reasons.append(f"cost {cost:.4f} is {z:.1f} sd above baseline")
+                state.cost.update(cost)
+
+            state.observed += 1
+            result = {
+                "score": min(score, 1.0),
+                "reasons": reasons,
+                "service": service,
+                "window_error_rate": round(errors / total, 4) if total else 0.0,
+                "baseline_error_rate": round(baseline, 4) if baseline is not None else None,
+                "latency_p95": state.latency_sketch.quantile(0.95),
+            }
+
+        self._maybe_checkpoint()
+        return result
+
+    # ---------- checkpointing ----------
+
+    def _maybe_checkpoint(self) -> None:
+        if self.checkpoint_path and time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write a checkpoint. The state is serialized under the lock (to_dict()
+        shares live buckets and windows with observe()); only the file write
+        happens outside it, one save at a time so an older snapshot never
+        replaces a newer one.
+        """
+        if not self.checkpoint_path:
+            return
+        with self._save_lock:
+            with self._lock:
+                text = json.dumps({"version": STATE_VERSION, "saved": time.time(),
+                                   "services": {name: state.to_dict() for name, state in self.services.items()}},
+                                  separators=(",", ":"))
+                self._last_checkpoint = time.monotonic()
+            tmp = f"{self.checkpoint_path}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as fh:
+                    fh.write(text)
+                os.replace(tmp, self.checkpoint_path)
+            except OSError as e:
+                print(f"Anomaly checkpoint failed: {e}")
+
+    def load(self) -> None:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("version") != STATE_VERSION:
+                return
+            self.services = {name: ServiceState.from_dict(s) for name, s in data["services"].items()}
+            print(f"Restored anomaly baselines for {len(self.services)} services")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable anomaly checkpoint: {e}")
+
+
+_detector: Optional[AnomalyDetector] = None
+
+
+def get_detector() -> AnomalyDetector:
+    """Process-wide detector (restored from the checkpoint, saved again at exit)."""
+    global _detector
+    if _detector is None:
+        _detector = AnomalyDetector()
+        atexit.register(_detector.save)
+    return _detector
@@ -0,0 +1,135 @@
+# ============================================
+# 🔎 log_classifier.py (analytics)
+# Single-pass classification of agent log text: every keyword the metrics
+# care about is found by one precompiled (trie-shaped) regex scan.
+# ============================================
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+# Checked in this order; the first category with a hit wins
+ERROR_PATTERNS: Dict[str, List[str]] = {
+    "timeout": ["timeout", "timed out", "deadline exceeded"],
+    "api_limit": ["rate limit", "quota exceeded", "429"],
+    "dependency": ["dependency", "package", "module not found"],
+    "network": ["connection", "network", "dns"],
+    "auth": ["authentication", "unauthorized", "401", "403"],
+    "resource": ["memory", "cpu", "disk space", "resource"],
+    "validation": ["rejected", "validation", "unknown command"],
+}
+PROVIDERS = ["openai", "anthropic", "cloudflare"]  # priority order
+SUCCESS_WORDS = ["success", "completed"]
+ERROR_WORDS = ["error", "failed"]
+VERBATIM = {"published": "Published", "rejected": "Rejected"}  # status words that must match case exactly
+
+_TOOK = re.compile(r"took (\d+\.?\d*)s")
+_COST = re.compile(r"cost.*?(\d+\.?\d*)")
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Alternation factored by common prefixes, e.g. c(?:o(?:st|mpleted)|pu).
+    The regex engine then tests one character class per position instead of
+    every keyword in turn.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+_ERROR_WORD = {word: category for category, words in ERROR_PATTERNS.items() for word in words}
+_ERROR_RANK = {category: rank for rank, category in enumerate(ERROR_PATTERNS)}
+_NO_ERROR = len(ERROR_PATTERNS)
+_WORD_RANK = {word: _ERROR_RANK[category] for word, category in _ERROR_WORD.items()}
+_ERROR_BY_RANK = list(ERROR_PATTERNS) + ["unknown"]
+_KEYWORDS = sorted(set(_ERROR_WORD) | set(PROVIDERS) | set(SUCCESS_WORDS) | set(ERROR_WORDS)
+                   | set(VERBATIM) | {"took ", "cost"})
+_SCAN = re.compile(_trie_pattern(_KEYWORDS))
+
+
+class LogClassifier:
+    """
+    Classifies a log line from one scan of its lower-cased text; the follow-up
+    regexes for processing time and cost only run on lines that mention them.
+    What a set of keywords implies is worked out once and cached, since real
+    logs repeat a small number of keyword combinations.
+
+    Results match the original substring heuristics, except that two keywords
+    sharing a character (e.g. "failedns") count as the first one only.
+    """
+
+    MAX_PLANS = 4096
+
+    def __init__(self):
+        self._plans: Dict[FrozenSet[str], Tuple[Any, ...]] = {}
+
+    def _plan(self, found: FrozenSet[str]) -> Tuple[Any, ...]:
+        rank = min([_WORD_RANK.get(word, _NO_ERROR) for word in found], default=_NO_ERROR)
+        provider = next((name for name in PROVIDERS if name in found), None)
+        plan = (
+            _ERROR_BY_RANK[rank],
+            provider,
+            "success" in found or "completed" in found,
+            "error" in found or "failed" in found,
+            "published" in found,
+            "rejected" in found,
+            "took " in found,
+            "cost" in found,
+        )
+        if len(self._plans) >= self.MAX_PLANS:
+            self._plans.clear()
+        self._plans[found] = plan
+        return plan
+
+    def _scan(self, text: str) -> Tuple[Dict[str, Any], str]:
+        lower = text.lower()
+        found = frozenset(_SCAN.findall(lower))
+        plan = self._plans.get(found) or self._plan(found)
+        error_type, provider, success, error, published, rejected, took, cost = plan
+
+        result: Dict[str, Any] = {}
+        if took:
+            match = _TOOK.search(text)
+            if match:
+                result["processing_time"] = float(match.group(1))
+
+        if success or (published and VERBATIM["published"] in text):
+            result["status"] = "success"
+        elif error or (rejected and VERBATIM["rejected"] in text):
+            result["status"] = "error"
+            result["error_type"] = error_type
+        else:
+            result["status"] = "processing"
+
+        if provider:
+            result["ai_provider"] = provider
+        if cost:
+            match = _COST.search(lower)
+            if match:
+                result["estimated_cost"] = float(match.group(1))
+        return result, error_type
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Metric fields for a log line (processing_time, status, error_type, ai_provider, estimated_cost)."""
+        return self._scan(text)[0]
+
+    def error_type(self, text: str) -> str:
+        """Error category of a line, regardless of its status."""
+        return self._scan(text)[1]
+
+
+CLASSIFIER = LogClassifier()
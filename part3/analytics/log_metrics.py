@@ -0,0 +1,91 @@
+# ============================================
+# 🧮 log_metrics.py (analytics)
+# Log entry -> metrics row. Kept free of Cloud Functions / GCP imports so
+# offline tools (scripts/backfill_analytics.py) can run the same rules.
+# ============================================
+
+from log_classifier import CLASSIFIER
+
+# Only logs from these functions become metrics
+AGENT_FUNCTIONS = ['diagnose-event', 'validate-fix-event', 'remediate']
+
+def extract_agent_metrics(log_entry):
+    """
+    Extract actionable metrics from agent logs
+    """
+    try:
+        log_text = log_entry.get('textPayload', '')
+        timestamp = log_entry.get('timestamp')
+        service = log_entry.get('resource', {}).get('labels', {}).get('function_name', 'unknown')
+        
+        # Only process our agent functions
+        if not any(name in service for name in AGENT_FUNCTIONS):
+            return None
+        
+        # Structured agent logs (logging_utils): read fields directly
+        payload = log_entry.get('jsonPayload')
+        if isinstance(payload, dict) and 'agent' in payload:
+            return extract_structured_metrics(payload, timestamp, service, log_entry.get('severity'))
+        
+        metrics = {
+            'timestamp': timestamp,
+            'service': service,
+            'log_text': log_text
+        }
+        
+        # Processing time, status, error type, provider and cost in one scan
+        metrics.update(CLASSIFIER.classify(log_text))
+        
+        return metrics
+        
+    except Exception as e:
+        print(f"Error extracting metrics: {str(e)}")
+        return None
+
+def extract_structured_metrics(payload, timestamp, service, severity=None):
+    """
+    Metrics from a structured (JSON) agent log entry - no text parsing needed
+    """
+    severity = (severity or payload.get('severity') or 'INFO').upper()
+    message = payload.get('message', '')
+    metrics = {
+        'timestamp': timestamp,
+        'service': service,
+        'log_text': message,
+    }
+    if payload.get('trace_id'):
+        metrics['trace_id'] = payload['trace_id']
+    
+    # Only request-level durations: stage spans (span_kind "stage", or from older
+    # agents a span line without the root's "stages") would skew the latency series
+    is_stage = payload.get('span_kind') == 'stage' or ('span' in payload and 'stages' not in payload)
+    duration = None if is_stage else payload.get('duration_seconds', payload.get('processing_time'))
+    if isinstance(duration, (int, float)):
+        metrics['processing_time'] = float(duration)
+    
+    status = payload.get('status')
+    if status in ('error', 'rejected') or severity in ('ERROR', 'CRITICAL'):
+        metrics['status'] = 'error'
+        metrics['error_type'] = payload.get('error_type') or extract_error_type(
+            f"{message} {status or ''} {payload.get('error', '')} {payload.get('reason', '')}"
+        )
+    elif status == 'success':
+        metrics['status'] = 'success'
+    else:
+        metrics['status'] = 'processing'
+    
+    if payload.get('provider'):
+        metrics['ai_provider'] = payload['provider']
+    if isinstance(payload.get('estimated_cost'), (int, float)):
+        metrics['estimated_cost'] = float(payload['estimated_cost'])
+    for field in ('cache_read_tokens', 'cache_write_tokens'):  # provider prompt-cache usage
+        if isinstance(payload.get(field), int):
+            metrics[field] = payload[field]
+    
+    return metrics
+
+def extract_error_type(log_text):
+    """
+    Classify error types for pattern analysis (see log_classifier.ERROR_PATTERNS)
+    """
+    return CLASSIFIER.error_type(log_text)
@@ -0,0 +1,244 @@
+# ============================================
+# 📊 metrics_sink.py (analytics)
+# Buffered metrics writer: one shared client, rows flushed in batches by
+# size or age, failed rows retried; entry points drain it before returning.
+# ============================================
+
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+SINK_KIND = os.getenv("ANALYTICS_SINK", "bigquery").lower()  # bigquery | sqlite | file
+METRICS_TABLE = os.getenv("METRICS_TABLE", "YOUR_PROJECT_ID.agent_analytics.metrics")
+BATCH_SIZE = int(os.getenv("METRICS_BATCH_SIZE", "500"))
+MAX_AGE_SECONDS = float(os.getenv("METRICS_MAX_AGE_SECONDS", "5"))
+MAX_RETRIES = int(os.getenv("METRICS_MAX_RETRIES", "3"))
+SQLITE_PATH = os.getenv("METRICS_SQLITE_PATH", "/tmp/agent_metrics.db")
+FILE_PATH = os.getenv("METRICS_FILE_PATH", "/tmp/agent_metrics.jsonl")
+
+
+class MetricsSink:
+    """
+    Accumulates rows and writes them in batches.
+
+    A batch is flushed when it reaches `batch_size` rows or its oldest row is
+    `max_age` seconds old (checked on every add and by a background timer).
+    Rows the backend rejects are re-queued up to `max_retries` times.
+
+    In a Cloud Function the timer cannot be relied on (CPU is throttled once
+    the handler returns and instances are reclaimed without a guaranteed
+    SIGTERM), so entry points wrap themselves in `flush_after`, which drains
+    the buffer before returning. Rows from concurrent invocations on the same
+    instance still share a batch.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, max_age: float = MAX_AGE_SECONDS,
+                 max_retries: int = MAX_RETRIES):
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self._rows: List[Dict[str, Any]] = []  # {"row", "insert_id", "attempts"}
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {"added": 0, "written": 0, "retried": 0, "dropped": 0, "flushes": 0}
+
+        self._timer = threading.Thread(target=self._flush_loop, name="metrics-sink", daemon=True)
+        self._timer.start()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    # ---------- backend hook ----------
+
+    def _write(self, batch: List[Dict[str, Any]]) -> List[int]:
+        """Write a batch; return the indexes of rows that failed."""
+        raise NotImplementedError
+
+    # ---------- buffering ----------
+
+    def add(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            self._rows.append({"row": row, "insert_id": uuid.uuid4().hex, "attempts": 0})
+            self._stats["added"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = len(self._rows) >= self.batch_size or time.monotonic() - self._oldest >= self.max_age
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered now; returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._rows[:self.batch_size]
+                    del self._rows[:self.batch_size]
+                    self._oldest = time.monotonic() if self._rows else None
+                if not batch:
+                    return written
+
+                try:
+                    failed = set(self._write(batch))
+                except Exception as e:
+                    print(f"Metrics sink write failed ({len(batch)} rows): {e}")
+                    failed = set(range(len(batch)))
+                retry = []
+                for index in sorted(failed):
+                    item = batch[index]
+                    item["attempts"] += 1
+                    if item["attempts"] <= self.max_retries:
+                        retry.append(item)
+                written += len(batch) - len(failed)
+                with self._lock:
+                    self._stats["flushes"] += 1
+                    self._stats["written"] += len(batch) - len(failed)
+                    self._stats["dropped"] += len(failed) - len(retry)
+                    self._stats["retried"] += len(retry)
+                    if retry:
+                        self._rows[:0] = retry
+                        self._oldest = self._oldest or time.monotonic()
+                if retry:
+                    # back off; drain(), the timer or the next add picks them up again
+                    return written
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            time.sleep(max(0.05, self.max_age / 2))
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_age
+            if due:
+                self.flush()
+
+    def drain(self) -> None:
+        """Flush until the buffer is empty, retrying failed rows (with backoff) until written or dropped."""
+        for attempt in range(self.max_retries + 1):
+            self.flush()
+            with self._lock:
+                if not self._rows:
+                    break
+            time.sleep(min(2 ** attempt * 0.1, 2.0))
+
+    def close(self) -> None:
+        """Stop the timer and drain the buffer."""
+        self._closed = True
+        self.drain()
+
+
+class BigQuerySink(MetricsSink):
+    """Batched insertAll (insert_rows_json) with per-row insert ids for de-duplication on retry."""
+
+    def __init__(self, table_id: str = METRICS_TABLE, **kwargs):
+        self.table_id = table_id
+        self._client = None
+        super().__init__(**kwargs)
+
+    def _write(self, batch):
+        if self._client is None:
+            from google.cloud import bigquery
+            self._client = bigquery.Client()
+        errors = self._client.insert_rows_json(
+            self.table_id, [item["row"] for item in batch], row_ids=[item["insert_id"] for item in batch]
+        )
+        if errors:
+            print(f"Failed to insert {len(errors)}/{len(batch)} metrics: {errors[:3]}")
+        return [error["index"] for error in errors]
+
+
+class SQLiteSink(MetricsSink):
+    """Local stand-in for testing: rows land in a SQLite table."""
+
+    def __init__(self, path: str = SQLITE_PATH, **kwargs):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "insert_id TEXT PRIMARY KEY, timestamp TEXT, service TEXT, status TEXT, row TEXT)"
+        )
+        self._conn.commit()
+        super().__init__(**kwargs)
+
+    def _write(self, batch):
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO metrics VALUES (?, ?, ?, ?, ?)",
+            [
+                (item["insert_id"], str(item["row"].get("timestamp")), item["row"].get("service"),
+                 item["row"].get("status"), json.dumps(item["row"], default=str))
+                for item in batch
+            ],
+        )
+        self._conn.commit()
+        return []
+
+
+class FileSink(MetricsSink):
+    """Local stand-in for testing: one JSON row per line."""
+
+    def __init__(self, path: str = FILE_PATH, **kwargs):
+        self.path = path
+        super().__init__(**kwargs)
+
+    def _write(self, batch):
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(item["row"], default=str) + "\n" for item in batch))
+        return []
+
+
+_sink: Optional[MetricsSink] = None
+_sink_lock = threading.Lock()
+
+
+def _on_sigterm(previous):
+    def handler(signum, frame):
+        if _sink is not None:
+            _sink.close()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+    return handler
+
+
+def get_sink() -> MetricsSink:
+    """Process-wide sink (created on first use, drained at exit / SIGTERM)."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                if SINK_KIND == "sqlite":
+                    sink: MetricsSink = SQLiteSink()
+                elif SINK_KIND == "file":
+                    sink = FileSink()
+                else:
+                    sink = BigQuerySink()
+                atexit.register(sink.close)
+                if threading.current_thread() is threading.main_thread():
+                    signal.signal(signal.SIGTERM, _on_sigterm(signal.getsignal(signal.SIGTERM)))
+                _sink = sink
+    return _sink
+
+
+def flush_after(func):
+    """Decorator for function entry points: write queued metrics before the invocation ends."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if _sink is not None:
+                _sink.drain()
+    return wrapper
@@ -9,7 +9,14 @@ bq mk --dataset YOUR_PROJECT_ID:agent_analytics
 echo "Creating metrics table..."
 # Create metrics table
 bq mk --table YOUR_PROJECT_ID:agent_analytics.metrics \
-  timestamp:TIMESTAMP,service:STRING,log_text:STRING,processing_time:FLOAT,status:STRING,error_type:STRING,ai_provider:STRING,estimated_cost:FLOAT
+  timestamp:TIMESTAMP,service:STRING,log_text:STRING,processing_time:FLOAT,status:STRING,error_type:STRING,ai_provider:STRING,estimated_cost:FLOAT,trace_id:STRING,cache_read_tokens:INTEGER,cache_write_tokens:INTEGER
+
+echo "Migrating existing metrics table..."
+# Tables created before these columns existed reject streaming inserts that carry them
+bq query --use_legacy_sql=false \
+  'ALTER TABLE `YOUR_PROJECT_ID.agent_analytics.metrics` ADD COLUMN IF NOT EXISTS trace_id STRING,
+   ADD COLUMN IF NOT EXISTS cache_read_tokens INTEGER,
+   ADD COLUMN IF NOT EXISTS cache_write_tokens INTEGER'
 
 echo "Verifying table creation..."
 bq ls agent_analytics
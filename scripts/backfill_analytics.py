@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+backfill_analytics.py
+Re-run analytics metric extraction over exported Cloud Logging entries,
+e.g. after changing the extraction rules in part3/analytics.
+
+Inputs (any mix, .gz handled transparently):
+  - NDJSON, one LogEntry per line (Cloud Logging sinks to GCS): plain files
+    are memory-mapped and split into newline-aligned byte ranges that each
+    worker maps and parses itself, so no log data crosses process boundaries
+  - gzip'd NDJSON: decompressed as a stream, lines shipped in batches
+  - a JSON array (gcloud logging read --format=json)
+
+Rows go to the metrics sink (same batching/retry as the live function) or
+to a Parquet file (needs pyarrow). Progress and throughput go to stderr.
+
+Usage:
+    python scripts/backfill_analytics.py logs/*.json.gz --sink sqlite
+    python scripts/backfill_analytics.py export.ndjson --parquet metrics.parquet --workers 8
+    python scripts/backfill_analytics.py export.json --dry-run
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "part3", "analytics"))
+
+from log_metrics import extract_agent_metrics  # noqa: E402
+
+PARQUET_COLUMNS = [
+    ("timestamp", "string"), ("service", "string"), ("status", "string"), ("error_type", "string"),
+    ("ai_provider", "string"), ("processing_time", "float64"), ("estimated_cost", "float64"),
+    ("cache_read_tokens", "int64"), ("cache_write_tokens", "int64"), ("trace_id", "string"), ("log_text", "string"),
+]
+
+
+# ---------- workers ----------
+
+def _extract(lines):
+    """Parse and extract a batch of raw lines; returns (rows, entries, bad_lines)."""
+    rows, entries, bad = [], 0, 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            bad += 1
+            continue
+        entries += 1
+        metrics = extract_agent_metrics(entry) if isinstance(entry, dict) else None
+        if metrics:
+            rows.append(metrics)
+    return rows, entries, bad
+
+
+def _extract_range(path, start, end):
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _extract(mm[start:end].split(b"\n"))
+
+
+def _extract_entries(entries):
+    rows = [m for m in (extract_agent_metrics(e) for e in entries if isinstance(e, dict)) if m]
+    return rows, len(entries), 0
+
+
+# ---------- input splitting ----------
+
+def _is_gzip(path):
+    with open(path, "rb") as fh:
+        return fh.read(2) == b"\x1f\x8b"
+
+
+def _first_byte(fh):
+    while True:
+        char = fh.read(1)
+        if not char or not char.isspace():
+            return char
+
+
+def plan_file(path, chunk_bytes, batch_lines):
+    """Yield (size_in_bytes, fn, args) work items for one input file."""
+    if _is_gzip(path):
+        with gzip.open(path, "rb") as fh:
+            is_array = _first_byte(fh) == b"["
+        if is_array:
+            yield from _plan_array(path, gzip.open, batch_lines)
+            return
+        compressed = os.path.getsize(path)
+        with open(path, "rb") as raw, gzip.open(raw, "rb") as fh:
+            batch, last = [], 0
+            for line in fh:
+                batch.append(line)
+                if len(batch) >= batch_lines:
+                    yield raw.tell() - last, _extract, (batch,)
+                    batch, last = [], raw.tell()
+            if batch:
+                yield compressed - last, _extract, (batch,)
+        return
+
+    size = os.path.getsize(path)
+    if not size:
+        return
+    with open(path, "rb") as fh:
+        if _first_byte(fh) == b"[":
+            yield from _plan_array(path, open, batch_lines)
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", min(start + chunk_bytes, size))
+                end = size if end == -1 else end + 1
+                yield end - start, _extract_range, (path, start, end)
+                start = end
+
+
+def _plan_array(path, opener, batch_lines):
+    """A JSON array has to be parsed whole; its entries are then shipped in batches."""
+    size = os.path.getsize(path)
+    with opener(path, "rb") as fh:
+        entries = json.load(fh)
+    if not isinstance(entries, list):
+        entries = [entries]
+    for i in range(0, len(entries), batch_lines):
+        part = entries[i:i + batch_lines]
+        yield size * len(part) // max(len(entries), 1), _extract_entries, (part,)
+
+
+# ---------- outputs ----------
+
+class ParquetOutput:
+    """Appends row groups to one Parquet file with a fixed schema."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("❌ --parquet needs pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in PARQUET_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self.written = 0
+
+    def add_many(self, rows):
+        columns = {name: [row.get(name) for row in rows] for name, _ in PARQUET_COLUMNS}
+        self.writer.write_table(self._pa.table(columns, schema=self.schema))
+        self.written += len(rows)
+
+    def close(self):
+        self.writer.close()
+        return {"written": self.written}
+
+
+class SinkOutput:
+    def __init__(self, kind, batch_size):
+        import metrics_sink
+        sink_cls = {"bigquery": metrics_sink.BigQuerySink, "sqlite": metrics_sink.SQLiteSink,
+                    "file": metrics_sink.FileSink}[kind]
+        self.sink = sink_cls(batch_size=batch_size)
+
+    def add_many(self, rows):
+        for row in rows:
+            self.sink.add(row)
+
+    def close(self):
+        self.sink.close()
+        return dict(self.sink.stats)
+
+
+class NullOutput:
+    def add_many(self, rows):
+        pass
+
+    def close(self):
+        return {}
+
+
+# ---------- driver ----------
+
+class Progress:
+    def __init__(self, total_bytes, interval=1.0):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last = 0.0
+        self.bytes = self.entries = self.rows = self.bad = 0
+
+    def update(self, size, rows, entries, bad, force=False):
+        self.bytes += size
+        self.rows += rows
+        self.entries += entries
+        self.bad += bad
+        now = time.perf_counter()
+        if force or now - self.last >= self.interval:
+            self.last = now
+            elapsed = max(now - self.started, 1e-9)
+            pct = 100.0 * self.bytes / self.total_bytes if self.total_bytes else 100.0
+            print(f"\r⏳ {pct:5.1f}%  {self.entries:,} entries  {self.rows:,} metrics  "
+                  f"{self.entries / elapsed:,.0f} entries/s  {self.bytes / elapsed / 1e6:,.1f} MB/s",
+                  end="", file=sys.stderr, flush=True)
+
+
+def run(paths, output, workers, chunk_bytes, batch_lines):
+    progress = Progress(sum(os.path.getsize(p) for p in paths))
+    window = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def drain(keep):
+            while len(window) > keep:
+                size, future = window.popleft()
+                rows, entries, bad = future.result()
+                output.add_many(rows)
+                progress.update(size, len(rows), entries, bad)
+
+        for path in paths:
+            for size, fn, args in plan_file(path, chunk_bytes, batch_lines):
+                window.append((size, pool.submit(fn, *args)))
+                drain(workers * 2)  # bounded in-flight work keeps memory flat on huge inputs
+        drain(0)
+    progress.update(0, 0, 0, 0, force=True)
+    print(file=sys.stderr)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="exported log files (.json, .ndjson, optionally .gz)")
+    out = parser.add_mutually_exclusive_group()
+    out.add_argument("--sink", choices=["bigquery", "sqlite", "file"],
+                     default=os.getenv("ANALYTICS_SINK", "bigquery").lower(), help="metrics sink backend")
+    out.add_argument("--parquet", metavar="PATH", help="write a Parquet file instead of the sink")
+    out.add_argument("--dry-run", action="store_true", help="extract and count only")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-mb", type=float, default=8.0, help="byte range per task for plain NDJSON")
+    parser.add_argument("--batch-lines", type=int, default=20000, help="lines per task for gzip/JSON array input")
+    parser.add_argument("--sink-batch-size", type=int, default=int(os.getenv("METRICS_BATCH_SIZE", "500")))
+    args = parser.parse_args()
+
+    missing = [p for p in args.inputs if not os.path.isfile(p)]
+    if missing:
+        parser.error(f"not found: {', '.join(missing)}")
+
+    if args.dry_run:
+        output = NullOutput()
+    elif args.parquet:
+        output = ParquetOutput(args.parquet)
+    else:
+        output = SinkOutput(args.sink, args.sink_batch_size)
+
+    progress = run(args.inputs, output, args.workers, int(args.chunk_mb * 1024 * 1024), args.batch_lines)
+    stats = output.close()
+
+    elapsed = time.perf_counter() - progress.started
+    print(f"✅ {progress.entries:,} entries → {progress.rows:,} metrics in {elapsed:.1f}s "
+          f"({progress.entries / max(elapsed, 1e-9):,.0f} entries/s, {args.workers} workers)")
+    if progress.bad:
+        print(f"⚠️  {progress.bad:,} unparseable lines skipped")
+    if stats:
+        print(f"📦 Output: {stats}")
+    return 1 if stats.get("dropped") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -94,6 +94,29 @@ else
     exit 1
 fi
 
+# Deploy Validator Batch API (same source as the validator; HTTP, for replaying backlogs)
+# Authenticated only: it publishes fixes and acks subscriptions
+echo ""
+echo "📦 Deploying Validator Batch API..."
+gcloud functions deploy validator-batch \
+  --gen2 \
+  --runtime=python39 \
+  --source=. \
+  --entry-point=validate_batch_http \
+  --trigger-http \
+  --memory=512MB \
+  --timeout=300s \
+  --set-env-vars="GCP_PROJECT=${PROJECT_ID},APPROVED_KEYWORDS=fix,update,install,upgrade,patch,resolve,npm,REMEDIATION_TOPIC=remediation-tasks" \
+  --region=YOUR_REGION \
+  --no-allow-unauthenticated
+
+if [ $? -eq 0 ]; then
+    echo "✅ Validator Batch API deployed successfully"
+else
+    echo "❌ Validator Batch API deployment failed"
+    exit 1
+fi
+
 cd $(pwd)
 
 # Deploy Remediator Agent
@@ -116,9 +139,11 @@ gcloud functions deploy remediator-agent \
   --source=. \
   --entry-point=remediate_event \
   --trigger-topic=remediation-tasks \
-  --memory=512MB \
+  --memory=1GiB \
+  --cpu=1 \
+  --concurrency=4 \
   --timeout=600s \
-  --set-env-vars="GCP_PROJECT=${PROJECT_ID}" \
+  --set-env-vars="GCP_PROJECT=${PROJECT_ID},REMEDIATION_RESULTS_TOPIC=remediation-results" \
   --region=YOUR_REGION \
   --allow-unauthenticated
 
@@ -129,6 +154,28 @@ else
     exit 1
 fi
 
+# Deploy Outcome Aggregator (same source as the remediator)
+echo ""
+echo "📈 Deploying Outcome Aggregator..."
+gcloud functions deploy outcome-aggregator \
+  --gen2 \
+  --runtime=python39 \
+  --source=. \
+  --entry-point=aggregate_outcome_event \
+  --trigger-topic=remediation-results \
+  --memory=256MB \
+  --timeout=60s \
+  --set-env-vars="GCP_PROJECT=${PROJECT_ID}" \
+  --region=YOUR_REGION \
+  --allow-unauthenticated
+
+if [ $? -eq 0 ]; then
+    echo "✅ Outcome Aggregator deployed successfully"
+else
+    echo "❌ Outcome Aggregator deployment failed"
+    exit 1
+fi
+
 cd $(pwd)
 
 echo ""
@@ -137,7 +184,9 @@ echo ""
 echo "📋 Deployment Summary:"
 echo "├── diagnoser-agent: diagnose_event (triggered by pipeline-events)"
 echo "├── validator-agent: validate_fix_event (triggered by validation-requests)"
-echo "└── remediator-agent: remediate_event (triggered by remediation-tasks)"
+echo "├── validator-batch: validate_batch_http (HTTP, authenticated)"
+echo "├── remediator-agent: remediate_event (triggered by remediation-tasks)"
+echo "└── outcome-aggregator: aggregate_outcome_event (triggered by remediation-results)"
 echo ""
 echo "🧪 Test the pipeline:"
 echo "gcloud pubsub topics publish pipeline-events --message='{\"buildStatus\":\"FAILURE\",\"step\":\"npm install\",\"error\":\"dependency conflict\",\"provider\":\"github\"}'"
@@ -145,4 +194,6 @@ echo ""
 echo "🔍 Monitor logs:"
 echo "gcloud functions logs read diagnoser-agent --limit=10"
 echo "gcloud functions logs read validator-agent --limit=10"
-echo "gcloud functions logs read remediator-agent --limit=10"
\ No newline at end of file
+echo "gcloud functions logs read validator-batch --limit=10"
+echo "gcloud functions logs read remediator-agent --limit=10"
+echo "gcloud functions logs read outcome-aggregator --limit=10"
\ No newline at end of file
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+drift_detector.py
+Detect Terraform drift from `terraform show -json` output and publish it
+as drift_issues for the terraform-fixer function.
+
+Two input shapes are understood:
+  - plan JSON (terraform show -json <planfile>): uses resource_drift, which
+    Terraform fills in while refreshing (pending config changes are not drift)
+  - state JSON (terraform show -json): builds an address-keyed index of
+    per-attribute hashes and diffs it against a saved baseline index; only
+    resources whose hash changed are compared attribute by attribute
+
+Usage:
+    python scripts/drift_detector.py state.json --baseline .drift-index.json --update-baseline
+    python scripts/drift_detector.py --terraform-dir part1/terraform --plan-file drift.tfplan
+    python scripts/drift_detector.py plan.json --publish terraform-drift --project my-project
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+INDEX_VERSION = 1
+MAX_INLINE_BYTES = 9 * 1024 * 1024  # Pub/Sub messages are capped at 10 MB
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _module_of(address):
+    """'module.a.module.b.google_x.y' -> 'module.a.module.b'."""
+    parts = address.split(".")
+    module = []
+    while len(parts) > 2 and parts[0] == "module":
+        module.extend(parts[:2])
+        parts = parts[2:]
+    return ".".join(module)
+
+
+def is_plan(doc):
+    return "resource_changes" in doc or "planned_values" in doc or "resource_drift" in doc
+
+
+# ---------- state indexing ----------
+
+def iter_state_resources(module):
+    """Yield managed resources from a state module, depth-first through child_modules."""
+    for resource in module.get("resources", []):
+        if resource.get("mode", "managed") == "managed":
+            yield resource
+    for child in module.get("child_modules", []):
+        yield from iter_state_resources(child)
+
+
+def index_state(doc):
+    """Address-keyed index: {address: {type, name, module, hash, attrs: {attr: hash}}}."""
+    root = (doc.get("values") or {}).get("root_module") or {}
+    index = {}
+    for resource in iter_state_resources(root):
+        values = resource.get("values") or {}
+        attrs = {key: _digest(value) for key, value in values.items()}
+        index[resource["address"]] = {
+            "type": resource.get("type", "unknown"),
+            "name": resource.get("name", "unknown"),
+            "module": _module_of(resource["address"]),
+            "hash": _digest(attrs),
+            "attrs": attrs,
+        }
+    return index
+
+
+def _issue(address, entry, drift_type, attribute=""):
+    return {
+        "address": address,
+        "module": entry.get("module", ""),
+        "type": entry.get("type", "unknown"),
+        "resource_name": entry.get("name", "unknown"),
+        "drift_type": drift_type,
+        "attribute": attribute,
+    }
+
+
+def diff_indexes(baseline, current):
+    """
+    Drift issues between two indexes; unchanged resources cost one hash comparison.
+    A resource new in state is not drift: Terraform itself put it there (an
+    apply), so it is left for the baseline update rather than reported.
+    """
+    issues = []
+    for address, entry in current.items():
+        old = baseline.get(address)
+        if old is None:
+            continue
+        if old["hash"] == entry["hash"]:
+            continue
+        old_attrs, new_attrs = old["attrs"], entry["attrs"]
+        for attr in sorted(set(old_attrs) | set(new_attrs)):
+            if old_attrs.get(attr) != new_attrs.get(attr):
+                issues.append(_issue(address, entry, "modified", attr))
+    for address, entry in baseline.items():
+        if address not in current:
+            issues.append(_issue(address, entry, "deleted"))
+    return issues
+
+
+# ---------- plan JSON ----------
+
+# resource_drift entries describe prior state -> refreshed state: an object
+# changed or deleted outside Terraform. Planned changes (resource_changes)
+# are config edits waiting to be applied, not drift, and are never read.
+ACTION_DRIFT = {
+    ("update",): "modified",
+    ("delete",): "deleted",  # in state, but gone from the provider
+}
+
+
+def plan_issues(doc):
+    """Drift issues from a plan's resource_drift (Terraform omits the key when nothing drifted)."""
+    changes = doc.get("resource_drift") or []
+
+    issues = []
+    for change in changes:
+        if change.get("mode", "managed") != "managed":
+            continue
+        actions = tuple(change.get("change", {}).get("actions", []))
+        drift_type = ACTION_DRIFT.get(actions)
+        if drift_type is None:
+            continue  # no-op / read
+        address = change["address"]
+        entry = {
+            "type": change.get("type", "unknown"),
+            "name": change.get("name", "unknown"),
+            "module": change.get("module_address") or _module_of(address),
+        }
+        before = change["change"].get("before") or {}
+        after = change["change"].get("after") or {}
+        changed = [k for k in sorted(set(before) | set(after)) if before.get(k) != after.get(k)]
+        if drift_type == "modified" and changed:
+            issues.extend(_issue(address, entry, drift_type, attr) for attr in changed)
+        else:
+            issues.append(_issue(address, entry, drift_type))
+    return issues
+
+
+# ---------- I/O ----------
+
+def load_show_json(path=None, terraform_dir=None, plan_file=None):
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"❌ Could not read {path}: {e}")
+    cmd = ["terraform", "show", "-json"] + ([plan_file] if plan_file else [])
+    try:
+        output = subprocess.run(cmd, cwd=terraform_dir, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise SystemExit("❌ terraform not found on PATH")
+    except subprocess.CalledProcessError as e:
+        stderr = (e.stderr or b"").decode("utf-8", errors="replace").strip()
+        raise SystemExit(f"❌ {' '.join(cmd)} failed (exit {e.returncode}): {stderr[-500:]}")
+    try:
+        return json.loads(output)
+    except ValueError as e:
+        raise SystemExit(f"❌ {' '.join(cmd)} did not print JSON: {e}")
+
+
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") == INDEX_VERSION:
+            return data["resources"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def save_baseline(path, index):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"version": INDEX_VERSION, "created": time.time(), "resources": index}, fh, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def publish(report, topic, project, report_uri=None):
+    from google.cloud import pubsub_v1
+
+    if not topic.startswith("projects/"):
+        topic = f"projects/{project}/topics/{topic}"
+    if report_uri:
+        message = {"drift_report_uri": report_uri, "source": report["source"], "issue_count": len(report["drift_issues"])}
+    else:
+        message = report
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    if len(data) > MAX_INLINE_BYTES:
+        raise SystemExit(
+            f"❌ Report is {len(data)} bytes; write it with --output, upload it and pass --report-uri"
+        )
+    message_id = pubsub_v1.PublisherClient().publish(topic, data).result(timeout=60)
+    print(f"✅ Published drift report to {topic} (message {message_id})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="terraform show -json output (plan or state)")
+    parser.add_argument("--terraform-dir", help="run terraform show -json here instead of reading a file")
+    parser.add_argument("--plan-file", help="plan file to show (with --terraform-dir)")
+    parser.add_argument("--baseline", default=".drift-index.json", help="baseline index for state diffs")
+    parser.add_argument("--update-baseline", action="store_true", help="save the current state as the new baseline")
+    parser.add_argument("--output", help="write the drift report JSON here")
+    parser.add_argument("--publish", metavar="TOPIC", help="publish the report to this Pub/Sub topic")
+    parser.add_argument("--report-uri", help="publish only a drift_report_uri reference (e.g. gs://bucket/report.json)")
+    parser.add_argument("--project", default=os.getenv("GOOGLE_CLOUD_PROJECT") or os.getenv("GCP_PROJECT"))
+    args = parser.parse_args()
+
+    if not args.input and not args.terraform_dir:
+        parser.error("provide an input file or --terraform-dir")
+
+    started = time.time()
+    doc = load_show_json(args.input, args.terraform_dir, args.plan_file)
+
+    if is_plan(doc):
+        source = "plan"
+        issues = plan_issues(doc)
+    else:
+        source = "state"
+        current = index_state(doc)
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"ℹ️  No baseline at {args.baseline}; indexing {len(current)} resources as the baseline")
+            issues = []
+            args.update_baseline = True
+        else:
+            issues = diff_indexes(baseline, current)
+        if args.update_baseline:
+            save_baseline(args.baseline, current)
+
+    report = {
+        "source": f"drift-detector:{source}",
+        "detected_at": time.time(),
+        "drift_issues": issues,
+    }
+    print(f"🔍 {len(issues)} drift issues from {source} in {time.time() - started:.2f}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, separators=(",", ":"))
+        print(f"📝 Report written to {args.output}")
+    if args.publish and (issues or args.report_uri):
+        publish(report, args.publish, args.project, args.report_uri)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
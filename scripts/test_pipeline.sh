@@ -47,6 +47,7 @@ topics_ok=true
 check_topic "pipeline-events" || topics_ok=false
 check_topic "validation-requests" || topics_ok=false
 check_topic "remediation-tasks" || topics_ok=false
+check_topic "remediation-results" || topics_ok=false
 
 if [ "$topics_ok" = false ]; then
     echo ""
@@ -54,6 +55,7 @@ if [ "$topics_ok" = false ]; then
     gcloud pubsub topics create pipeline-events || true
     gcloud pubsub topics create validation-requests || true
     gcloud pubsub topics create remediation-tasks || true
+    gcloud pubsub topics create remediation-results || true
     echo "✅ Topics created"
 fi
 
@@ -134,5 +136,6 @@ echo "📊 Expected Flow:"
 echo "1. pipeline-events → diagnoser-agent → validation-requests"
 echo "2. validation-requests → validator-agent → remediation-tasks" 
 echo "3. remediation-tasks → remediator-agent → execution"
+echo "4. remediation-results → outcome-aggregator → fix history"
 echo ""
 echo "🔍 Check the logs above to verify each step worked correctly."
\ No newline at end of file